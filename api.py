@@ -0,0 +1,277 @@
+"""JSON API over Storage for batch clients, runnable alongside the Streamlit app.
+
+Usage: API_TOKEN=... DATABASE_URL=... python api.py
+
+Every request must send "Authorization: Bearer <API_TOKEN>". Endpoints:
+
+    GET  /files                                  uploaded batch/file names
+    GET  /records?after_id=&limit=&file_name=&folder=
+                                                 records in id order, keyset paginated
+    GET  /search?<field>=<value>...              search on record fields
+    POST /records/<id>/relation                  body {"relation_type": "friend"}
+    GET  /stats/total?approximate=
+    GET  /stats/occupations?folder=&approximate=
+    GET  /stats/age-bands?folder=
+    GET  /changes?since=&limit=                  change log since a version
+    GET  /export?file_name=&folder=              all matching records as NDJSON, streamed
+
+With approximate=1 the stats are estimated from a sample of records (1%,
+or ESTIMATE_SAMPLE_BUCKETS percent), each count with the half-width of its
+95% confidence interval as margin.
+
+Responses are gzip-compressed when the client accepts it.
+"""
+import gzip
+import json
+import logging
+import os
+import re
+import threading
+import zlib
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+from storage import Storage, RelationType, RECORD_FIELDS, DatabaseUnavailableError
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+API_HOST = os.getenv("API_HOST", "0.0.0.0")
+API_PORT = int(os.getenv("API_PORT", "8000"))
+API_TOKEN = os.getenv("API_TOKEN")
+
+DEFAULT_PAGE_SIZE = 500
+MAX_PAGE_SIZE = 5000
+# Smaller bodies are sent uncompressed; gzip would barely shrink them
+GZIP_MIN_BYTES = 1024
+
+RELATION_PATH = re.compile(r'^/records/(\d+)/relation$')
+
+_local = threading.local()
+
+def get_storage():
+    """Each request thread uses its own Storage; the engine and pool are shared"""
+    if not hasattr(_local, 'storage'):
+        _local.storage = Storage()
+    return _local.storage
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+def int_param(params, name, default, maximum=None):
+    value = params.get(name, default)
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        raise ApiError(HTTPStatus.BAD_REQUEST, f"{name} must be an integer")
+    if value < 0:
+        raise ApiError(HTTPStatus.BAD_REQUEST, f"{name} must not be negative")
+    return min(value, maximum) if maximum else value
+
+def to_json(value):
+    return json.dumps(value, ensure_ascii=False, default=str).encode('utf-8')
+
+class ApiHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # Keep-alive, and chunked streaming for exports
+
+    def do_GET(self):
+        self.dispatch('GET')
+
+    def do_POST(self):
+        self.dispatch('POST')
+
+    def dispatch(self, method):
+        self.body_read = False
+        # http.server decodes the request line as Latin-1; recover unescaped UTF-8 field names
+        url = urlsplit(self.path.encode('latin-1').decode('utf-8', 'replace'))
+        # Single-valued query parameters; the last one wins if repeated
+        params = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        try:
+            if not API_TOKEN or self.headers.get('Authorization') != f"Bearer {API_TOKEN}":
+                raise ApiError(HTTPStatus.UNAUTHORIZED, "Missing or invalid API token")
+
+            if method == 'GET' and url.path == '/export':
+                return self.stream_export(params)
+
+            route = self.route(method, url.path)
+            self.send_json(HTTPStatus.OK, route(params))
+        except ApiError as e:
+            self.send_json(e.status, {'error': str(e)})
+        except DatabaseUnavailableError as e:
+            self.send_json(HTTPStatus.SERVICE_UNAVAILABLE, {'error': str(e)})
+        except Exception as e:
+            logger.error(f"Error handling {method} {url.path}: {str(e)}")
+            self.send_json(HTTPStatus.INTERNAL_SERVER_ERROR, {'error': "Internal server error"})
+        finally:
+            # Don't hold a pooled connection between requests
+            if hasattr(_local, 'storage'):
+                _local.storage.release()
+
+    def route(self, method, path):
+        if method == 'POST':
+            match = RELATION_PATH.match(path)
+            if match:
+                return lambda params: self.mark_relation(int(match.group(1)))
+            raise ApiError(HTTPStatus.NOT_FOUND, f"No route for POST {path}")
+
+        routes = {
+            '/files': lambda params: {'files': get_storage().get_file_names()},
+            '/records': self.get_records,
+            '/search': self.search,
+            '/stats/total': self.total,
+            '/stats/occupations': self.occupations,
+            '/stats/age-bands': lambda params: {
+                'age_bands': get_storage().get_age_band_stats(params.get('folder'))
+            },
+            '/changes': lambda params: get_storage().get_changes_since(
+                int_param(params, 'since', 0), int_param(params, 'limit', 1000)
+            ),
+        }
+        if path not in routes:
+            raise ApiError(HTTPStatus.NOT_FOUND, f"No route for GET {path}")
+        return routes[path]
+
+    def total(self, params):
+        if int_param(params, 'approximate', 0):
+            estimate, margin = get_storage().estimate_total_records_count()
+            return {'total': estimate, 'margin': margin}
+        return {'total': get_storage().get_total_records_count()}
+
+    def occupations(self, params):
+        if int_param(params, 'approximate', 0):
+            return {'occupations': [
+                {'occupation': occupation, 'count': count, 'margin': margin}
+                for occupation, count, margin in get_storage().estimate_occupation_stats(params.get('folder'))
+            ]}
+        return {'occupations': get_storage().get_occupation_stats(params.get('folder'))}
+
+    def get_records(self, params):
+        return get_storage().get_records_after(
+            after_id=int_param(params, 'after_id', 0),
+            limit=int_param(params, 'limit', DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE) or DEFAULT_PAGE_SIZE,
+            file_name=params.get('file_name'),
+            folder=params.get('folder')
+        )
+
+    def search(self, params):
+        fields = {field: value for field, value in params.items() if field in RECORD_FIELDS and value}
+        if not fields:
+            raise ApiError(HTTPStatus.BAD_REQUEST, f"Search needs at least one of: {', '.join(RECORD_FIELDS)}")
+        results = get_storage().search_records(**fields)
+        return {'records': results, 'total': len(results)}
+
+    def mark_relation(self, record_id):
+        body = self.read_json()
+        try:
+            relation_type = RelationType(body.get('relation_type'))
+        except ValueError:
+            raise ApiError(HTTPStatus.BAD_REQUEST, "relation_type must be one of: "
+                           + ', '.join(relation.value for relation in RelationType))
+        if not get_storage().mark_relation(record_id, relation_type):
+            raise ApiError(HTTPStatus.NOT_FOUND, f"Could not mark record {record_id}")
+        return {'record_id': record_id, 'relation_type': relation_type.value}
+
+    def read_json(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        self.body_read = True
+        try:
+            body = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            raise ApiError(HTTPStatus.BAD_REQUEST, "Body must be JSON")
+        if not isinstance(body, dict):
+            raise ApiError(HTTPStatus.BAD_REQUEST, "Body must be a JSON object")
+        return body
+
+    def has_unread_body(self):
+        """Whether the request sent a body no route read, such as one rejected before it was parsed."""
+        return not self.body_read and (
+            int(self.headers.get('Content-Length') or 0) > 0 or 'Transfer-Encoding' in self.headers
+        )
+
+    def accepts_gzip(self):
+        return 'gzip' in self.headers.get('Accept-Encoding', '')
+
+    def send_json(self, status, value):
+        body = to_json(value)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        if len(body) >= GZIP_MIN_BYTES and self.accepts_gzip():
+            body = gzip.compress(body, compresslevel=5)
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Vary', 'Accept-Encoding')
+        self.send_header('Content-Length', str(len(body)))
+        if self.has_unread_body():
+            # The unread body would be taken for the next request on this connection; an
+            # unauthenticated client's body is not worth reading, so close instead
+            self.send_header('Connection', 'close')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def stream_export(self, params):
+        """Write every matching record as one JSON line, page by page, with chunked encoding.
+
+        Memory stays at one page however many records match.
+        """
+        storage = get_storage()
+        file_name = params.get('file_name')
+        folder = params.get('folder')
+        # Fetch the first page before sending headers so errors still get a proper status
+        page = storage.get_records_after(0, MAX_PAGE_SIZE, file_name=file_name, folder=folder)
+
+        compress = self.accepts_gzip()
+        # wbits 31 writes a gzip header and trailer around the deflate stream
+        compressor = zlib.compressobj(5, zlib.DEFLATED, 31) if compress else None
+        self.send_response(HTTPStatus.OK)
+        self.send_header('Content-Type', 'application/x-ndjson; charset=utf-8')
+        if compress:
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Vary', 'Accept-Encoding')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+        def write_chunk(data):
+            if compressor:
+                data = compressor.compress(data)
+            if data:
+                self.wfile.write(f"{len(data):x}\r\n".encode('ascii') + data + b"\r\n")
+
+        try:
+            while True:
+                write_chunk(b''.join(to_json(record) + b'\n' for record in page['records']))
+                if page['next_after_id'] is None:
+                    break
+                page = storage.get_records_after(page['next_after_id'], MAX_PAGE_SIZE,
+                                                 file_name=file_name, folder=folder)
+        except Exception as e:
+            # Headers are already sent; ending without the final chunk tells the client it is incomplete
+            logger.error(f"Export failed part way: {str(e)}")
+            self.close_connection = True
+            return
+
+        if compressor:
+            tail = compressor.flush()
+            if tail:
+                self.wfile.write(f"{len(tail):x}\r\n".encode('ascii') + tail + b"\r\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def log_message(self, format, *args):
+        logger.info(f"{self.address_string()} {format % args}")
+
+def main():
+    if not API_TOKEN:
+        raise SystemExit("API_TOKEN environment variable is not set")
+    server = ThreadingHTTPServer((API_HOST, API_PORT), ApiHandler)
+    server.daemon_threads = True
+    logger.info(f"Serving API on {API_HOST}:{API_PORT}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == '__main__':
+    main()
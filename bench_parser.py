@@ -0,0 +1,70 @@
+"""Benchmark the loop and vectorized parser modes on a synthetic voter list.
+
+Usage: python bench_parser.py [--records 1000000] [--chunk-size 50000]
+"""
+import argparse
+import logging
+import os
+import tempfile
+import time
+from data_processor import TextFileRecords, TextFileFrames
+
+RECORD_TEMPLATE = (
+    "{serial}. নাম: মোঃ করিম উদ্দিন\n"
+    "ভোটার নং: {voter}\n"
+    "পিতা: মোঃ রহিম উদ্দিন, মাতা: জরিনা বেগম\n"
+    "পেশা: {occupation}, জন্ম তারিখ: ১২/০৩/১৯৮৫\n"
+    "ঠিকানা: পূর্বপাড়া, ডাকঘর: কালিহাতী, উপজেলা: কালিহাতী\n"
+)
+OCCUPATIONS = ['কৃষক', 'গৃহিণী', 'ছাত্র', 'ব্যবসা', 'চাকুরী']
+BENGALI_DIGITS = str.maketrans('0123456789', '০১২৩৪৫৬৭৮৯')
+
+def write_sample_file(path, count):
+    """Write count synthetic records, every 50th one missing its voter number."""
+    with open(path, 'w', encoding='utf-8') as f:
+        for i in range(1, count + 1):
+            record = RECORD_TEMPLATE.format(
+                serial=str(i).translate(BENGALI_DIGITS),
+                voter=f"{1000000000 + i}",
+                occupation=OCCUPATIONS[i % len(OCCUPATIONS)]
+            )
+            if i % 50 == 0:
+                record = record.replace("ভোটার নং", "ভোটার")
+            f.write(record)
+
+def time_mode(source):
+    start = time.perf_counter()
+    for _ in source:
+        pass
+    return time.perf_counter() - start, source.parsed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--records', type=int, default=1000000)
+    parser.add_argument('--chunk-size', type=int, default=50000)
+    args = parser.parse_args()
+
+    # Skipped-record warnings are part of normal parsing, not of interest here
+    logging.getLogger('data_processor').setLevel(logging.ERROR)
+
+    fd, path = tempfile.mkstemp(suffix='.txt')
+    os.close(fd)
+    try:
+        write_sample_file(path, args.records)
+        size_mb = os.path.getsize(path) / (1024 * 1024)
+        print(f"{args.records:,} records, {size_mb:.1f} MB")
+
+        results = {
+            'loop': time_mode(TextFileRecords(path)),
+            'vectorized': time_mode(TextFileFrames(path, chunk_size=args.chunk_size))
+        }
+        for mode, (elapsed, parsed) in results.items():
+            print(f"{mode:>10}: {elapsed:7.2f}s  {parsed / elapsed:10,.0f} records/s  ({parsed:,} complete)")
+
+        fastest = min(results, key=lambda mode: results[mode][0])
+        print(f"faster mode: {fastest}")
+    finally:
+        os.remove(path)
+
+if __name__ == '__main__':
+    main()
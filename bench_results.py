@@ -0,0 +1,87 @@
+"""Measure memory and time of record query results: ORM dictionaries, row dictionaries and DataFrames.
+
+Loads a synthetic voter list into a temporary SQLite database (unless
+DATABASE_URL is set) and fetches every record in each result form,
+reporting the memory the result holds and the peak allocated while
+building it.
+
+Usage: python bench_results.py [--records 100000]
+"""
+import argparse
+import gc
+import logging
+import os
+import tempfile
+import time
+import tracemalloc
+
+def measure(build):
+    """Run build() and return (seconds, bytes retained by its result, peak bytes allocated)."""
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = build()
+    elapsed = time.perf_counter() - start
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return elapsed, retained, peak
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--records', type=int, default=100000)
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    logging.getLogger('data_processor').setLevel(logging.ERROR)
+
+    temp_dir = None
+    if not os.getenv("DATABASE_URL"):
+        temp_dir = tempfile.TemporaryDirectory()
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(temp_dir.name, 'bench.db')}"
+
+    # Imported after DATABASE_URL is settled
+    from bench_parser import write_sample_file
+    from data_processor import TextFileRecords
+    from storage import Storage, Record
+    import pandas  # noqa: F401 - loaded up front so its import is not counted as result memory
+
+    storage = Storage()
+    if storage.get_total_records_count() < args.records:
+        path = os.path.join(temp_dir.name if temp_dir else tempfile.gettempdir(), 'bench_results.txt')
+        # write_sample_file drops every 50th record as incomplete
+        write_sample_file(path, args.records * 50 // 49 + 1)
+        storage.add_file_data_with_batch('bench.txt', 'bench', TextFileRecords(path))
+        os.remove(path)
+
+    def orm_dicts():
+        # The previous read path: ORM objects, then one relation query per record
+        session = storage._reader()
+        records = session.query(Record).order_by(Record.id).limit(args.records).all()
+        results = [storage._record_to_dict(record, include_id=True, session=session) for record in records]
+        session.expunge_all()
+        return results
+
+    def row_dicts():
+        session = storage._reader()
+        rows = session.execute(storage._record_select().order_by(Record.id).limit(args.records)).all()
+        return storage._record_results(rows)
+
+    def data_frame():
+        session = storage._reader()
+        rows = session.execute(storage._record_select().order_by(Record.id).limit(args.records)).all()
+        return storage._record_results(rows, columnar=True)
+
+    print(f"{args.records:,} records")
+    print(f"{'result form':<28}{'seconds':>9}{'retained MB':>13}{'peak MB':>10}")
+    for name, build in [('ORM + dicts (before)', orm_dicts), ('joined rows -> dicts', row_dicts),
+                        ('joined rows -> DataFrame', data_frame)]:
+        elapsed, retained, peak = measure(build)
+        print(f"{name:<28}{elapsed:>9.2f}{retained / 2**20:>13.1f}{peak / 2**20:>10.1f}")
+
+    if temp_dir:
+        storage.release()
+        temp_dir.cleanup()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+"""Measure how long the app takes to show the login form, and the first page after login.
+
+The app is run headless with streamlit's AppTest in a fresh interpreter,
+against a fresh SQLite database unless DATABASE_URL names a scratch
+database (migrated with `python migrations.py` first, as a deployment
+would). Each session is timed to its login form, then to its first page
+once logged in, with the part of that spent constructing Storage:
+
+  first session       the first session of a new process, as after a restart
+  next session        later sessions of the same process (median)
+
+With --before, the same runs are timed on a checkout of that git revision
+too, so a change is measured against the tree it started from.
+
+Usage: python bench_startup.py [--before REV] [--repeat 5] [--sessions 10]
+
+Medians of 5 processes with 20 later sessions each, in this repository's
+development container. Page times vary by 20-30% between identical runs;
+the Storage() column is steady.
+
+  SQLite, before user-035 (ba4b8af^) and after it:
+    ba4b8af^      login form 1238 ms, first page 82 ms; next session 223 + 81 ms, Storage() built at import
+    user-035      login form  739 ms, first page 140 ms (Storage() 22 ms); next session 199 + 76 ms, Storage() 0.63 ms
+
+  Postgres over a local socket, schema checked on every Storage() and then once per process:
+    each Storage  login form  627 ms, first page 176 ms; next session 201 + 88 ms, Storage() 1.78 ms
+    per process   login form  575 ms, first page 157 ms; next session 161 + 68 ms, Storage() 0.58 ms
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+# Runs in the tree being measured; prints the timings as JSON
+CHILD = r"""
+import json, os, statistics, sys, time
+from streamlit.testing.v1 import AppTest
+
+# Time spent constructing Storage, which is all a session pays for the database before its page queries
+constructing = []
+
+def time_storage():
+    # Patched once the app has imported storage, so the first login form still pays for the import
+    storage = sys.modules['storage']
+    construct = storage.Storage.__init__
+    if hasattr(construct, 'timed'):
+        return
+
+    def timed_init(self, *args, **kwargs):
+        start = time.perf_counter()
+        construct(self, *args, **kwargs)
+        constructing.append((time.perf_counter() - start) * 1000)
+
+    timed_init.timed = True
+    storage.Storage.__init__ = timed_init
+
+def timed(app):
+    start = time.perf_counter()
+    app.run()
+    assert not app.exception, app.exception
+    return (time.perf_counter() - start) * 1000
+
+def session():
+    app = AppTest.from_file('main.py', default_timeout=300)
+    login = timed(app)
+    assert [field for field in app.text_input if field.label == 'পাসওয়ার্ড'], "login form not shown"
+    app.session_state['authenticated'] = True
+    time_storage()
+    del constructing[:]
+    page = timed(app)
+    return login, page, sum(constructing)
+
+login, page, first_storage = session()
+later = [session() for _ in range(int(sys.argv[1]))]
+print(json.dumps({'login': login, 'page': page, 'storage': first_storage,
+                  'next_login': statistics.median(run[0] for run in later),
+                  'next_page': statistics.median(run[1] for run in later),
+                  'next_storage': statistics.median(run[2] for run in later)}))
+# Worker threads the app started would keep the interpreter alive
+os._exit(0)
+"""
+
+def measure(tree, repeat, sessions):
+    """Median timings of repeat fresh processes running the app in tree, in milliseconds."""
+    runs = []
+    with tempfile.TemporaryDirectory() as directory:
+        env = dict(os.environ)
+        env.setdefault('DATABASE_URL', f"sqlite:///{os.path.join(directory, 'bench.db')}")
+        env.setdefault('INGEST_SPOOL_DIR', os.path.join(directory, 'spool'))
+        if os.path.exists(os.path.join(tree, 'migrations.py')):
+            subprocess.run([sys.executable, 'migrations.py'], cwd=tree, env=env, check=True, capture_output=True)
+        for _ in range(repeat):
+            result = subprocess.run([sys.executable, '-c', CHILD, str(sessions)], cwd=tree, env=env,
+                                    capture_output=True, text=True)
+            if result.returncode:
+                raise SystemExit(f"Run in {tree} failed:\n{result.stderr[-2000:]}")
+            runs.append(json.loads(result.stdout.strip().splitlines()[-1]))
+    return {key: statistics.median(run[key] for run in runs) for key in runs[0]}
+
+def report(name, timings):
+    print(f"{name}\n"
+          f"  first session   login form {timings['login']:6.0f} ms   first page {timings['page']:6.0f} ms"
+          f"   Storage() {timings['storage']:7.2f} ms\n"
+          f"  next session    login form {timings['next_login']:6.0f} ms   first page {timings['next_page']:6.0f} ms"
+          f"   Storage() {timings['next_storage']:7.2f} ms")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--before', help="git revision to measure as well, for comparison")
+    parser.add_argument('--repeat', type=int, default=5, help="fresh processes per tree")
+    parser.add_argument('--sessions', type=int, default=10, help="later sessions per process")
+    args = parser.parse_args()
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    if args.before:
+        with tempfile.TemporaryDirectory() as directory:
+            tree = os.path.join(directory, 'before')
+            subprocess.run(['git', 'worktree', 'add', '--detach', tree, args.before],
+                           cwd=here, check=True, capture_output=True)
+            try:
+                report(args.before, measure(tree, args.repeat, args.sessions))
+            finally:
+                subprocess.run(['git', 'worktree', 'remove', '--force', tree], cwd=here, check=True)
+    report('working tree', measure(here, args.repeat, args.sessions))
+
+if __name__ == '__main__':
+    main()
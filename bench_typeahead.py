@@ -0,0 +1,62 @@
+"""Measure typeahead index build, ranking and lookup times on synthetic names and voter numbers.
+
+Lookups are timed for prefixes of one to five characters, the ranked
+short prefixes and the scanned longer ones, and for a write applied to a
+ranked index.
+
+Usage: python bench_typeahead.py [--values 1000000] [--lookups 1000]
+"""
+import argparse
+import random
+import time
+from typeahead import PrefixIndex
+
+LETTERS = 'কখগঘঙচছজঝটঠডঢণতথদধনপফবভমযরলশসহ'
+
+def names(count, rng):
+    values = {}
+    for _ in range(count):
+        value = ''.join(rng.choice(LETTERS) for _ in range(rng.randint(3, 9)))
+        values[value] = values.get(value, 0) + rng.randint(1, 5)
+    return values
+
+def voter_numbers(count, rng):
+    return {str(rng.randrange(10**9, 10**10)): 1 for _ in range(count)}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--values', type=int, default=1000000)
+    parser.add_argument('--lookups', type=int, default=1000)
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    for field, counts, prefixes in [('নাম', names(args.values, rng), ['ক', 'কখ', 'কখগ', 'কখগঘ', 'কখগঘঙ']),
+                                    ('ভোটার_নং', voter_numbers(args.values, rng), ['1', '12', '123', '1234', '12345'])]:
+        start = time.perf_counter()
+        index = PrefixIndex(counts)
+        built = time.perf_counter() - start
+        start = time.perf_counter()
+        index.rank()
+        ranked = time.perf_counter() - start
+        print(f"{field}: {len(index.keys):,} values, build {built:.2f}s, rank {ranked:.2f}s")
+
+        for prefix in prefixes:
+            # The first lookup of a long prefix ranks and keeps it; later ones are timed as typed again
+            first = time.perf_counter()
+            index.complete(prefix)
+            first = time.perf_counter() - first
+            start = time.perf_counter()
+            for _ in range(args.lookups):
+                index.complete(prefix)
+            elapsed = (time.perf_counter() - start) / args.lookups
+            print(f"  {prefix!r:>10}: first {first * 1000:8.3f} ms, then {elapsed * 1000:8.3f} ms")
+
+        values = list(counts)[:args.lookups]
+        start = time.perf_counter()
+        for _ in range(args.lookups):
+            index.update(added=[rng.choice(values)], removed=[rng.choice(values)])
+        elapsed = (time.perf_counter() - start) / args.lookups
+        print(f"  update: {elapsed * 1000:.3f} ms")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+"""Load a directory tree of voter-list files into the database from the command line.
+
+Each top-level subdirectory becomes a batch (folder); files directly inside
+the root directory go into a batch named after the root. Files are parsed
+and loaded in parallel, one file per worker process, each streaming its
+file in INGEST_BATCH_SIZE batches so memory stays bounded however large the
+files are.
+
+Usage: DATABASE_URL=... python bulk_load.py DIRECTORY [--workers N]
+
+Files that an earlier run loaded completely are skipped, and partly loaded
+files continue after their last committed batch, so rerunning after a
+failure loads each record once. To load a file again, delete it (or its
+batch) in the app first.
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from data_processor import open_import_file, supported_extensions
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+_storage = None
+
+def find_files(root):
+    """Yield (batch_name, file_name, path) for every importable file under root, in sorted order."""
+    extensions = {f".{extension}" for extension in supported_extensions()}
+    root = os.path.abspath(root)
+    root_batch = os.path.basename(root)
+    for directory, subdirectories, files in os.walk(root):
+        subdirectories.sort()
+        for name in sorted(files):
+            if os.path.splitext(name)[1].lower() not in extensions:
+                continue
+            path = os.path.join(directory, name)
+            parts = os.path.relpath(path, root).split(os.sep)
+            if len(parts) == 1:
+                yield root_batch, name, path
+            else:
+                # Deeper directories stay part of the file name within the batch
+                yield parts[0], '/'.join(parts[1:]), path
+
+def init_worker():
+    """Create this worker process's Storage, and keep skipped-record warnings out of the output."""
+    global _storage
+    from storage import Storage
+    logging.getLogger('data_processor').setLevel(logging.ERROR)
+    _storage = Storage()
+
+def load_file(batch_name, file_name, path):
+    """Parse and load one file in a worker process. Returns (status, records, bytes)."""
+    full_filename = f"{batch_name}/{file_name}"
+    # Storage would start a completed file over and insert its records a second time
+    checkpoint = _storage.get_ingest_checkpoint(full_filename)
+    if checkpoint and checkpoint['completed']:
+        return 'skipped', 0, 0
+
+    records = open_import_file(path, file_name)
+    load = (_storage.add_file_frames_with_batch if records.mode == 'vectorized'
+            else _storage.add_file_data_with_batch)
+    load(file_name, batch_name, records)
+    return 'loaded', records.parsed, os.path.getsize(path)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('directory')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help="parallel worker processes (default: number of CPUs)")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.directory):
+        raise SystemExit(f"{args.directory} is not a directory")
+    files = list(find_files(args.directory))
+    if not files:
+        raise SystemExit(f"No importable files found under {args.directory}")
+
+    # Migrate once up front so the workers do not race to do it; the engine
+    # is disposed so no pooled connection is inherited by the forked workers
+    from storage import create_database_engine
+    from migrations import migrate
+    database_url = os.getenv("DATABASE_URL")
+    if not database_url:
+        raise SystemExit("DATABASE_URL environment variable is not set")
+    engine = create_database_engine(database_url)
+    migrate(engine)
+    engine.dispose()
+
+    print(f"Loading {len(files)} files with {args.workers} workers")
+    start = time.perf_counter()
+    totals = {'loaded': 0, 'skipped': 0, 'failed': 0, 'records': 0, 'bytes': 0}
+    failures = []
+
+    # Workers hold one file each, so at most `workers` files are in flight
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=init_worker) as executor:
+        futures = {
+            executor.submit(load_file, batch_name, file_name, path): f"{batch_name}/{file_name}"
+            for batch_name, file_name, path in files
+        }
+        for done, future in enumerate(as_completed(futures), 1):
+            full_filename = futures[future]
+            try:
+                status, records, size = future.result()
+                totals[status] += 1
+                totals['records'] += records
+                totals['bytes'] += size
+                print(f"[{done}/{len(files)}] {status} {full_filename}" + (f" ({records} records)" if records else ""))
+            except Exception as e:
+                totals['failed'] += 1
+                failures.append(full_filename)
+                print(f"[{done}/{len(files)}] FAILED {full_filename}: {str(e)}")
+
+    elapsed = time.perf_counter() - start
+    print(
+        f"\n{totals['loaded']} loaded, {totals['skipped']} skipped, {totals['failed']} failed in {elapsed:.1f}s\n"
+        f"{totals['records']:,} records, {totals['records'] / elapsed:,.0f} records/s, "
+        f"{totals['bytes'] / (1024 * 1024) / elapsed:.1f} MB/s"
+    )
+    if failures:
+        print("Rerun to retry the failed files:")
+        for full_filename in failures:
+            print(f"  {full_filename}")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
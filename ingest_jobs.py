@@ -0,0 +1,190 @@
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import time
+import uuid
+import logging
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from data_processor import open_import_file
+import storage as storage_module
+from storage import Storage, IngestJobStatus, IngestJobClaimLost
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Uploaded files are spooled here so jobs outlive the Streamlit session that queued them.
+# The default is local to the instance, so only one instance is supported with it: with more
+# (an autoscale deployment), set INGEST_SPOOL_DIR to storage every instance shares, or a job
+# whose instance stopped fails with "Spooled upload is missing" instead of being taken over
+SPOOL_DIR = os.getenv("INGEST_SPOOL_DIR", os.path.join(tempfile.gettempdir(), "voterdata_ingest"))
+MAX_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
+SPOOL_CHUNK_SIZE = 1024 * 1024
+# How often a pool renews the heartbeats of its jobs and looks for stale jobs to take over;
+# well below storage.INGEST_JOB_STALE_SECONDS
+HEARTBEAT_SECONDS = float(os.getenv("INGEST_HEARTBEAT_SECONDS", "30"))
+
+_pool = None
+_pool_lock = threading.Lock()
+
+class IngestWorkerPool:
+    """Process-wide pool of worker threads that parse and load spooled uploads"""
+
+    def __init__(self, max_workers=MAX_WORKERS, owner=None):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ingest")
+        self.local = threading.local()
+        # Identifies this process's claims on ingest jobs
+        self.owner = owner or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        # Jobs submitted and not finished yet, so a resume does not submit them twice
+        self.pending = set()
+
+    def submit(self, job_id):
+        """Schedule a queued job on the pool"""
+        self.pending.add(job_id)
+        self.executor.submit(self._run, job_id)
+
+    def start(self):
+        """Start the thread that renews this pool's job heartbeats and takes over stale jobs"""
+        threading.Thread(target=self._watch, name="ingest-watch", daemon=True).start()
+
+    def _watch(self):
+        # Also the first resume after a restart, retried every round until it succeeds
+        while True:
+            try:
+                storage = self._storage()
+                storage.heartbeat_ingest_jobs(self.owner)
+                resume_pending_jobs(self, storage)
+            except Exception as e:
+                logger.error(f"Error watching ingest jobs: {str(e)}")
+            time.sleep(HEARTBEAT_SECONDS)
+
+    def _storage(self):
+        """Each worker thread uses its own Storage because sessions are not thread safe"""
+        if not hasattr(self.local, 'storage'):
+            self.local.storage = Storage()
+        return self.local.storage
+
+    def _run(self, job_id):
+        try:
+            self._load(job_id)
+        finally:
+            self.pending.discard(job_id)
+
+    def _load(self, job_id):
+        storage = self._storage()
+        try:
+            if not storage.claim_ingest_job(job_id, self.owner):
+                logger.info(f"Ingest job {job_id} is gone, finished or claimed by another process")
+                return
+            job = storage.get_ingest_job(job_id)
+
+            # Records are parsed lazily from the spool file while loading
+            records = open_import_file(job['spool_path'], job['file_name'])
+            load = (storage.add_file_frames_with_batch if records.mode == 'vectorized'
+                    else storage.add_file_data_with_batch)
+            # The load marks the job completed in the same transaction as its final checkpoint
+            written = load(
+                job['file_name'],
+                job['batch_name'],
+                records,
+                progress_callback=lambda written: storage.update_ingest_job(
+                    job_id, rows_parsed=records.parsed, rows_written=written
+                ),
+                job_id=job_id,
+                job_owner=self.owner
+            )
+
+            if not written:
+                raise ValueError("কোন রেকর্ড পাওয়া যায়নি")
+
+            logger.info(f"Ingest job {job_id} loaded {written} records from {job['file_name']}")
+            remove_spool_file(job['spool_path'])
+
+        except IngestJobClaimLost as e:
+            # The process that took the job over loads the rest
+            logger.warning(str(e))
+        except Exception as e:
+            logger.error(f"Ingest job {job_id} failed: {str(e)}")
+            try:
+                storage.update_ingest_job(
+                    job_id,
+                    status=IngestJobStatus.FAILED,
+                    error=str(e),
+                    finished_at=datetime.utcnow()
+                )
+            except Exception as update_error:
+                logger.error(f"Could not record failure of ingest job {job_id}: {str(update_error)}")
+
+def get_worker_pool():
+    """Get the process-wide worker pool, starting it on first use.
+
+    Does not touch the database: the pool's watch thread resumes unfinished
+    jobs in the background.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = IngestWorkerPool()
+            _pool.start()
+        return _pool
+
+def resume_pending_jobs(pool, storage=None):
+    """Requeue queued or running jobs whose owner stopped sending heartbeats, such as a previous process.
+
+    Jobs with a recent heartbeat belong to a live process, this one or
+    another instance, and are left alone. A stale job whose spooled upload
+    is not here is failed. Returns False if the jobs could not be read.
+    """
+    try:
+        storage = storage or Storage()
+        pending = storage.get_ingest_jobs(
+            status=[IngestJobStatus.QUEUED, IngestJobStatus.RUNNING],
+            limit=1000
+        )
+        stale_before = datetime.utcnow() - timedelta(seconds=storage_module.INGEST_JOB_STALE_SECONDS)
+        for job in reversed(pending):
+            if job['id'] in pool.pending:
+                continue
+            if job['heartbeat_at'] is not None and job['heartbeat_at'] >= stale_before:
+                continue
+            if os.path.exists(job['spool_path']):
+                logger.info(f"Resuming ingest job {job['id']} for {job['file_name']}")
+                pool.submit(job['id'])
+            elif storage.fail_stale_ingest_job(job['id'], "Spooled upload is missing"):
+                logger.warning(f"Ingest job {job['id']} failed: spooled upload {job['spool_path']} is missing")
+        return True
+    except Exception as e:
+        logger.error(f"Error resuming pending ingest jobs: {str(e)}")
+        return False
+
+def enqueue_upload(storage, batch_name, uploaded_file):
+    """Spool an uploaded file to disk, record an ingest job and hand it to the workers"""
+    # Queued under the pool's owner, so other processes leave the job to this one while it is alive
+    pool = get_worker_pool()
+
+    os.makedirs(SPOOL_DIR, exist_ok=True)
+    # Keep the original extension so the worker can detect the import format
+    extension = os.path.splitext(uploaded_file.name)[1].lower()
+    fd, spool_path = tempfile.mkstemp(dir=SPOOL_DIR, suffix=f"{extension}.upload")
+    with os.fdopen(fd, 'wb') as f:
+        uploaded_file.seek(0)
+        shutil.copyfileobj(uploaded_file, f, SPOOL_CHUNK_SIZE)
+
+    try:
+        job_id = storage.create_ingest_job(batch_name, uploaded_file.name, spool_path, owner=pool.owner)
+    except Exception:
+        remove_spool_file(spool_path)
+        raise
+
+    pool.submit(job_id)
+    return job_id
+
+def remove_spool_file(path):
+    """Delete a spooled upload once it is no longer needed"""
+    try:
+        os.remove(path)
+    except OSError as e:
+        logger.warning(f"Could not remove spooled upload {path}: {str(e)}")
@@ -0,0 +1,218 @@
+"""Load test Storage with simulated concurrent app sessions.
+
+Each simulated session is a thread with its own Storage, like a browser
+session in the Streamlit app, repeatedly running a weighted mix of the
+app's operations: home page stats, search, paging through a file, marking
+relations and, rarely, uploading a small file. Concurrency is stepped
+through the given levels and, for each level, latency percentiles per
+operation, time spent waiting for a pooled connection and errors are
+reported.
+
+Usage: DATABASE_URL=... python loadtest.py [--sessions 1,5,10,20,40] [--duration 30]
+                                           [--think 0.5] [--release] [--keep]
+
+--release returns each session's connection to the pool after every
+operation instead of holding it while idle, as the app currently does.
+Uploaded test files go into the 'loadtest' folder, deleted at the end
+unless --keep is given.
+"""
+import argparse
+import logging
+import os
+import random
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from bench_parser import write_sample_file
+from data_processor import TextFileRecords
+from storage import Storage, RelationType, get_engine
+
+LOADTEST_FOLDER = 'loadtest'
+UPLOAD_RECORDS = 500
+
+# Relative frequency of each operation in a session
+SCENARIO_WEIGHTS = {
+    'home': 20,
+    'search': 35,
+    'page': 30,
+    'relation': 14,
+    'upload': 1
+}
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+class PoolWaitTimer:
+    """Measure how long each checkout waits for a connection from the engine's pool."""
+
+    def __init__(self, engine):
+        self.pool = engine.pool
+        self.waits = []
+        self.max_checked_out = 0
+        self.lock = threading.Lock()
+        get = self.pool._do_get
+
+        def timed_get():
+            start = time.perf_counter()
+            try:
+                return get()
+            finally:
+                elapsed = time.perf_counter() - start
+                with self.lock:
+                    self.waits.append(elapsed)
+                    self.max_checked_out = max(self.max_checked_out, self.pool.checkedout())
+
+        # Wraps the pool's internal checkout, which blocks while the pool is exhausted
+        self.pool._do_get = timed_get
+
+    def reset(self):
+        with self.lock:
+            waits, self.waits = self.waits, []
+            max_checked_out, self.max_checked_out = self.max_checked_out, 0
+        return sorted(waits), max_checked_out
+
+class Workload:
+    """Sample data shared by all sessions: file names, record ids and search terms."""
+
+    def __init__(self, storage, upload_path):
+        self.upload_path = upload_path
+        self.files = [name for name in storage.get_file_names() if not name.startswith(f"{LOADTEST_FOLDER}/")]
+        sample = storage.get_records_after(0, 1000)['records']
+        if not self.files or not sample:
+            raise SystemExit("The database has no records to test against; load some files first")
+        self.record_ids = [record['id'] for record in sample]
+        # Realistic searches from real records: a full name within an address, and exact voter numbers
+        self.searches = (
+            [{'নাম': record['নাম'], 'ঠিকানা': record['ঠিকানা'][:10]} for record in sample if record['নাম']]
+            + [{'ভোটার_নং': record['ভোটার_নং']} for record in sample if record['ভোটার_নং']]
+        )
+        self.uploads = 0
+        self.lock = threading.Lock()
+
+    def run(self, storage, scenario):
+        if scenario == 'home':
+            storage.get_file_names()
+            storage.get_total_records_count()
+        elif scenario == 'search':
+            storage.search_records(**random.choice(self.searches))
+        elif scenario == 'page':
+            storage.get_file_data(random.choice(self.files), page=random.randint(1, 5), per_page=100)
+        elif scenario == 'relation':
+            storage.mark_relation(random.choice(self.record_ids),
+                                  random.choice([RelationType.FRIEND, RelationType.ENEMY]))
+        elif scenario == 'upload':
+            with self.lock:
+                self.uploads += 1
+                number = self.uploads
+            storage.add_file_data_with_batch(f"upload_{number}_{threading.get_ident()}.txt", LOADTEST_FOLDER,
+                                             TextFileRecords(self.upload_path))
+
+def run_session(workload, stop, think, release, latencies, errors, lock):
+    """One simulated app session: create Storage, then run operations until stopped."""
+    scenarios = list(SCENARIO_WEIGHTS)
+    weights = list(SCENARIO_WEIGHTS.values())
+    try:
+        start = time.perf_counter()
+        storage = Storage()
+        with lock:
+            latencies['session_start'].append(time.perf_counter() - start)
+    except Exception as e:
+        with lock:
+            errors[f"session_start: {type(e).__name__}"] += 1
+        return
+
+    while not stop.is_set():
+        scenario = random.choices(scenarios, weights)[0]
+        start = time.perf_counter()
+        try:
+            workload.run(storage, scenario)
+            with lock:
+                latencies[scenario].append(time.perf_counter() - start)
+        except Exception as e:
+            with lock:
+                errors[f"{scenario}: {type(e).__name__}"] += 1
+        if release:
+            storage.release()
+        # Users read the page before their next action
+        stop.wait(random.expovariate(1 / think) if think else 0)
+    storage.release()
+
+def run_level(workload, sessions, duration, think, release, pool_timer):
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    lock = threading.Lock()
+    stop = threading.Event()
+    pool_timer.reset()
+
+    threads = [
+        threading.Thread(target=run_session, args=(workload, stop, think, release, latencies, errors, lock))
+        for _ in range(sessions)
+    ]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    waits, max_checked_out = pool_timer.reset()
+    operations = sum(len(values) for name, values in latencies.items() if name != 'session_start')
+    print(f"\n=== {sessions} sessions: {operations} operations in {elapsed:.1f}s "
+          f"({operations / elapsed:.1f} ops/s), {sum(errors.values())} errors ===")
+    print(f"{'operation':<14}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for name in ['session_start'] + list(SCENARIO_WEIGHTS):
+        values = sorted(latencies.get(name, []))
+        if values:
+            print(f"{name:<14}{len(values):>7}"
+                  + ''.join(f"{percentile(values, p) * 1000:>10.1f}" for p in (0.5, 0.95, 0.99))
+                  + f"{values[-1] * 1000:>10.1f}")
+    print(f"pool wait: p50 {percentile(waits, 0.5) * 1000:.1f} ms, p95 {percentile(waits, 0.95) * 1000:.1f} ms, "
+          f"max {(waits[-1] if waits else 0) * 1000:.1f} ms over {len(waits)} checkouts; "
+          f"peak {max_checked_out} connections checked out")
+    for name, count in sorted(errors.items()):
+        print(f"error {name}: {count}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sessions', default='1,5,10,20,40',
+                        help="comma-separated concurrency levels (default: 1,5,10,20,40)")
+    parser.add_argument('--duration', type=float, default=30, help="seconds per level (default: 30)")
+    parser.add_argument('--think', type=float, default=0.5,
+                        help="mean seconds between a session's operations (default: 0.5)")
+    parser.add_argument('--release', action='store_true',
+                        help="release each session's connection after every operation")
+    parser.add_argument('--keep', action='store_true', help="keep the uploaded test files")
+    args = parser.parse_args()
+    levels = [int(level) for level in args.sessions.split(',')]
+
+    # Per-record skip warnings and per-operation info logs would drown the report
+    logging.getLogger().setLevel(logging.WARNING)
+    logging.getLogger('data_processor').setLevel(logging.ERROR)
+
+    storage = Storage()
+    pool_timer = PoolWaitTimer(get_engine(os.getenv("DATABASE_URL")))
+
+    fd, upload_path = tempfile.mkstemp(suffix='.txt')
+    os.close(fd)
+    try:
+        write_sample_file(upload_path, UPLOAD_RECORDS)
+        workload = Workload(storage, upload_path)
+        storage.release()
+        print(f"{len(workload.files)} files, {len(workload.searches)} search terms, "
+              f"think time {args.think}s, {'releasing' if args.release else 'holding'} connections between operations")
+        for sessions in levels:
+            run_level(workload, sessions, args.duration, args.think, args.release, pool_timer)
+    finally:
+        os.remove(upload_path)
+        if not args.keep:
+            storage.delete_folder(LOADTEST_FOLDER)
+
+if __name__ == '__main__':
+    main()
@@ -1,16 +1,19 @@
 import streamlit as st
-import pandas as pd
-from data_processor import process_text_file
-from storage import Storage, RelationType
+from storage import Storage, RelationType, IngestJobStatus, search_cache
+from ingest_jobs import enqueue_upload, get_worker_pool
+from data_processor import supported_extensions
 import io
+import os
 import logging
-import functools
 from auth import init_auth, login_form, logout  # Add this line at the top
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Upload size limit; keep server.maxUploadSize in .streamlit/config.toml at least this large
+MAX_UPLOAD_MB = int(os.getenv("MAX_UPLOAD_MB", "2048"))
+
 # Set page configuration
 st.set_page_config(
     page_title="বাংলা টেক্সট প্রসেসিং",
@@ -21,7 +24,7 @@ st.set_page_config(
 # Sidebar navigation with icons
 page = st.sidebar.radio(
     "📑 পৃষ্ঠা নির্বাচন করুন",
-    ["🏠 হোম", "📤 ফাইল আপলোড", "🔍 অনুসন্ধান", "📋 সকল তথ্য", "📊 ডেটা বিশ্লেষণ", "👥 সম্পর্ক তালিকা"]
+    ["🏠 হোম", "📤 ফাইল আপলোড", "🔍 অনুসন্ধান", "📋 সকল তথ্য", "📊 ডেটা বিশ্লেষণ", "👥 সম্পর্ক তালিকা", "🗺️ ঠিকানা অনুযায়ী"]
 )
 
 # Initialize session state for file upload and editing
@@ -40,6 +43,9 @@ if 'editing' not in st.session_state:
 if 'file_to_delete' not in st.session_state:
     st.session_state.file_to_delete = None
 
+if 'folder_to_delete' not in st.session_state:
+    st.session_state.folder_to_delete = None
+
 # Initialize confirmation dialogs state
 if 'confirm_delete_all' not in st.session_state:
     st.session_state.confirm_delete_all = False
@@ -51,47 +57,67 @@ if 'confirm_delete' not in st.session_state:
 if 'processed_files' not in st.session_state:
     st.session_state.processed_files = set()
 
-# Initialize storage if not exists
-if 'storage' not in st.session_state:
-    st.session_state.storage = Storage()
-
-def process_uploaded_file(uploaded_file):
-    """Process a single uploaded file with proper error handling"""
+def process_uploaded_file(uploaded_file, batch_name):
+    """Validate an uploaded file and queue it for background ingest"""
     try:
-        if uploaded_file.size > 200 * 1024 * 1024:  # 200MB limit
-            return None, "ফাইলের সাইজ 200MB এর বেশি হতে পারবে না"
-
-        # Read file content with explicit encoding and error handling
-        try:
-            content = uploaded_file.getvalue().decode('utf-8-sig', errors='replace')
-        except UnicodeDecodeError:
-            return None, "ফাইলটি সঠিক ফরম্যাটে নেই। দয়া করে UTF-8 এনকোডিং ব্যবহার করুন।"
+        if uploaded_file.size > MAX_UPLOAD_MB * 1024 * 1024:
+            return None, f"ফাইলের সাইজ {MAX_UPLOAD_MB}MB এর বেশি হতে পারবে না"
 
-        # Process the content
-        records = process_text_file(content)
-        logger.info(f"Processed {len(records) if records else 0} records from {uploaded_file.name}")
-
-        if not records:
-            return None, "কোন রেকর্ড পাওয়া যায়নি"
+        job_id = enqueue_upload(st.session_state.storage, batch_name, uploaded_file)
+        logger.info(f"Queued ingest job {job_id} for {uploaded_file.name}")
+        return job_id, None
+    except Exception as e:
+        logger.error(f"Error queueing file {uploaded_file.name}: {str(e)}")
+        return None, f"ফাইল সারিবদ্ধ করতে সমস্যা: {str(e)}"
+
+JOB_STATUS_LABELS = {
+    IngestJobStatus.QUEUED.value: "⏳ অপেক্ষমান",
+    IngestJobStatus.RUNNING.value: "⚙️ চলছে",
+    IngestJobStatus.COMPLETED.value: "✅ সম্পন্ন",
+    IngestJobStatus.FAILED.value: "❌ ব্যর্থ"
+}
+
+@st.fragment(run_every=2)
+def show_ingest_jobs():
+    """Poll and display progress of background ingest jobs"""
+    import pandas as pd  # Imported lazily, only pages that build tables need it
+    try:
+        jobs = st.session_state.storage.get_ingest_jobs(limit=20)
+        if not jobs:
+            return
 
-        return records, None
+        st.markdown("##### আপলোড অগ্রগতি:")
+        df = pd.DataFrame([{
+            'ফোল্ডার': job['batch_name'],
+            'ফাইল': job['file_name'],
+            'অবস্থা': JOB_STATUS_LABELS.get(job['status'], job['status']),
+            'পার্স করা রেকর্ড': job['rows_parsed'],
+            'সংরক্ষিত রেকর্ড': job['rows_written'],
+            'রেকর্ড/সেকেন্ড': round(job['rows_per_sec'], 1),
+            'ত্রুটি': job['error'] or ''
+        } for job in jobs])
+        st.dataframe(df, use_container_width=True, hide_index=True)
     except Exception as e:
-        logger.error(f"Error processing file {uploaded_file.name}: {str(e)}")
-        return None, f"ফাইল প্রক্রিয়াকরণে সমস্যা: {str(e)}"
+        st.error(f"❌ আপলোড অগ্রগতি লোড করতে সমস্যা: {str(e)}")
+        logger.error(f"Error loading ingest jobs: {str(e)}")
+    finally:
+        # Fragment reruns skip the release at the end of main()
+        st.session_state.storage.release()
 
 def show_upload_page():
     st.header("📤 ফাইল আপলোড")
 
     # Add description with clear file requirements
-    st.markdown("""
+    st.markdown(f"""
     #### ব্যবহার নির্দেশিকা:
-    1. একাধিক টেক্সট ফাইল একসাথে আপলোড করতে পারবেন
-    2. প্রতিটি ফাইল স্বয়ংক্রিয়ভাবে প্রক্রিয়াকরণ করা হবে
+    1. একাধিক টেক্সট, CSV বা Excel ফাইল একসাথে আপলোড করতে পারবেন
+    2. প্রতিটি ফাইল পটভূমিতে প্রক্রিয়াকরণ করা হবে, পৃষ্ঠা ছেড়ে গেলেও কাজ চলবে
     3. ডেটা সুরক্ষিতভাবে সংরক্ষণ করা হবে
 
     **সীমাবদ্ধতা:**
-    - সর্বোচ্চ ফাইল সাইজ: 200MB
-    - শুধুমাত্র .txt ফাইল সমর্থিত
+    - সর্বোচ্চ ফাইল সাইজ: {MAX_UPLOAD_MB}MB
+    - সমর্থিত ফাইল: {', '.join('.' + ext for ext in supported_extensions())}
+    - CSV/Excel ফাইলের প্রথম সারিতে কলামের নাম থাকতে হবে (যেমন: ক্রমিক নং, নাম, ভোটার নং)
     - ফাইল এনকোডিং: UTF-8
     """)
 
@@ -104,8 +130,8 @@ def show_upload_page():
 
     try:
         uploaded_files = st.file_uploader(
-            "টেক্সট ফাইল নির্বাচন করুন",
-            type=['txt'],
+            "ফাইল নির্বাচন করুন",
+            type=supported_extensions(),
             accept_multiple_files=True,
             key="file_uploader",
             help="একাধিক ফাইল নির্বাচন করতে Ctrl/Cmd চেপে ক্লিক করুন"
@@ -116,63 +142,29 @@ def show_upload_page():
             return
 
         if uploaded_files and batch_name:
-            total_records = 0
             for uploaded_file in uploaded_files:
                 if not uploaded_file:
                     continue
 
+                # Reruns must not queue the same upload twice
                 batch_file_key = f"{batch_name}/{uploaded_file.name}"
                 if batch_file_key in st.session_state.processed_files:
                     continue
 
-                with st.spinner(f'"{uploaded_file.name}" প্রক্রিয়াকরণ চলছে...'):
-                    try:
-                        records, error = process_uploaded_file(uploaded_file)
-
-                        if error:
-                            st.error(f"❌ '{uploaded_file.name}': {error}")
-                            continue
-
-                        if not records:
-                            st.warning(f"⚠️ '{uploaded_file.name}': কোন রেকর্ড পাওয়া যায়নি")
-                            continue
-
-                        try:
-                            # Save to database with batch information
-                            st.session_state.storage.add_file_data_with_batch(
-                                uploaded_file.name,
-                                batch_name,
-                                records
-                            )
-
-                            # Update success status
-                            total_records += len(records)
-                            st.success(f"✅ '{uploaded_file.name}' সফলভাবে '{batch_name}' ফোল্ডারে আপলোড হয়েছে ({len(records)}টি রেকর্ড)")
-
-                            # Show sample data
-                            if records:
-                                st.markdown("##### নমুনা ডেটা:")
-                                sample_df = pd.DataFrame([records[0]])
-                                st.dataframe(sample_df, use_container_width=True)
-
-                            # Mark as processed
-                            st.session_state.processed_files.add(batch_file_key)
-
-                        except Exception as e:
-                            logger.error(f"Error saving file {uploaded_file.name}: {str(e)}")
-                            st.error(f"❌ ডেটা সংরক্ষণে সমস্যা। অনুগ্রহ করে আবার চেষ্টা করুন।")
-
-                    except Exception as e:
-                        logger.error(f"Error processing file {uploaded_file.name}: {str(e)}")
-                        st.error(f"❌ ফাইল প্রক্রিয়াকরণে সমস্যা: {str(e)}")
+                job_id, error = process_uploaded_file(uploaded_file, batch_name)
+                if error:
+                    st.error(f"❌ '{uploaded_file.name}': {error}")
+                    continue
 
-            if total_records > 0:
-                st.info(f"📈 সর্বমোট {total_records}টি রেকর্ড সফলভাবে '{batch_name}' ফোল্ডারে আপলোড হয়েছে")
+                st.session_state.processed_files.add(batch_file_key)
+                st.success(f"✅ '{uploaded_file.name}' '{batch_name}' ফোল্ডারে আপলোডের জন্য সারিবদ্ধ হয়েছে")
 
     except Exception as e:
         st.error(f"❌ অপ্রত্যাশিত সমস্যা: {str(e)}")
         logger.error(f"Unexpected error in file upload: {str(e)}")
 
+    show_ingest_jobs()
+
 def edit_record(record_id, record_data):
     """Edit record dialog"""
     st.markdown("<div class='edit-form'>", unsafe_allow_html=True)
@@ -209,112 +201,147 @@ def edit_record(record_id, record_data):
     st.markdown("</div>", unsafe_allow_html=True)
     return False
 
-def display_record_card(record, record_id):
-    """Display a single record in a card format with relation buttons"""
+# Columns shown in record tables, in display order
+RECORD_COLUMNS = {
+    'ক্রমিক_নং': 'ক্রমিক নং',
+    'নাম': 'নাম',
+    'ভোটার_নং': 'ভোটার নং',
+    'পিতার_নাম': 'পিতার নাম',
+    'মাতার_নাম': 'মাতার নাম',
+    'পেশা': 'পেশা',
+    'জন্ম_তারিখ': 'জন্ম তারিখ',
+    'ঠিকানা': 'ঠিকানা',
+    'file_name': 'ফাইল',
+    'relation_type': 'সম্পর্ক'
+}
+
+RELATION_LABELS = {
+    RelationType.FRIEND.value: "👥 বন্ধু",
+    RelationType.ENEMY.value: "⚔️ শত্রু",
+    RelationType.NONE.value: "🔄 অজানা"
+}
+
+def show_records_table(records, key):
+    """Display records (a DataFrame or list of dictionaries) as a paginated table and apply actions to the selected rows"""
+    import pandas as pd
     try:
-        relation_type = record.get('relation_type', RelationType.NONE.value)
-
-        # Render entire card in a single markdown call
-        st.markdown(f"""
-            <div style="background: white; border-radius: 16px; box-shadow: 0 4px 12px rgba(0,0,0,0.08); 
-                        padding: 1.5rem; margin: 1.5rem 0; border: 1px solid #f0f0f0;">
-                <div style="display: flex; justify-content: space-between; align-items: center; margin-bottom: 1rem;">
-                    <div>
-                        <h3 style="margin: 0; color: #1f1f1f; font-size: 1.5rem; font-weight: 600;">
-                            {record['নাম']}
-                        </h3>
-                        <p style="margin: 0.25rem 0 0 0; color: #666; font-size: 0.9rem;">
-                            ভোটার নং: {record['ভোটার_নং']}
-                        </p>
-                    </div>
-                    <div style="
-                        background: {'#e6f4ea' if relation_type == RelationType.FRIEND.value else '#fce8e8' if relation_type == RelationType.ENEMY.value else '#f8f9fa'};
-                        color: {'#137333' if relation_type == RelationType.FRIEND.value else '#c5221f' if relation_type == RelationType.ENEMY.value else '#5f6368'};
-                        padding: 0.5rem 1rem;
-                        border-radius: 50px;
-                        font-size: 0.875rem;
-                        font-weight: 500;
-                    ">
-                        {"👥 বন্ধু" if relation_type == RelationType.FRIEND.value else "⚔️ শত্রু" if relation_type == RelationType.ENEMY.value else "🔄 অজানা"}
-                    </div>
-                </div>
-                <div style="display: grid; grid-template-columns: repeat(2, 1fr); gap: 1.5rem;">
-                    <div style="background: #f8f9fa; padding: 1rem; border-radius: 12px;">
-                        <div style="margin-bottom: 1rem;">
-                            <p style="margin: 0.5rem 0; color: #666; font-size: 0.875rem;">ক্রমিক নং</p>
-                            <p style="margin: 0; color: #1f1f1f; font-weight: 500;">{record['ক্রমিক_নং']}</p>
-                        </div>
-                        <div style="margin-bottom: 1rem;">
-                            <p style="margin: 0.5rem 0; color: #666; font-size: 0.875rem;">পিতার নাম</p>
-                            <p style="margin: 0; color: #1f1f1f; font-weight: 500;">{record['পিতার_নাম']}</p>
-                        </div>
-                        <div style="margin-bottom: 1rem;">
-                            <p style="margin: 0.5rem 0; color: #666; font-size: 0.875rem;">মাতার নাম</p>
-                            <p style="margin: 0; color: #1f1f1f; font-weight: 500;">{record['মাতার_নাম']}</p>
-                        </div>
-                        <div>
-                            <p style="margin: 0.5rem 0; color: #666; font-size: 0.875rem;">জন্ম তারিখ</p>
-                            <p style="margin: 0; color: #1f1f1f; font-weight: 500;">{record['জন্ম_তারিখ']}</p>
-                        </div>
-                    </div>
-                    <div style="background: #f8f9fa; padding: 1rem; border-radius: 12px;">
-                        <div style="margin-bottom: 1rem;">
-                            <p style="margin: 0.5rem 0; color: #666; font-size: 0.875rem;">পেশা</p>
-                            <p style="margin: 0; color: #1f1f1f; font-weight: 500;">{record['পেশা']}</p>
-                        </div>
-                        <div style="margin-bottom: 1rem;">
-                            <p style="margin: 0.5rem 0; color: #666; font-size: 0.875rem;">ঠিকানা</p>
-                            <p style="margin: 0; color: #1f1f1f; font-weight: 500;">{record['ঠিকানা']}</p>
-                        </div>
-                        <div>
-                            <p style="margin: 0.5rem 0; color: #666; font-size: 0.875rem;">ফাইল</p>
-                            <p style="margin: 0; color: #1f1f1f; font-weight: 500;">📂 {record['file_name']}</p>
-                        </div>
-                    </div>
-                </div>
-            </div>
-        """, unsafe_allow_html=True)
+        if not isinstance(records, pd.DataFrame):
+            records = pd.DataFrame(records, columns=['id'] + list(RECORD_COLUMNS))
+        col1, col2 = st.columns([1, 3])
+        with col1:
+            per_page = st.selectbox('প্রতি পৃষ্ঠায় রেকর্ড', [25, 50, 100, 200], index=1, key=f"{key}_per_page")
+        pages = max(1, (len(records) + per_page - 1) // per_page)
+        with col2:
+            page = st.number_input('পৃষ্ঠা নম্বর', min_value=1, max_value=pages, value=1, key=f"{key}_page")
+
+        # Only the visible page is sent to the browser
+        start = (page - 1) * per_page
+        page_records = records.iloc[start:start + per_page]
+
+        df = page_records[list(RECORD_COLUMNS)].copy()
+        df['relation_type'] = df['relation_type'].map(RELATION_LABELS).fillna(RELATION_LABELS[RelationType.NONE.value])
+        df = df.rename(columns=RECORD_COLUMNS)
+
+        event = st.dataframe(
+            df,
+            use_container_width=True,
+            hide_index=True,
+            on_select="rerun",
+            selection_mode="multi-row",
+            key=f"{key}_table_{page}_{per_page}"
+        )
+        st.caption(f"মোট {len(records)}টি রেকর্ড (পৃষ্ঠা {page}/{pages})")
+
+        selected = page_records.iloc[event.selection.rows].to_dict('records')
+        if not selected:
+            st.info("ℹ️ কাজ করতে টেবিল থেকে এক বা একাধিক সারি নির্বাচন করুন")
+            return
 
-        # Action buttons
+        selected_ids = [record['id'] for record in selected]
+        st.write(f"✅ {len(selected)}টি রেকর্ড নির্বাচিত")
+
+        # Action buttons for the selected rows
         col1, col2, col3, col4 = st.columns(4)
 
         with col1:
-            if st.button("✏️ সম্পাদনা", key=f"edit_{record_id}", type="primary"):
-                st.session_state.editing = record_id
+            if st.button("✏️ সম্পাদনা", key=f"{key}_edit", type="primary", disabled=len(selected) != 1):
+                st.session_state.editing = selected_ids[0]
 
         with col2:
-            if st.button("🗑️ মুছুন", key=f"delete_{record_id}", type="secondary"):
-                if st.session_state.storage.delete_record(record_id):
-                    st.success("✅ রেকর্ড মুছে ফেলা হয়েছে")
+            if st.button("🗑️ মুছুন", key=f"{key}_delete", type="secondary"):
+                deleted = sum(1 for record_id in selected_ids if st.session_state.storage.delete_record(record_id))
+                if deleted == len(selected_ids):
+                    st.success(f"✅ {deleted}টি রেকর্ড মুছে ফেলা হয়েছে")
                     st.rerun()
                 else:
-                    st.error("❌ রেকর্ড মুছে ফেলা যায়নি")
+                    st.error(f"❌ {len(selected_ids) - deleted}টি রেকর্ড মুছে ফেলা যায়নি")
 
         with col3:
-            if relation_type != RelationType.FRIEND.value:
-                if st.button("👥 বন্ধু হিসেবে যোগ করুন", key=f"friend_{record_id}"):
-                    if st.session_state.storage.mark_relation(record_id, RelationType.FRIEND):
-                        st.success("✅ বন্ধু হিসেবে চিহ্নিত করা হয়েছে")
-                        st.rerun()
-                    else:
-                        st.error("❌ বন্ধু হিসেবে চিহ্নিত করা যায়নি")
+            if st.button("👥 বন্ধু হিসেবে যোগ করুন", key=f"{key}_friend"):
+                marked = sum(1 for record_id in selected_ids
+                             if st.session_state.storage.mark_relation(record_id, RelationType.FRIEND))
+                if marked == len(selected_ids):
+                    st.success("✅ বন্ধু হিসেবে চিহ্নিত করা হয়েছে")
+                    st.rerun()
+                else:
+                    st.error(f"❌ {len(selected_ids) - marked}টি রেকর্ড বন্ধু হিসেবে চিহ্নিত করা যায়নি")
 
         with col4:
-            if relation_type != RelationType.ENEMY.value:
-                if st.button("⚔️ শত্রু হিসেবে যোগ করুন", key=f"enemy_{record_id}"):
-                    if st.session_state.storage.mark_relation(record_id, RelationType.ENEMY):
-                        st.success("✅ শত্রু হিসেবে চিহ্নিত করা হয়েছে")
-                        st.rerun()
-                    else:
-                        st.error("❌ শত্রু হিসেবে চিহ্নিত করা যায়নি")
+            if st.button("⚔️ শত্রু হিসেবে যোগ করুন", key=f"{key}_enemy"):
+                marked = sum(1 for record_id in selected_ids
+                             if st.session_state.storage.mark_relation(record_id, RelationType.ENEMY))
+                if marked == len(selected_ids):
+                    st.success("✅ শত্রু হিসেবে চিহ্নিত করা হয়েছে")
+                    st.rerun()
+                else:
+                    st.error(f"❌ {len(selected_ids) - marked}টি রেকর্ড শত্রু হিসেবে চিহ্নিত করা যায়নি")
 
-        if st.session_state.editing == record_id:
-            if edit_record(record_id, record):
+        if st.session_state.editing in selected_ids:
+            record = selected[selected_ids.index(st.session_state.editing)]
+            if edit_record(record['id'], record):
                 st.session_state.editing = None
                 st.rerun()
 
     except Exception as e:
         st.error(f"রেকর্ড প্রদর্শনে সমস্যা: {str(e)}")
+        logger.error(f"Error displaying records table: {str(e)}")
+
+def show_records_editor(records, key):
+    """Editable grid of records; changed cells are saved together with one bulk update"""
+    edited = st.data_editor(
+        records,
+        use_container_width=True,
+        hide_index=True,
+        disabled=['id', 'file_name', 'relation_type'],
+        key=key
+    )
+
+    fields = [field for field in RECORD_COLUMNS if field not in ('file_name', 'relation_type')]
+    changed = edited[fields].fillna('') != records[fields].fillna('')
+    updates = {
+        int(records.at[row, 'id']): {field: edited.at[row, field] for field in fields if changed.at[row, field]}
+        for row in changed.index[changed.any(axis=1)]
+    }
+    if not updates:
+        return
+
+    st.write(f"✏️ {len(updates)}টি রেকর্ডে {int(changed.values.sum())}টি ঘর পরিবর্তিত")
+    col1, col2 = st.columns(2)
+    with col1:
+        if st.button("💾 পরিবর্তন সংরক্ষণ করুন", key=f"{key}_save", type="primary", use_container_width=True):
+            try:
+                updated = st.session_state.storage.bulk_update_records(updates)
+                st.success(f"✅ {updated}টি রেকর্ড আপডেট করা হয়েছে")
+                # The saved values are reloaded, so the grid's pending edits are dropped
+                del st.session_state[key]
+                st.rerun()
+            except Exception as e:
+                st.error(f"❌ পরিবর্তন সংরক্ষণ করতে সমস্যা: {str(e)}")
+                logger.error(f"Error saving grid edits: {str(e)}")
+    with col2:
+        if st.button("↩️ পরিবর্তন বাতিল করুন", key=f"{key}_discard", use_container_width=True):
+            del st.session_state[key]
+            st.rerun()
 
 def show_all_data_page():
     st.header("📋 সংরক্ষিত সকল তথ্য")
@@ -368,7 +395,36 @@ def show_all_data_page():
                     folders['অন্যান্য'] = []
                 folders['অন্যান্য'].append(file)
 
-        selected_folder = st.selectbox("📁 ফোল্ডার নির্বাচন করুন", list(folders.keys()))
+        folder_col1, folder_col2 = st.columns([4, 1])
+        with folder_col1:
+            selected_folder = st.selectbox("📁 ফোল্ডার নির্বাচন করুন", list(folders.keys()))
+        with folder_col2:
+            # Files outside a folder are grouped under 'অন্যান্য' and have no folder to delete
+            if selected_folder and selected_folder != 'অন্যান্য' and st.button("🗑️ ফোল্ডার মুছুন", key=f"delete_folder_{selected_folder}"):
+                st.session_state.folder_to_delete = selected_folder
+
+        # Folder deletion confirmation
+        if st.session_state.folder_to_delete:
+            st.warning(f"""
+            ⚠️ সতর্কতা!
+            আপনি কি নিশ্চিত যে আপনি '{st.session_state.folder_to_delete}' ফোল্ডারের সকল ফাইল এবং রেকর্ড মুছে ফেলতে চান?
+            """)
+
+            confirm_col1, confirm_col2 = st.columns([1, 1])
+            with confirm_col1:
+                if st.button("হ্যাঁ, মুছে ফেলুন", key="confirm_folder_delete", type="primary"):
+                    try:
+                        st.session_state.storage.delete_folder(st.session_state.folder_to_delete)
+                        st.success(f"✅ '{st.session_state.folder_to_delete}' ফোল্ডার এবং এর সকল রেকর্ড মুছে ফেলা হয়েছে")
+                        st.session_state.folder_to_delete = None
+                        st.rerun()
+                    except Exception as e:
+                        st.error(f"❌ ফোল্ডার মুছে ফেলার সময় সমস্যা হয়েছে: {str(e)}")
+
+            with confirm_col2:
+                if st.button("না, বাতিল করুন", key="cancel_folder_delete", type="secondary"):
+                    st.session_state.folder_to_delete = None
+                    st.rerun()
 
         if selected_folder:
             files_in_folder = folders[selected_folder]
@@ -414,20 +470,20 @@ def show_all_data_page():
                 # Add pagination
                 page = st.number_input('পৃষ্ঠা নম্বর', min_value=1, value=1)
                 per_page = st.select_slider('প্রতি পৃষ্ঠায় রেকর্ড সংখ্যা', 
-                                              options=[50, 100, 200, 500], 
+                                              options=[50, 100, 200, 500, 1000, 2000], 
                                               value=100)
 
                 with st.spinner('তথ্য লোড হচ্ছে...'):
                     result = st.session_state.storage.get_file_data(
                         selected_file, 
                         page=page, 
-                        per_page=per_page
+                        per_page=per_page,
+                        columnar=True
                     )
 
-                    if result['records']:
+                    if not result['records'].empty:
                         st.info(f"মোট {result['total']} রেকর্ডের মধ্যে {per_page} টি দেখানো হচ্ছে (পৃষ্ঠা {page}/{result['pages']})")
-                        df = pd.DataFrame(result['records'])
-                        st.dataframe(df, use_container_width=True, hide_index=True)
+                        show_records_editor(result['records'], key=f"editor_{selected_file}_{page}_{per_page}")
                     else:
                         st.info("❌ নির্বাচিত ফাইলে কোন তথ্য নেই")
 
@@ -436,6 +492,7 @@ def show_all_data_page():
         logger.error(f"Error in show_all_data_page: {str(e)}")
 
 def show_analysis_page():
+    import pandas as pd
     st.header("📊 পেশা ভিত্তিক বিশ্লেষণ")
 
     try:
@@ -462,58 +519,157 @@ def show_analysis_page():
         )
 
         if selected_folder:
+            try:
+                # One cached query for the whole page; every breakdown below is a pandas rollup.
+                # It runs in the background while an estimate from the sample is shown
+                storage = st.session_state.storage
+                cube = storage.get_analytics_cube(wait=False)
+                if cube is None:
+                    show_occupation_estimate(selected_folder)
+                    rerun_when_ready(lambda: storage.get_analytics_cube(wait=False))
+                    return
+                cube_df = pd.DataFrame(cube['rows'], columns=list(CUBE_DIMENSIONS.values()) + ['সংখ্যা'])
+                if selected_folder != "সকল":
+                    cube_df = cube_df[cube_df['ফোল্ডার'] == selected_folder]
+            except Exception as e:
+                st.error(f"বিশ্লেষণে সমস্যা হয়েছে: {str(e)}")
+                logger.error(f"Analysis error: {str(e)}")
+                return
+
             st.subheader(f"📊 {selected_folder} - পেশা অনুযায়ী বিশ্লেষণ")
 
-            with st.spinner('বিশ্লেষণ চলছে...'):
-                try:
-                    # Get occupation statistics directly from database
-                    stats = st.session_state.storage.get_occupation_stats(selected_folder)
-
-                    if stats:
-                        total_records = sum(count for _, count in stats)
-
-                        # Create DataFrame for visualization
-                        df = pd.DataFrame(stats, columns=['পেশা', 'সংখ্যা'])
-                        df['শতাংশ'] = (df['সংখ্যা'] / total_records * 100).round(2)
-
-                        # Show total records
-                        st.markdown(f"""
-                            <div style="background-color: #f0f2f6; padding: 1rem; border-radius: 10px; margin-bottom: 1rem;">
-                                <h4 style="margin: 0;">📈 মোট রেকর্ড: {total_records:,}</h4>
-                            </div>
-                        """, unsafe_allow_html=True)
-
-                        # Display data in two columns
-                        col1, col2 = st.columns([3, 2])
-
-                        with col1:
-                            # Bar chart
-                            st.bar_chart(
-                                df.set_index('পেশা')['সংখ্যা'],
-                                use_container_width=True
-                            )
-
-                        with col2:
-                            # Detailed stats table
-                            st.markdown("""
-                                <div style="background-color: white; padding: 1rem; border-radius: 10px; box-shadow: 0 2px 4px rgba(0,0,0,0.1);">
-                                    <h4 style="margin-bottom: 1rem;">📋 বিস্তারিত তথ্য</h4>
-                                </div>
-                            """, unsafe_allow_html=True)
-
-                            st.dataframe(df, use_container_width=True, hide_index=True)
-                    else:
-                        st.info("❌ নির্বাচিত ফোল্ডারে কোন রেকর্ড নেই")
+            occupations = cube_df[cube_df['পেশা'].fillna('') != '']
+            df = (occupations.groupby('পেশা', as_index=False)['সংখ্যা'].sum()
+                  .sort_values('সংখ্যা', ascending=False))
 
-                except Exception as e:
-                    st.error(f"বিশ্লেষণে সমস্যা হয়েছে: {str(e)}")
-                    logger.error(f"Analysis error: {str(e)}")
+            if not df.empty:
+                total_records = int(df['সংখ্যা'].sum())
+                df['শতাংশ'] = (df['সংখ্যা'] / total_records * 100).round(2)
+
+                # Show total records
+                st.markdown(f"""
+                    <div style="background-color: #f0f2f6; padding: 1rem; border-radius: 10px; margin-bottom: 1rem;">
+                        <h4 style="margin: 0;">📈 মোট রেকর্ড: {total_records:,}</h4>
+                    </div>
+                """, unsafe_allow_html=True)
+
+                # Display data in two columns
+                col1, col2 = st.columns([3, 2])
+
+                with col1:
+                    # Bar chart
+                    st.bar_chart(
+                        df.set_index('পেশা')['সংখ্যা'],
+                        use_container_width=True
+                    )
+
+                with col2:
+                    # Detailed stats table
+                    st.markdown("""
+                        <div style="background-color: white; padding: 1rem; border-radius: 10px; box-shadow: 0 2px 4px rgba(0,0,0,0.1);">
+                            <h4 style="margin-bottom: 1rem;">📋 বিস্তারিত তথ্য</h4>
+                        </div>
+                    """, unsafe_allow_html=True)
+
+                    st.dataframe(df, use_container_width=True, hide_index=True)
+            else:
+                st.info("❌ নির্বাচিত ফোল্ডারে কোন রেকর্ড নেই")
+
+            st.subheader(f"🎂 {selected_folder} - বয়স অনুযায়ী বিশ্লেষণ")
+
+            # Age bands come from the parsed birth_date column; unparsed dates have no band
+            age_df = (cube_df.dropna(subset=['বয়স']).groupby('বয়স')['সংখ্যা'].sum()
+                      .reindex(cube['age_bands']).dropna().astype(int)
+                      .rename_axis('বয়স').reset_index())
+
+            if not age_df.empty:
+                age_df['শতাংশ'] = (age_df['সংখ্যা'] / age_df['সংখ্যা'].sum() * 100).round(2)
+
+                col1, col2 = st.columns([3, 2])
+                with col1:
+                    # Indexed by a categorical so the bands keep their age order in the chart
+                    chart_index = pd.CategoricalIndex(age_df['বয়স'], categories=cube['age_bands'], ordered=True)
+                    st.bar_chart(age_df.set_index(chart_index)['সংখ্যা'], use_container_width=True)
+                with col2:
+                    st.dataframe(age_df, use_container_width=True, hide_index=True)
+            else:
+                st.info("❌ নির্বাচিত ফোল্ডারে জন্ম তারিখসহ কোন রেকর্ড নেই")
+
+            st.subheader(f"🧮 {selected_folder} - বহুমাত্রিক বিশ্লেষণ")
+            show_cube_pivot(cube_df, cube['age_bands'])
 
     except Exception as e:
         st.error(f"❌ ফোল্ডার তালিকা লোড করতে সমস্যা হয়েছে: {str(e)}")
         logger.error(f"Error loading folders: {str(e)}")
 
 
+def show_occupation_estimate(folder):
+    """Occupation breakdown estimated from the sample buckets, shown until the exact analysis is ready"""
+    import pandas as pd
+    st.subheader(f"📊 {folder} - পেশা অনুযায়ী বিশ্লেষণ (আনুমানিক)")
+    st.info("⏳ সম্পূর্ণ বিশ্লেষণ চলছে; ততক্ষণ নমুনা থেকে আনুমানিক হিসাব দেখানো হচ্ছে")
+
+    stats = st.session_state.storage.estimate_occupation_stats(folder)
+    if not stats:
+        st.info("❌ নমুনায় কোন রেকর্ড নেই, সম্পূর্ণ বিশ্লেষণের অপেক্ষা করুন")
+        return
+    df = pd.DataFrame(stats, columns=['পেশা', 'আনুমানিক সংখ্যা', '± (৯৫%)'])
+    total_records = int(df['আনুমানিক সংখ্যা'].sum())
+    df['শতাংশ'] = (df['আনুমানিক সংখ্যা'] / total_records * 100).round(1)
+
+    st.markdown(f"""
+        <div style="background-color: #f0f2f6; padding: 1rem; border-radius: 10px; margin-bottom: 1rem;">
+            <h4 style="margin: 0;">📈 আনুমানিক মোট রেকর্ড: ≈ {total_records:,}</h4>
+        </div>
+    """, unsafe_allow_html=True)
+
+    col1, col2 = st.columns([3, 2])
+    with col1:
+        st.bar_chart(df.set_index('পেশা')['আনুমানিক সংখ্যা'], use_container_width=True)
+    with col2:
+        st.dataframe(df, use_container_width=True, hide_index=True)
+
+# Analytics cube columns, in the order Storage.get_analytics_cube returns them
+CUBE_DIMENSIONS = {
+    'folder': 'ফোল্ডার',
+    'file_name': 'ফাইল',
+    'occupation': 'পেশা',
+    'age_band': 'বয়স'
+}
+
+def show_cube_pivot(cube_df, age_bands):
+    """Pivot the analytics cube on any two dimensions, with drill-down filters; no database access."""
+    import pandas as pd
+    dimensions = list(CUBE_DIMENSIONS.values())
+
+    col1, col2 = st.columns(2)
+    with col1:
+        rows = st.selectbox("সারি", dimensions, index=dimensions.index('পেশা'), key="cube_rows")
+    with col2:
+        columns = st.selectbox("কলাম", ["—"] + [d for d in dimensions if d != rows], key="cube_columns")
+
+    # Drill down: restrict any other dimension to chosen values
+    filtered = cube_df.fillna({'ফোল্ডার': 'অন্যান্য', 'পেশা': '', 'বয়স': 'অজানা'})
+    filter_columns = st.columns(len(dimensions) - 1)
+    for filter_column, dimension in zip(filter_columns, [d for d in dimensions if d != rows]):
+        with filter_column:
+            chosen = st.multiselect(dimension, sorted(filtered[dimension].unique()), key=f"cube_filter_{dimension}")
+        if chosen:
+            filtered = filtered[filtered[dimension].isin(chosen)]
+
+    if filtered.empty:
+        st.info("❌ নির্বাচিত শর্তে কোন রেকর্ড নেই")
+        return
+
+    if columns == "—":
+        pivot = filtered.groupby(rows)['সংখ্যা'].sum().sort_values(ascending=False).to_frame()
+    else:
+        pivot = pd.pivot_table(filtered, index=rows, columns=columns, values='সংখ্যা',
+                               aggfunc='sum', fill_value=0, margins=True, margins_name='মোট')
+    if rows == 'বয়স':
+        pivot = pivot.reindex([band for band in age_bands + ['অজানা', 'মোট'] if band in pivot.index])
+    st.dataframe(pivot, use_container_width=True)
+
 def show_relations_page():
     """Display relations list page with improved functionality"""
     st.header("👥 সম্পর্ক তালিকা")
@@ -553,9 +709,7 @@ def show_relations_page():
                 )
                 if friends:
                     st.write(f"📊 মোট {len(friends)}টি বন্ধু তালিকাভুক্ত")
-                    for friend in friends:
-                        with st.expander(f"🤝 {friend['নাম']}", expanded=False):
-                            display_record_card(friend, friend['id'])
+                    show_records_table(friends, key="friends")
                 else:
                     st.info("❌ কোন বন্ধু তালিকাভুক্ত নেই")
             except Exception as e:
@@ -570,9 +724,7 @@ def show_relations_page():
                 )
                 if enemies:
                     st.write(f"📊 মোট {len(enemies)}টি শত্রু তালিকাভুক্ত")
-                    for enemy in enemies:
-                        with st.expander(f"⚔️ {enemy['নাম']}", expanded=False):
-                            display_record_card(enemy, enemy['id'])
+                    show_records_table(enemies, key="enemies")
                 else:
                     st.info("❌ কোন শত্রু তালিকাভুক্ত নেই")
             except Exception as e:
@@ -583,6 +735,52 @@ def show_relations_page():
         st.error(f"সম্পর্ক তালিকা লোড করতে সমস্যা: {str(e)}")
         logger.error(f"Error in relations page: {str(e)}")
 
+# Address levels of the drill-down, widest first, with their labels
+PLACE_LEVELS = [
+    ('upazila', "🏛️ উপজেলা"),
+    ('union_name', "🏘️ ইউনিয়ন"),
+    ('post_office', "📮 ডাকঘর"),
+    ('village', "🏡 গ্রাম/পাড়া")
+]
+
+def show_places_page():
+    """Drill down the parsed address hierarchy and list the voters of the selected place"""
+    st.header("🗺️ ঠিকানা অনুযায়ী ভোটার")
+
+    try:
+        storage = st.session_state.storage
+        place = {}
+        columns = st.columns(len(PLACE_LEVELS))
+        for (component, label), column in zip(PLACE_LEVELS, columns):
+            # Each level lists only the places under the ones selected before it
+            options = storage.get_place_children(**place)
+            with column:
+                selected = st.selectbox(
+                    label,
+                    ["সকল"] + options,
+                    format_func=lambda value: value or "(উল্লেখ নেই)",
+                    key=f"place_{component}",
+                    disabled=not options
+                )
+            if selected == "সকল" or not options:
+                break
+            place[component] = selected
+
+        if not place:
+            st.info("ভোটার তালিকা দেখতে একটি উপজেলা নির্বাচন করুন")
+            return
+
+        with st.spinner('লোড হচ্ছে...'):
+            records = storage.get_records_by_place(columnar=True, **place)
+        if not records.empty:
+            st.success(f"📊 মোট {len(records)}জন ভোটার")
+            show_records_table(records, key="place_records")
+        else:
+            st.info("❌ এই ঠিকানায় কোন ভোটার নেই")
+    except Exception as e:
+        st.error(f"ঠিকানা অনুযায়ী তালিকা লোড করতে সমস্যা: {str(e)}")
+        logger.error(f"Error in places page: {str(e)}")
+
 
 # Update the page routing to include the relations page
 def main():
@@ -601,31 +799,54 @@ def main():
     if not login_form():
         return
 
-    # Rest of the main function remains unchanged
-    if page == "🏠 হোম":
-        show_home_page()
-    elif page == "📤 ফাইল আপলোড":
-        show_upload_page()
-    elif page == "🔍 অনুসন্ধান":
-        show_search_page()
-    elif page == "📊 ডেটা বিশ্লেষণ":
-        show_analysis_page()
-    elif page == "👥 সম্পর্ক তালিকা":
-        show_relations_page()
-    else:
-        show_all_data_page()
+    # Connect only once the user is logged in, so the login form renders without touching the database
+    if 'storage' not in st.session_state:
+        st.session_state.storage = Storage()
+
+    # Started on the first logged-in page load, not when someone next uploads a file; its watch
+    # thread resumes jobs a stopped process left unfinished, retrying until the database answers
+    get_worker_pool()
+
+    try:
+        if page == "🏠 হোম":
+            show_home_page()
+        elif page == "📤 ফাইল আপলোড":
+            show_upload_page()
+        elif page == "🔍 অনুসন্ধান":
+            show_search_page()
+        elif page == "📊 ডেটা বিশ্লেষণ":
+            show_analysis_page()
+        elif page == "👥 সম্পর্ক তালিকা":
+            show_relations_page()
+        elif page == "🗺️ ঠিকানা অনুযায়ী":
+            show_places_page()
+        else:
+            show_all_data_page()
+    finally:
+        # An idle browser session would otherwise hold a pooled connection until it ends;
+        # also runs when st.rerun() cuts the render short
+        st.session_state.storage.release()
 
-@functools.lru_cache(maxsize=32)
 def get_folder_stats():
-    """Get cached folder statistics"""
+    """Get folder statistics from the file names Storage caches until the next write"""
     if not hasattr(st.session_state, 'storage'):
-        return [], set(), 0
+        return [], set()
 
     files = st.session_state.storage.get_file_names()
     folders = set(file.split('/')[0] for file in files if '/' in file)
-    total_records = st.session_state.storage.get_total_records_count()
 
-    return files, folders, total_records
+    return files, folders
+
+@st.fragment(run_every=1)
+def rerun_when_ready(ready):
+    """Rerun the page once ready() returns the exact result being computed in the background"""
+    try:
+        if ready() is not None:
+            st.rerun()
+    except Exception as e:
+        logger.error(f"Error checking for exact results: {str(e)}")
+    finally:
+        st.session_state.storage.release()
 
 def show_home_page():
     """Optimized home page with caching"""
@@ -650,7 +871,17 @@ def show_home_page():
         )
 
         # Stats Section with cached data
-        files, folders, total_records = get_folder_stats()
+        files, folders = get_folder_stats()
+
+        # The exact count is computed in the background; an estimate from the sample is shown meanwhile
+        storage = st.session_state.storage
+        total_records = storage.get_total_records_count(wait=False)
+        if total_records is None:
+            estimate, margin = storage.estimate_total_records_count()
+            total_text = f"≈ {estimate:,} <span style=\"font-size: 0.9rem;\">(±{margin:,}, আনুমানিক)</span>"
+            rerun_when_ready(lambda: storage.get_total_records_count(wait=False))
+        else:
+            total_text = f"{total_records:,}"
 
         # Create three columns for stats
         col1, col2, col3 = st.columns(3)
@@ -687,7 +918,7 @@ def show_home_page():
                             border-radius: 15px; box-shadow: 0 4px 6px rgba(0,0,0,0.1);">
                     <h3 style="color: #FF4B4B; font-size: 2rem;">📊</h3>
                     <h4>মোট রেকর্ড</h4>
-                    <p style="font-size: 1.5rem; color: #FF4B4B;">{total_records}</p>                </div>                """,
+                    <p style="font-size: 1.5rem; color: #FF4B4B;">{total_text}</p>                </div>                """,
                 unsafe_allow_html=True
             )
 
@@ -753,6 +984,34 @@ def show_home_page():
                 unsafe_allow_html=True
             )
 
+def typeahead_input(label, field, key):
+    """Text input with a list of matching values from the typeahead index to pick from"""
+    value = st.text_input(label, key=key)
+    if not value:
+        return value
+    try:
+        completions = st.session_state.storage.get_completions(field, value)
+    except Exception as e:
+        logger.error(f"Typeahead error for {field}: {str(e)}")
+        return value
+    completions = [completion for completion in completions if completion != value]
+    if completions:
+        def use_completion():
+            # Runs before the next rerun, so the text input is rendered with the chosen value
+            st.session_state[key] = st.session_state[f"{key}_completion"]
+            st.session_state[f"{key}_completion"] = None
+
+        st.selectbox(
+            "💡 পরামর্শ",
+            completions,
+            index=None,
+            placeholder=f"{len(completions)}টি পরামর্শ",
+            key=f"{key}_completion",
+            on_change=use_completion,
+            label_visibility="collapsed"
+        )
+    return value
+
 def show_search_page():
     st.header("🔍 উন্নত অনুসন্ধান")
 
@@ -766,11 +1025,11 @@ def show_search_page():
         if si_number:
             search_params['ক্রমিক_নং'] = si_number
 
-        name = st.text_input("👤 নাম", key="search_name")
+        name = typeahead_input("👤 নাম", 'নাম', key="search_name")
         if name:
             search_params['নাম'] = name
 
-        father_name = st.text_input("👨 পিতার নাম", key="search_father")
+        father_name = typeahead_input("👨 পিতার নাম", 'পিতার_নাম', key="search_father")
         if father_name:
             search_params['পিতার_নাম'] = father_name
 
@@ -779,7 +1038,7 @@ def show_search_page():
             search_params['মাতার_নাম'] = mother_name
 
     with col2:
-        voter_id = st.text_input("🗳️ ভোটার নং", key="search_voter")
+        voter_id = typeahead_input("🗳️ ভোটার নং", 'ভোটার_নং', key="search_voter")
         if voter_id:
             search_params['ভোটার_নং'] = voter_id
 
@@ -799,27 +1058,34 @@ def show_search_page():
         if not search_params:
             st.warning("অনুসন্ধানের জন্য কমপক্ষে একটি ক্ষেত্র পূরণ করুন")
             return
+        # Keep the search active across reruns triggered by row selection and actions
+        st.session_state.search_params = search_params
 
-        with st.spinner('অনুসন্ধান চলছে...'):
-            try:
-                results = st.session_state.storage.search_records(
-                    search_text=None,
-                    field=None,
-                    folder=None,
-                    **search_params
-                )
+    if not st.session_state.get('search_params'):
+        return
 
-                if results:
-                    st.success(f"📊 মোট {len(results)}টি ফলাফল পাওয়া গেছে")
+    with st.spinner('অনুসন্ধান চলছে...'):
+        try:
+            results = st.session_state.storage.search_records(
+                columnar=True,
+                **st.session_state.search_params
+            )
 
-                    # Show results in card format
-                    for record in results:
-                        display_record_card(record, record['id'])
-                else:
-                    st.info("❌ কোন ফলাফল পাওয়া যায়নি")
-            except Exception as e:
-                st.error(f"অনুসন্ধানে সমস্যা হয়েছে: {str(e)}")
-                logger.error(f"Search error: {str(e)}")
+            if not results.empty:
+                st.success(f"📊 মোট {len(results)}টি ফলাফল পাওয়া গেছে")
+                show_records_table(results, key="search_results")
+            else:
+                st.info("❌ কোন ফলাফল পাওয়া যায়নি")
+        except Exception as e:
+            st.error(f"অনুসন্ধানে সমস্যা হয়েছে: {str(e)}")
+            logger.error(f"Search error: {str(e)}")
+
+    stats = search_cache.stats()
+    st.caption(
+        f"ক্যাশ: {stats['hits']} হিট, {stats['misses']} মিস "
+        f"({stats['hit_ratio']:.0%}), {stats['entries']}টি ফলাফল, "
+        f"{stats['bytes'] / (1024 * 1024):.1f}/{stats['max_bytes'] / (1024 * 1024):.0f} MB"
+    )
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,664 @@
+"""Versioned schema migrations.
+
+Run once per deployment, before starting the app:
+
+    python migrations.py
+
+Storage also checks the schema version once per process and applies any
+pending migration, so a development checkout works without this step.
+
+Partitioning records by folder on Postgres is opt-in and done once with:
+
+    python migrations.py partition-records
+
+Running app processes check for partitioning once, so restart them afterwards.
+"""
+import hashlib
+import logging
+import os
+import sys
+import threading
+from sqlalchemy import inspect, text, update
+from sqlalchemy.orm import Session
+from datetime import datetime
+from data_processor import parse_birth_date, parse_address, ADDRESS_COMPONENTS
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Postgres advisory lock key so concurrently starting instances migrate one at a time
+MIGRATION_LOCK_KEY = 7243190
+
+# URL -> whether records is partitioned, for each database whose schema this process has checked
+_checked_urls = {}
+_check_lock = threading.Lock()
+
+def create_tables(connection):
+    """Create all tables that do not exist yet."""
+    from storage import Base
+    Base.metadata.create_all(connection)
+
+def add_birth_date(connection):
+    """Add the parsed birth_date column to records created before it existed."""
+    columns = {column['name'] for column in inspect(connection).get_columns('records')}
+    if 'birth_date' not in columns:
+        connection.execute(text("ALTER TABLE records ADD COLUMN birth_date DATE"))
+        connection.execute(text("CREATE INDEX IF NOT EXISTS ix_records_birth_date ON records (birth_date)"))
+        logger.info("Added birth_date column to records")
+    backfill_birth_dates(connection)
+
+def backfill_birth_dates(connection, batch_size=1000):
+    """Parse জন্ম_তারিখ into birth_date for records that have not been parsed yet."""
+    from storage import Record
+
+    session = Session(bind=connection)
+    last_id = 0
+    updated = 0
+    while True:
+        rows = connection.execute(
+            text("""
+                SELECT id, জন্ম_তারিখ FROM records
+                WHERE id > :last_id AND birth_date IS NULL
+                AND জন্ম_তারিখ IS NOT NULL AND জন্ম_তারিখ != ''
+                ORDER BY id
+                LIMIT :limit
+            """),
+            {'last_id': last_id, 'limit': batch_size}
+        ).all()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        parsed = [
+            {'id': row_id, 'birth_date': birth_date}
+            for row_id, birth_date in ((row[0], parse_birth_date(row[1])) for row in rows)
+            if birth_date
+        ]
+        if parsed:
+            session.execute(update(Record), parsed)
+            updated += len(parsed)
+    logger.info(f"Backfilled birth_date for {updated} records")
+
+def create_search_index(connection):
+    """Create the SQLite FTS5 index over the record fields, kept in sync by triggers."""
+    from storage import RECORD_FIELDS, SQLITE_FTS_AVAILABLE
+    if connection.dialect.name != 'sqlite' or not SQLITE_FTS_AVAILABLE:
+        return
+    if not has_text_columns(connection):
+        # Created with dictionary-encoded fields; encode_dictionary_fields indexes records_view instead
+        return
+
+    exists = connection.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'records_fts'")
+    ).first()
+    if exists:
+        return
+
+    columns = ', '.join(f'"{field}"' for field in RECORD_FIELDS)
+    new_values = ', '.join(f'new."{field}"' for field in RECORD_FIELDS)
+    old_values = ', '.join(f'old."{field}"' for field in RECORD_FIELDS)
+
+    connection.execute(text(f"""
+        CREATE VIRTUAL TABLE records_fts USING fts5(
+            {columns}, content='records', content_rowid='id', tokenize='trigram'
+        )
+    """))
+    connection.execute(text(f"""
+        CREATE TRIGGER records_fts_insert AFTER INSERT ON records BEGIN
+            INSERT INTO records_fts(rowid, {columns}) VALUES (new.id, {new_values});
+        END
+    """))
+    connection.execute(text(f"""
+        CREATE TRIGGER records_fts_delete AFTER DELETE ON records BEGIN
+            INSERT INTO records_fts(records_fts, rowid, {columns}) VALUES ('delete', old.id, {old_values});
+        END
+    """))
+    connection.execute(text(f"""
+        CREATE TRIGGER records_fts_update AFTER UPDATE ON records BEGIN
+            INSERT INTO records_fts(records_fts, rowid, {columns}) VALUES ('delete', old.id, {old_values});
+            INSERT INTO records_fts(rowid, {columns}) VALUES (new.id, {new_values});
+        END
+    """))
+    # Index records loaded before the search index existed
+    connection.execute(text("INSERT INTO records_fts(records_fts) VALUES ('rebuild')"))
+    logger.info("Created FTS5 search index for records")
+
+def add_data_version(connection):
+    """Create the single-row data_version table that invalidates cached search results."""
+    from storage import DataVersion
+    DataVersion.__table__.create(connection, checkfirst=True)
+    exists = connection.execute(text("SELECT 1 FROM data_version WHERE id = 1")).first()
+    if not exists:
+        connection.execute(text("INSERT INTO data_version (id, version) VALUES (1, 0)"))
+
+def add_folder(connection):
+    """Add the folder column (the batch name before '/' in file_name) and fill it in."""
+    columns = {column['name'] for column in inspect(connection).get_columns('records')}
+    if 'folder' not in columns:
+        connection.execute(text("ALTER TABLE records ADD COLUMN folder VARCHAR"))
+        connection.execute(text("CREATE INDEX IF NOT EXISTS ix_records_folder ON records (folder)"))
+        logger.info("Added folder column to records")
+    if connection.dialect.name == 'postgresql':
+        folder = "split_part(file_name, '/', 1)"
+        has_slash = "strpos(file_name, '/') > 0"
+    else:
+        folder = "substr(file_name, 1, instr(file_name, '/') - 1)"
+        has_slash = "instr(file_name, '/') > 0"
+    result = connection.execute(text(
+        f"UPDATE records SET folder = {folder} WHERE folder IS NULL AND {has_slash}"
+    ))
+    logger.info(f"Backfilled folder for {result.rowcount} records")
+
+def add_change_log(connection):
+    """Create the append-only change_log table used for incremental sync."""
+    from storage import ChangeLogEntry
+    ChangeLogEntry.__table__.create(connection, checkfirst=True)
+
+def add_address_components(connection):
+    """Add the parsed address columns and their indexes, fill them in and build the places table."""
+    from storage import Place
+    columns = {column['name'] for column in inspect(connection).get_columns('records')}
+    for component in ADDRESS_COMPONENTS:
+        if component not in columns:
+            connection.execute(text(f"ALTER TABLE records ADD COLUMN {component} VARCHAR"))
+    connection.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_records_place ON records (upazila, union_name, post_office, village)"
+    ))
+    connection.execute(text("CREATE INDEX IF NOT EXISTS ix_records_village ON records (village)"))
+    backfill_address_components(connection)
+
+    Place.__table__.create(connection, checkfirst=True)
+    names = ', '.join(ADDRESS_COMPONENTS)
+    result = connection.execute(text(f"""
+        INSERT INTO places ({names})
+        SELECT DISTINCT {names} FROM records WHERE upazila IS NOT NULL
+        ON CONFLICT DO NOTHING
+    """))
+    logger.info(f"Added {result.rowcount} places")
+
+def backfill_address_components(connection, batch_size=1000):
+    """Parse ঠিকানা into the address columns for records that have not been parsed yet."""
+    from storage import Record
+    if not has_text_columns(connection):
+        # A new database: there are no records to parse
+        return
+
+    session = Session(bind=connection)
+    last_id = 0
+    updated = 0
+    while True:
+        rows = connection.execute(
+            text("""
+                SELECT id, ঠিকানা FROM records
+                WHERE id > :last_id AND upazila IS NULL
+                ORDER BY id
+                LIMIT :limit
+            """),
+            {'last_id': last_id, 'limit': batch_size}
+        ).all()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        session.execute(update(Record), [{'id': row[0], **parse_address(row[1])} for row in rows])
+        updated += len(rows)
+    logger.info(f"Backfilled address components for {updated} records")
+
+def has_text_columns(connection):
+    """Whether records still stores পেশা and ঠিকানা as text, from before dictionary encoding."""
+    return 'ঠিকানা' in {column['name'] for column in inspect(connection).get_columns('records')}
+
+def create_record_views(connection):
+    """Create records_view and relation_records_view, which decode the dictionary-encoded fields.
+
+    They have the columns the tables had before encoding, for raw SQL
+    readers such as the SQLite search index, snapshots and outside tools.
+    """
+    from storage import RECORD_FIELDS
+    for table, extra in [('records', 'r.id, r.birth_date, r.folder, r.upazila, r.union_name, r.post_office, r.village'),
+                         ('relation_records', 'r.id, r.record_id, r.relation_type, r.folder')]:
+        fields = ', '.join(
+            'o.value AS "পেশা"' if field == 'পেশা' else 'a.value AS "ঠিকানা"' if field == 'ঠিকানা' else f'r."{field}"'
+            for field in RECORD_FIELDS
+        )
+        connection.execute(text(f"""
+            CREATE VIEW {table}_view AS
+            SELECT {extra}, r.file_name, {fields}
+            FROM {table} r
+            LEFT JOIN occupations o ON o.id = r.occupation_id
+            LEFT JOIN addresses a ON a.id = r.address_id
+        """))
+
+def drop_record_views(connection):
+    for table in ['records', 'relation_records']:
+        connection.execute(text(f"DROP VIEW IF EXISTS {table}_view"))
+
+def create_view_search_index(connection):
+    """Create the SQLite FTS5 index over records_view, kept in sync by triggers on records."""
+    from storage import RECORD_FIELDS, SQLITE_FTS_AVAILABLE
+    if connection.dialect.name != 'sqlite' or not SQLITE_FTS_AVAILABLE:
+        return
+    columns = ', '.join(f'"{field}"' for field in RECORD_FIELDS)
+
+    connection.execute(text(f"""
+        CREATE VIRTUAL TABLE records_fts USING fts5(
+            {columns}, content='records_view', content_rowid='id', tokenize='trigram'
+        )
+    """))
+    # Decoded values are read from the view while the record row exists: after inserts, before deletes
+    connection.execute(text(f"""
+        CREATE TRIGGER records_fts_insert AFTER INSERT ON records BEGIN
+            INSERT INTO records_fts(rowid, {columns}) SELECT id, {columns} FROM records_view WHERE id = new.id;
+        END
+    """))
+    connection.execute(text(f"""
+        CREATE TRIGGER records_fts_delete BEFORE DELETE ON records BEGIN
+            INSERT INTO records_fts(records_fts, rowid, {columns})
+            SELECT 'delete', id, {columns} FROM records_view WHERE id = old.id;
+        END
+    """))
+    connection.execute(text(f"""
+        CREATE TRIGGER records_fts_update_before BEFORE UPDATE ON records BEGIN
+            INSERT INTO records_fts(records_fts, rowid, {columns})
+            SELECT 'delete', id, {columns} FROM records_view WHERE id = old.id;
+        END
+    """))
+    connection.execute(text(f"""
+        CREATE TRIGGER records_fts_update AFTER UPDATE ON records BEGIN
+            INSERT INTO records_fts(rowid, {columns}) SELECT id, {columns} FROM records_view WHERE id = new.id;
+        END
+    """))
+    connection.execute(text("INSERT INTO records_fts(records_fts) VALUES ('rebuild')"))
+    logger.info("Created FTS5 search index over records_view")
+
+def encode_dictionary_fields(connection):
+    """Move পেশা and ঠিকানা into the occupations and addresses dictionaries, referenced by id.
+
+    Records keep only integer ids, and the views keep the old columns
+    available to raw SQL. Space freed by the dropped columns is returned
+    to the operating system by VACUUM (SQLite) or VACUUM FULL (Postgres).
+    """
+    from storage import Occupation, Address, DICTIONARY_FIELDS
+    Occupation.__table__.create(connection, checkfirst=True)
+    Address.__table__.create(connection, checkfirst=True)
+    sqlite = connection.dialect.name == 'sqlite'
+
+    if has_text_columns(connection):
+        if sqlite:
+            for trigger in ['records_fts_insert', 'records_fts_delete', 'records_fts_update']:
+                connection.execute(text(f"DROP TRIGGER IF EXISTS {trigger}"))
+            connection.execute(text("DROP TABLE IF EXISTS records_fts"))
+
+        for table in ['records', 'relation_records']:
+            columns = {column['name'] for column in inspect(connection).get_columns(table)}
+            for field, (id_column, model) in DICTIONARY_FIELDS.items():
+                dictionary = model.__tablename__
+                if id_column not in columns:
+                    connection.execute(text(f"ALTER TABLE {table} ADD COLUMN {id_column} INTEGER"))
+                # The WHERE clause also keeps SQLite from parsing ON CONFLICT as part of the SELECT
+                connection.execute(text(f"""
+                    INSERT INTO {dictionary} (value)
+                    SELECT DISTINCT "{field}" FROM {table} WHERE "{field}" IS NOT NULL
+                    ON CONFLICT DO NOTHING
+                """))
+                connection.execute(text(f"""
+                    UPDATE {table} SET {id_column} = (
+                        SELECT id FROM {dictionary} WHERE {dictionary}.value = {table}."{field}"
+                    )
+                """))
+                connection.execute(text(f'ALTER TABLE {table} DROP COLUMN "{field}"'))
+            logger.info(f"Dictionary-encoded পেশা and ঠিকানা in {table}")
+
+    connection.execute(text("CREATE INDEX IF NOT EXISTS ix_records_occupation_id ON records (occupation_id)"))
+    connection.execute(text("CREATE INDEX IF NOT EXISTS ix_records_address_id ON records (address_id)"))
+    create_record_views(connection)
+    create_view_search_index(connection)
+    counts = {model.__tablename__: connection.execute(text(f"SELECT COUNT(*) FROM {model.__tablename__}")).scalar()
+              for _, model in DICTIONARY_FIELDS.values()}
+    logger.info(f"Dictionary sizes: {counts}")
+
+def random_bucket_sql(dialect_name):
+    """SQL expression for a random sample bucket in [0, SAMPLE_BUCKETS), for rows inserted by SQL."""
+    from storage import SAMPLE_BUCKETS
+    if dialect_name == 'postgresql':
+        return f"floor(random() * {SAMPLE_BUCKETS})::int"
+    return f"abs(random()) % {SAMPLE_BUCKETS}"
+
+def add_sample_bucket(connection):
+    """Add the random sample_bucket column that analytics estimates are read from, and fill it in.
+
+    Every record falls into one of SAMPLE_BUCKETS buckets at random, so the
+    records in the first few buckets are a uniform sample. The index on
+    (sample_bucket, folder, occupation_id) answers estimates from that
+    sample alone.
+    """
+    from storage import RECORD_FIELDS, DICTIONARY_FIELDS, SQLITE_FTS_AVAILABLE
+    columns = {column['name'] for column in inspect(connection).get_columns('records')}
+    if 'sample_bucket' not in columns:
+        connection.execute(text("ALTER TABLE records ADD COLUMN sample_bucket SMALLINT"))
+        logger.info("Added sample_bucket column to records")
+
+    fts = connection.dialect.name == 'sqlite' and SQLITE_FTS_AVAILABLE
+    if fts:
+        # Reindex only when a searched column changes, not for columns such as sample_bucket
+        indexed = ', '.join(f'"{DICTIONARY_FIELDS[field][0] if field in DICTIONARY_FIELDS else field}"'
+                            for field in RECORD_FIELDS)
+        fields = ', '.join(f'"{field}"' for field in RECORD_FIELDS)
+        for trigger in ['records_fts_update_before', 'records_fts_update']:
+            connection.execute(text(f"DROP TRIGGER IF EXISTS {trigger}"))
+
+    result = connection.execute(text(
+        f"UPDATE records SET sample_bucket = {random_bucket_sql(connection.dialect.name)} WHERE sample_bucket IS NULL"
+    ))
+    logger.info(f"Backfilled sample_bucket for {result.rowcount} records")
+
+    if fts:
+        connection.execute(text(f"""
+            CREATE TRIGGER records_fts_update_before BEFORE UPDATE OF {indexed} ON records BEGIN
+                INSERT INTO records_fts(records_fts, rowid, {fields})
+                SELECT 'delete', id, {fields} FROM records_view WHERE id = old.id;
+            END
+        """))
+        connection.execute(text(f"""
+            CREATE TRIGGER records_fts_update AFTER UPDATE OF {indexed} ON records BEGIN
+                INSERT INTO records_fts(rowid, {fields}) SELECT id, {fields} FROM records_view WHERE id = new.id;
+            END
+        """))
+    connection.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_records_sample ON records (sample_bucket, folder, occupation_id)"
+    ))
+
+def key_checkpoints_by_job(connection):
+    """Rebuild ingest_checkpoints with its own id and a job_id, so each ingest job checkpoints its own load.
+
+    Existing checkpoints were keyed by file name and are kept as loads
+    without a job.
+    """
+    from storage import IngestCheckpoint
+    columns = {column['name'] for column in inspect(connection).get_columns('ingest_checkpoints')}
+    if 'job_id' in columns:
+        return
+    old = 'ingest_checkpoints_by_file'
+    connection.execute(text(f"ALTER TABLE ingest_checkpoints RENAME TO {old}"))
+    if connection.dialect.name == 'postgresql':
+        # The primary key keeps its name through the rename, and the new table needs it
+        primary_key = inspect(connection).get_pk_constraint(old)['name']
+        connection.execute(text(f'ALTER TABLE {old} DROP CONSTRAINT "{primary_key}"'))
+    IngestCheckpoint.__table__.create(connection)
+    result = connection.execute(text(f"""
+        INSERT INTO ingest_checkpoints (file_name, records_committed, completed, updated_at)
+        SELECT file_name, records_committed, completed, updated_at FROM {old}
+    """))
+    connection.execute(text(f"DROP TABLE {old}"))
+    logger.info(f"Kept {result.rowcount} ingest checkpoints as loads without a job")
+
+def reparse_address_components(connection, batch_size=1000):
+    """Parse every distinct ঠিকানা again and update its records' address columns and the places table.
+
+    Labels used to match without a colon, so place names starting with
+    one ("পাড়াগাঁও", "থানাপাড়া") were split at the wrong place.
+    """
+    # NULL-safe, so records with NULL components are updated too; SQLite before 3.39 lacks IS DISTINCT FROM
+    distinct = 'IS DISTINCT FROM' if connection.dialect.name == 'postgresql' else 'IS NOT'
+    last_id = 0
+    changed = 0
+    while True:
+        rows = connection.execute(
+            text("SELECT id, value FROM addresses WHERE id > :last_id ORDER BY id LIMIT :limit"),
+            {'last_id': last_id, 'limit': batch_size}
+        ).all()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        result = connection.execute(
+            text(f"""
+                UPDATE records SET {', '.join(f"{component} = :{component}" for component in ADDRESS_COMPONENTS)}
+                WHERE address_id = :address_id
+                AND ({' OR '.join(f"{component} {distinct} :{component}" for component in ADDRESS_COMPONENTS)})
+            """),
+            [dict(parse_address(value), address_id=address_id) for address_id, value in rows]
+        )
+        changed += result.rowcount
+    names = ', '.join(ADDRESS_COMPONENTS)
+    connection.execute(text("DELETE FROM places"))
+    connection.execute(text(f"""
+        INSERT INTO places ({names})
+        SELECT DISTINCT {names} FROM records WHERE upazila IS NOT NULL
+        ON CONFLICT DO NOTHING
+    """))
+    logger.info(f"Re-parsed address components of {changed} records")
+
+def add_change_log_data_version(connection):
+    """Add the data_version and previous columns to change_log, for catching up the typeahead index.
+
+    Existing entries keep NULL in both, so an index behind them is rebuilt.
+    """
+    columns = {column['name'] for column in inspect(connection).get_columns('change_log')}
+    if 'data_version' not in columns:
+        connection.execute(text("ALTER TABLE change_log ADD COLUMN data_version INTEGER"))
+    if 'previous' not in columns:
+        connection.execute(text("ALTER TABLE change_log ADD COLUMN previous TEXT"))
+    connection.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_change_log_data_version ON change_log (data_version)"
+    ))
+
+def add_ingest_job_claims(connection):
+    """Add the owner and heartbeat_at columns ingest jobs are claimed with."""
+    columns = {column['name'] for column in inspect(connection).get_columns('ingest_jobs')}
+    if 'owner' not in columns:
+        connection.execute(text("ALTER TABLE ingest_jobs ADD COLUMN owner VARCHAR"))
+    if 'heartbeat_at' not in columns:
+        connection.execute(text("ALTER TABLE ingest_jobs ADD COLUMN heartbeat_at TIMESTAMP"))
+
+def add_files(connection):
+    """Create the files table of per-file record counts and fill it in from records."""
+    from storage import File
+    File.__table__.create(connection, checkfirst=True)
+    result = connection.execute(text("""
+        INSERT INTO files (file_name, folder, records)
+        SELECT file_name, MIN(folder), COUNT(*) FROM records WHERE file_name IS NOT NULL GROUP BY file_name
+        ON CONFLICT DO NOTHING
+    """))
+    logger.info(f"Counted the records of {result.rowcount} files")
+
+# Append only: each migration runs once, in order, and must cope with a schema
+# that create_tables already brought up to date on a fresh database
+MIGRATIONS = [
+    (1, "Create tables", create_tables),
+    (2, "Parsed birth_date column", add_birth_date),
+    (3, "SQLite full-text search index", create_search_index),
+    (4, "Data version for the search cache", add_data_version),
+    (5, "Folder column on records", add_folder),
+    (6, "Change log for incremental sync", add_change_log),
+    (7, "Parsed address components and places", add_address_components),
+    (8, "Dictionary-encoded occupations and addresses", encode_dictionary_fields),
+    (9, "Sample buckets for analytics estimates", add_sample_bucket),
+    (10, "Ingest checkpoints keyed by job", key_checkpoints_by_job),
+    (11, "Address labels need a colon", reparse_address_components),
+    (12, "Data versions in the change log", add_change_log_data_version),
+    (13, "Ingest job claims", add_ingest_job_claims),
+    (14, "Per-file record counts", add_files),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+def current_version(connection):
+    """Schema version recorded in the database, 0 if it was never migrated."""
+    if not inspect(connection).has_table('schema_version'):
+        return 0
+    return connection.execute(text("SELECT MAX(version) FROM schema_version")).scalar() or 0
+
+def migrate(engine):
+    """Apply all pending migrations, each in its own transaction."""
+    with engine.connect() as connection:
+        locked = connection.dialect.name == 'postgresql'
+        if locked:
+            connection.execute(text("SELECT pg_advisory_lock(:key)"), {'key': MIGRATION_LOCK_KEY})
+            connection.commit()
+        try:
+            if not inspect(connection).has_table('schema_version'):
+                connection.execute(text(
+                    "CREATE TABLE schema_version (version INTEGER PRIMARY KEY, applied_at TIMESTAMP NOT NULL)"
+                ))
+                connection.commit()
+
+            version = current_version(connection)
+            connection.commit()
+            for number, description, apply in MIGRATIONS:
+                if number <= version:
+                    continue
+                logger.info(f"Applying migration {number}: {description}")
+                with connection.begin():
+                    apply(connection)
+                    connection.execute(
+                        text("INSERT INTO schema_version (version, applied_at) VALUES (:version, :applied_at)"),
+                        {'version': number, 'applied_at': datetime.utcnow()}
+                    )
+                version = number
+            logger.info(f"Database schema is at version {version}")
+            return version
+        finally:
+            if locked:
+                connection.execute(text("SELECT pg_advisory_unlock(:key)"), {'key': MIGRATION_LOCK_KEY})
+                connection.commit()
+
+def ensure_schema(engine):
+    """Migrate the database behind engine if needed, checking only once per process.
+
+    Returns whether records is partitioned by folder, as found by that check.
+    """
+    url = engine.url.render_as_string(hide_password=False)
+    partitioned = _checked_urls.get(url)
+    if partitioned is not None:
+        return partitioned
+    with _check_lock:
+        if url in _checked_urls:
+            return _checked_urls[url]
+        with engine.connect() as connection:
+            up_to_date = current_version(connection) >= LATEST_VERSION
+            partitioned = is_records_partitioned(connection)
+        if not up_to_date:
+            migrate(engine)
+        _checked_urls[url] = partitioned
+        return partitioned
+
+def partition_name(folder):
+    """Name of the records partition holding one folder."""
+    return f"records_{hashlib.md5(folder.encode('utf-8')).hexdigest()[:16]}"
+
+def folder_literal(folder):
+    """Folder as a SQL string literal, for DDL where bind parameters are not allowed."""
+    return "'" + folder.replace("'", "''") + "'"
+
+def is_records_partitioned(connection):
+    """Whether records is a Postgres table partitioned by folder."""
+    if connection.dialect.name != 'postgresql':
+        return False
+    return connection.execute(
+        text("SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass('records')")
+    ).scalar() or False
+
+def ensure_folder_partition(connection, folder):
+    """Create the partition for folder if it does not exist, within the caller's transaction.
+
+    Rows of the folder already in the default partition are moved into the
+    new partition before it is attached.
+    """
+    name = partition_name(folder)
+    # Serialise workers creating the same partition; released when the transaction ends
+    connection.execute(text("SELECT pg_advisory_xact_lock(hashtext(:name))"), {'name': name})
+    if connection.execute(text("SELECT to_regclass(:name)"), {'name': name}).scalar():
+        return
+    connection.execute(text(f"CREATE TABLE {name} (LIKE records INCLUDING DEFAULTS)"))
+    connection.execute(
+        text(f"""
+            WITH moved AS (DELETE FROM records_default WHERE folder = :folder RETURNING *)
+            INSERT INTO {name} SELECT * FROM moved
+        """),
+        {'folder': folder}
+    )
+    connection.execute(text(
+        f"ALTER TABLE records ATTACH PARTITION {name} FOR VALUES IN ({folder_literal(folder)})"
+    ))
+    logger.info(f"Created records partition {name} for folder {folder}")
+
+def drop_folder_partition(connection, folder):
+    """Detach and drop the partition of folder. Returns False if it has none."""
+    name = partition_name(folder)
+    if not connection.execute(text("SELECT to_regclass(:name)"), {'name': name}).scalar():
+        return False
+    connection.execute(text(f"ALTER TABLE records DETACH PARTITION {name}"))
+    connection.execute(text(f"DROP TABLE {name}"))
+    logger.info(f"Dropped records partition {name} for folder {folder}")
+    return True
+
+def partition_records(engine):
+    """Convert records into a table list-partitioned by folder (Postgres only).
+
+    Each folder gets its own partition, so folder-scoped queries only scan
+    that folder and a folder is deleted by dropping its partition. Records
+    without a folder go to the default partition. A partitioned table cannot
+    have a unique index on id alone, so id is indexed without a primary key
+    constraint (its values still come from the sequence) and relation_records
+    loses its foreign key; Storage deletes relations explicitly instead.
+    """
+    migrate(engine)
+    with engine.begin() as connection:
+        if connection.dialect.name != 'postgresql':
+            raise SystemExit("Partitioning is only supported on Postgres")
+        if is_records_partitioned(connection):
+            logger.info("records is already partitioned")
+            return
+
+        connection.execute(text("LOCK TABLE records IN ACCESS EXCLUSIVE MODE"))
+        # Views follow a renamed table, so they would keep pointing at the old one
+        drop_record_views(connection)
+        sequence = connection.execute(text("SELECT pg_get_serial_sequence('records', 'id')")).scalar()
+        for foreign_key in inspect(connection).get_foreign_keys('relation_records'):
+            if foreign_key['referred_table'] == 'records':
+                connection.execute(text(f'ALTER TABLE relation_records DROP CONSTRAINT "{foreign_key["name"]}"'))
+
+        connection.execute(text("ALTER TABLE records RENAME TO records_unpartitioned"))
+        connection.execute(text(f"ALTER SEQUENCE {sequence} OWNED BY NONE"))
+        connection.execute(text(
+            "CREATE TABLE records (LIKE records_unpartitioned INCLUDING DEFAULTS) PARTITION BY LIST (folder)"
+        ))
+        connection.execute(text("CREATE TABLE records_default PARTITION OF records DEFAULT"))
+        folders = connection.execute(text(
+            "SELECT DISTINCT folder FROM records_unpartitioned WHERE folder IS NOT NULL"
+        )).scalars().all()
+        for folder in folders:
+            connection.execute(text(
+                f"CREATE TABLE {partition_name(folder)} PARTITION OF records "
+                f"FOR VALUES IN ({folder_literal(folder)})"
+            ))
+
+        connection.execute(text("INSERT INTO records SELECT * FROM records_unpartitioned"))
+        connection.execute(text("DROP TABLE records_unpartitioned"))
+        connection.execute(text(f"ALTER SEQUENCE {sequence} OWNED BY records.id"))
+        # Index names freed by dropping the old table
+        connection.execute(text("CREATE INDEX ix_records_id ON records (id)"))
+        connection.execute(text("CREATE INDEX ix_records_birth_date ON records (birth_date)"))
+        connection.execute(text("CREATE INDEX ix_records_folder ON records (folder)"))
+        connection.execute(text(
+            "CREATE INDEX ix_records_place ON records (upazila, union_name, post_office, village)"
+        ))
+        connection.execute(text("CREATE INDEX ix_records_village ON records (village)"))
+        connection.execute(text("CREATE INDEX ix_records_occupation_id ON records (occupation_id)"))
+        connection.execute(text("CREATE INDEX ix_records_address_id ON records (address_id)"))
+        connection.execute(text("CREATE INDEX ix_records_sample ON records (sample_bucket, folder, occupation_id)"))
+        create_record_views(connection)
+        logger.info(f"Partitioned records into {len(folders)} folder partitions")
+    # Storage constructed in this process from now on sees the partitioned table
+    _checked_urls[engine.url.render_as_string(hide_password=False)] = True
+
+if __name__ == '__main__':
+    from storage import create_database_engine
+
+    database_url = os.getenv("DATABASE_URL")
+    if not database_url:
+        raise SystemExit("DATABASE_URL environment variable is not set")
+    engine = create_database_engine(database_url)
+    if sys.argv[1:] == ['partition-records']:
+        partition_records(engine)
+    else:
+        migrate(engine)
@@ -0,0 +1,96 @@
+import sys
+import threading
+import logging
+from collections import OrderedDict
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def normalize_params(params):
+    """Cache key for a set of search parameters.
+
+    Empty values are dropped and keys sorted, so the same search typed in a
+    different field order or with unused fields maps to one entry. Values are
+    lowercased because every search condition is case-insensitive.
+    """
+    return tuple(sorted(
+        (key, str(value).lower())
+        for key, value in params.items()
+        if value
+    ))
+
+def estimate_size(results):
+    """Approximate memory held by a list of result dictionaries or tuples, in bytes."""
+    size = sys.getsizeof(results)
+    for result in results:
+        size += sys.getsizeof(result)
+        for value in (result.values() if isinstance(result, dict) else result):
+            size += sys.getsizeof(value)
+    return size
+
+class ResultCache:
+    """Thread-safe LRU cache bounded by the estimated bytes of its entries.
+
+    Each entry remembers the data version it was computed at; a lookup with
+    a different version is a miss and drops the stale entry.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # key -> (version, value, size)
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def get(self, key, version):
+        """Cached value for key at version, or None."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[0] != version:
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, version, value, size):
+        """Store value, evicting the least recently used entries to stay within max_bytes."""
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+            self.entries[key] = (version, value, size)
+            self.total_bytes += size
+            while self.total_bytes > self.max_bytes:
+                oldest = next(iter(self.entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.total_bytes = 0
+
+    def _remove(self, key):
+        _, _, size = self.entries.pop(key)
+        self.total_bytes -= size
+
+    def stats(self):
+        """Hit/miss counts and current size of the cache."""
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'entries': len(self.entries),
+                'bytes': self.total_bytes,
+                'max_bytes': self.max_bytes
+            }
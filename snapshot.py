@@ -0,0 +1,183 @@
+"""Snapshot a folder's records and relations to a directory, and restore it into another database.
+
+Usage: DATABASE_URL=... python snapshot.py dump FOLDER DIRECTORY
+       DATABASE_URL=... python snapshot.py restore DIRECTORY [--folder NAME] [--replace]
+
+A snapshot directory holds manifest.json and one data file per table:
+binary COPY output on Postgres, zstd-compressed Parquet on SQLite. A
+snapshot restores into the same kind of database at the same schema
+version. Restored records get new ids; relations follow their records.
+The restore is checked against the row counts and checksum in the
+manifest and rolled back if they differ.
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import time
+from data_processor import ADDRESS_COMPONENTS
+from migrations import folder_literal
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILE = 'manifest.json'
+
+# Columns copied per table, read through the views so পেশা and ঠিকানা are stored as text;
+# ids are reassigned on restore and folder is the restore target
+SNAPSHOT_COLUMNS = {
+    'records': ['id', 'file_name', 'ক্রমিক_নং', 'নাম', 'ভোটার_নং', 'পিতার_নাম', 'মাতার_নাম', 'পেশা',
+                'জন্ম_তারিখ', 'ঠিকানা', 'birth_date'] + ADDRESS_COMPONENTS,
+    'relation_records': ['record_id', 'relation_type', 'ক্রমিক_নং', 'নাম', 'ভোটার_নং', 'পিতার_নাম',
+                         'মাতার_নাম', 'পেশা', 'জন্ম_তারিখ', 'ঠিকানা', 'file_name']
+}
+
+# Rows per Parquet row group, and per insert batch when restoring one
+PARQUET_BATCH_ROWS = 50000
+
+def column_list(columns, prefix=''):
+    return ', '.join(f'{prefix}"{column}"' for column in columns)
+
+def snapshot_queries(folder):
+    """SELECTs of a folder's rows per table, in id order, with the folder inlined for COPY."""
+    folder_ids = f"SELECT id FROM records WHERE folder = {folder_literal(folder)}"
+    return {
+        'records': f"SELECT {column_list(SNAPSHOT_COLUMNS['records'])} FROM records_view "
+                   f"WHERE folder = {folder_literal(folder)} ORDER BY id",
+        'relation_records': f"SELECT {column_list(SNAPSHOT_COLUMNS['relation_records'])} FROM relation_records_view "
+                            f"WHERE record_id IN ({folder_ids}) ORDER BY record_id, id"
+    }
+
+def data_file(table, dialect):
+    return f"{table}.{'bin' if dialect == 'postgresql' else 'parquet'}"
+
+def dump_table(connection, query, path):
+    """Write the rows of query to path: binary COPY on Postgres, Parquet on SQLite."""
+    raw = connection.connection.driver_connection
+    if connection.dialect.name == 'postgresql':
+        with open(path, 'wb') as file, raw.cursor() as cursor:
+            cursor.copy_expert(f"COPY ({query}) TO STDOUT (FORMAT binary)", file)
+        return
+
+    import pyarrow as pa  # Installed with streamlit; only SQLite snapshots need it
+    import pyarrow.parquet as pq
+    cursor = raw.cursor()
+    cursor.execute(query)
+    names = [column[0] for column in cursor.description]
+    # Values are copied as SQLite stores them: integer ids, text for everything else
+    schema = pa.schema([(name, pa.int64() if name in ('id', 'record_id') else pa.string()) for name in names])
+    with pq.ParquetWriter(path, schema, compression='zstd') as writer:
+        while True:
+            rows = cursor.fetchmany(PARQUET_BATCH_ROWS)
+            if not rows:
+                break
+            writer.write_batch(pa.record_batch(
+                [pa.array(values, type=field.type) for field, values in zip(schema, zip(*rows))],
+                schema=schema
+            ))
+    cursor.close()
+
+def load_table(connection, staging, columns, path):
+    """Bulk load a dumped data file into the staging table."""
+    raw = connection.connection.driver_connection
+    if connection.dialect.name == 'postgresql':
+        with open(path, 'rb') as file, raw.cursor() as cursor:
+            cursor.copy_expert(f"COPY {staging} ({column_list(columns)}) FROM STDIN (FORMAT binary)", file)
+        return
+
+    import pyarrow.parquet as pq
+    cursor = raw.cursor()
+    insert = f"INSERT INTO {staging} ({column_list(columns)}) VALUES ({', '.join('?' * len(columns))})"
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=PARQUET_BATCH_ROWS, columns=columns):
+        cursor.executemany(insert, zip(*(batch.column(name).to_pylist() for name in columns)))
+    cursor.close()
+
+def folder_checksum(connection, folder):
+    """Row counts and a SHA-256 over a folder's records and relations, independent of ids and folder name.
+
+    File names are taken relative to the folder and relations are keyed by
+    the position of their record, so a restored copy matches its source.
+    Read through the driver's cursor, as SQLAlchemy rows would cost more
+    than the hashing.
+    """
+    digest = hashlib.sha256()
+    prefix_length = len(folder) + 1
+    counts = {}
+    queries = {
+        'records': f"""
+            SELECT {column_list(SNAPSHOT_COLUMNS['records'][1:])} FROM records_view
+            WHERE folder = {folder_literal(folder)} ORDER BY id
+        """,
+        'relation_records': f"""
+            SELECT {column_list(SNAPSHOT_COLUMNS['relation_records'][-1:] + SNAPSHOT_COLUMNS['relation_records'][1:-1], 'r.')},
+                   positions.position
+            FROM relation_records_view r
+            JOIN (SELECT id, ROW_NUMBER() OVER (ORDER BY id) AS position FROM records
+                  WHERE folder = {folder_literal(folder)}) positions
+            ON positions.id = r.record_id
+            ORDER BY positions.position, r.id
+        """
+    }
+    cursor = connection.connection.driver_connection.cursor()
+    try:
+        for table, query in queries.items():
+            counts[table] = 0
+            digest.update(f"{table}\n".encode('utf-8'))
+            cursor.execute(query)
+            while True:
+                rows = cursor.fetchmany(PARQUET_BATCH_ROWS)
+                if not rows:
+                    break
+                counts[table] += len(rows)
+                # Unit and record separators cannot occur in parsed text; NUL marks NULL
+                digest.update(''.join(
+                    '\x1f'.join(['\x00' if row[0] is None else row[0][prefix_length:]]
+                               + ['\x00' if value is None else str(value) for value in row[1:]]) + '\x1e'
+                    for row in rows
+                ).encode('utf-8'))
+    finally:
+        cursor.close()
+    return counts, digest.hexdigest()
+
+def read_manifest(directory):
+    with open(os.path.join(directory, MANIFEST_FILE), encoding='utf-8') as file:
+        return json.load(file)
+
+def write_manifest(directory, manifest):
+    with open(os.path.join(directory, MANIFEST_FILE), 'w', encoding='utf-8') as file:
+        json.dump(manifest, file, ensure_ascii=False, indent=2)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+    dump = commands.add_parser('dump', help="snapshot a folder into a new directory")
+    dump.add_argument('folder')
+    dump.add_argument('directory')
+    restore = commands.add_parser('restore', help="restore a snapshot directory")
+    restore.add_argument('directory')
+    restore.add_argument('--folder', help="restore under this folder name instead of the original")
+    restore.add_argument('--replace', action='store_true', help="replace the folder if it already exists")
+    args = parser.parse_args()
+
+    from storage import Storage
+    storage = Storage()
+    start = time.perf_counter()
+    try:
+        if args.command == 'dump':
+            manifest = storage.snapshot_folder(args.folder, args.directory)
+            action = f"Dumped {manifest['folder']} to {args.directory}"
+        else:
+            manifest = storage.restore_folder(args.directory, folder=args.folder, replace=args.replace)
+            action = f"Restored {args.directory} as {manifest['folder']} (checksum verified)"
+    except (ValueError, OSError) as e:
+        raise SystemExit(str(e))
+    elapsed = time.perf_counter() - start
+    size = sum(os.path.getsize(os.path.join(args.directory, name)) for name in os.listdir(args.directory))
+    print(f"{action}: {manifest['rows']['records']:,} records, {manifest['rows']['relation_records']:,} relations, "
+          f"{size / (1024 * 1024):.1f} MB on disk, in {elapsed:.1f}s "
+          f"({manifest['rows']['records'] / elapsed:,.0f} records/s)")
+
+if __name__ == '__main__':
+    main()
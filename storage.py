@@ -1,25 +1,62 @@
 import logging
-from sqlalchemy import create_engine, Column, String, Integer, Enum, ForeignKey
+from sqlalchemy import create_engine, event, Column, String, Integer, SmallInteger, Boolean, Date, DateTime, Text, Enum, ForeignKey, Index, UniqueConstraint, insert, update, select, func, bindparam, and_, or_
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, relationship
-from sqlalchemy.exc import OperationalError, SQLAlchemyError
+from sqlalchemy.orm import sessionmaker, relationship, column_property
+from sqlalchemy.exc import DBAPIError, OperationalError, SQLAlchemyError
 import os
 import enum
+import json
+import math
 import time
 from sqlalchemy.pool import QueuePool
 from sqlalchemy.sql import text
-import functools
+import itertools
+import random
+import sqlite3
+import sys
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from data_processor import parse_birth_date, parse_address, ADDRESS_COMPONENTS
+from migrations import ensure_schema, ensure_folder_partition, drop_folder_partition, random_bucket_sql
+from search_cache import ResultCache, normalize_params, estimate_size
+from typeahead import TypeaheadIndex, TYPEAHEAD_FIELDS
+import snapshot
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 Base = declarative_base()
 
+# Parsed voter-list fields, in file order
+RECORD_FIELDS = ['ক্রমিক_নং', 'নাম', 'ভোটার_নং', 'পিতার_নাম', 'মাতার_নাম', 'পেশা', 'জন্ম_তারিখ', 'ঠিকানা']
+
+# Records inserted and checkpointed per transaction during ingest
+INGEST_BATCH_SIZE = 1000
+# A queued or running ingest job whose owner has not shown a heartbeat for this long is taken over
+INGEST_JOB_STALE_SECONDS = float(os.getenv("INGEST_JOB_STALE_SECONDS", "120"))
+
 class RelationType(enum.Enum):
     NONE = "none"
     FRIEND = "friend"
     ENEMY = "enemy"
 
+class Occupation(Base):
+    __tablename__ = 'occupations'
+
+    # Dictionary of distinct পেশা values; rows are never updated or deleted, so ids can be cached
+    id = Column(Integer, primary_key=True)
+    value = Column(String, nullable=False, unique=True)
+
+class Address(Base):
+    __tablename__ = 'addresses'
+
+    # Dictionary of distinct ঠিকানা values, shared by every record of a village
+    id = Column(Integer, primary_key=True)
+    value = Column(String, nullable=False, unique=True)
+
 class Record(Base):
     __tablename__ = 'records'
 
@@ -30,14 +67,33 @@ class Record(Base):
     ভোটার_নং = Column(String)
     পিতার_নাম = Column(String)
     মাতার_নাম = Column(String)
-    পেশা = Column(String)
+    occupation_id = Column(Integer, index=True)  # পেশা in occupations
     জন্ম_তারিখ = Column(String)
-    ঠিকানা = Column(String)
+    birth_date = Column(Date, index=True)  # Parsed from জন্ম_তারিখ, NULL if unparseable
+    address_id = Column(Integer, index=True)  # ঠিকানা in addresses
+    # Decoded for reads; writes set the ids through Storage._encode_rows
+    পেশা = column_property(select(Occupation.value).where(Occupation.id == occupation_id).scalar_subquery())
+    ঠিকানা = column_property(select(Address.value).where(Address.id == address_id).scalar_subquery())
+    folder = Column(String, index=True)  # Batch name from file_name; the partition key when partitioned
+    # Parsed from ঠিকানা by parse_address, '' where the address has no such part
+    upazila = Column(String)
+    union_name = Column(String)
+    post_office = Column(String)
+    village = Column(String, index=True)
+    sample_bucket = Column(SmallInteger)  # Random in [0, SAMPLE_BUCKETS), for analytics estimates
+
+    __table_args__ = (
+        # Drill-down from upazila to village is a prefix lookup on this index
+        Index('ix_records_place', 'upazila', 'union_name', 'post_office', 'village'),
+        # Estimates read a few buckets of this index instead of every record
+        Index('ix_records_sample', 'sample_bucket', 'folder', 'occupation_id'),
+    )
 
 class RelationRecord(Base):
     __tablename__ = 'relation_records'
 
     id = Column(Integer, primary_key=True)
+    # The foreign key is dropped when records is partitioned, so deletes also remove relations explicitly
     record_id = Column(Integer, ForeignKey('records.id', ondelete='CASCADE'))
     relation_type = Column(Enum(RelationType), nullable=False)
     folder = Column(String)
@@ -46,13 +102,355 @@ class RelationRecord(Base):
     ভোটার_নং = Column(String)
     পিতার_নাম = Column(String)
     মাতার_নাম = Column(String)
-    পেশা = Column(String)
+    occupation_id = Column(Integer)
     জন্ম_তারিখ = Column(String)
-    ঠিকানা = Column(String)
+    address_id = Column(Integer)
     file_name = Column(String)
+    পেশা = column_property(select(Occupation.value).where(Occupation.id == occupation_id).scalar_subquery())
+    ঠিকানা = column_property(select(Address.value).where(Address.id == address_id).scalar_subquery())
+
+class Place(Base):
+    __tablename__ = 'places'
+
+    # Distinct address components of records, so the drill-down lists places without scanning records
+    id = Column(Integer, primary_key=True)
+    upazila = Column(String, nullable=False)
+    union_name = Column(String, nullable=False)
+    post_office = Column(String, nullable=False)
+    village = Column(String, nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint('upazila', 'union_name', 'post_office', 'village', name='uq_places'),
+    )
+
+class File(Base):
+    __tablename__ = 'files'
+
+    # Record count of every file, kept by each write that adds or deletes records, so listing files
+    # does not scan records
+    file_name = Column(String, primary_key=True)
+    folder = Column(String, index=True)
+    records = Column(Integer, nullable=False)
+
+class IngestJobStatus(enum.Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+class IngestJob(Base):
+    __tablename__ = 'ingest_jobs'
+
+    id = Column(Integer, primary_key=True)
+    batch_name = Column(String, nullable=False)
+    file_name = Column(String, nullable=False)
+    spool_path = Column(String, nullable=False)
+    status = Column(Enum(IngestJobStatus), nullable=False, default=IngestJobStatus.QUEUED, index=True)
+    rows_parsed = Column(Integer, nullable=False, default=0)
+    rows_written = Column(Integer, nullable=False, default=0)
+    error = Column(Text)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+    # Process that queued or runs the job, and when it last showed it is alive; a queued or
+    # running job whose heartbeat is older than INGEST_JOB_STALE_SECONDS can be taken over
+    owner = Column(String)
+    heartbeat_at = Column(DateTime)
+
+class IngestJobClaimLost(Exception):
+    """Raised when another process took over an ingest job this process was loading."""
+
+class IngestCheckpoint(Base):
+    __tablename__ = 'ingest_checkpoints'
+
+    # Committed together with each batch so a retried or restarted load resumes without duplicates.
+    # A load run as an ingest job is keyed by its job, so a requeued job resumes its own load;
+    # other loads (bulk_load, restores) have no job and are keyed by file name
+    id = Column(Integer, primary_key=True)
+    job_id = Column(Integer, ForeignKey('ingest_jobs.id', ondelete='CASCADE'), unique=True)
+    file_name = Column(String, nullable=False, index=True)
+    records_committed = Column(Integer, nullable=False, default=0)
+    completed = Column(Boolean, nullable=False, default=False)
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class DataVersion(Base):
+    __tablename__ = 'data_version'
+
+    # Single row, incremented in the same transaction as every write to records or relations
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+class ChangeOperation(enum.Enum):
+    UPDATE = "update"
+    DELETE = "delete"
+    RELATION = "relation"
+    LOAD_FILE = "load_file"
+    DELETE_FILE = "delete_file"
+    DELETE_FOLDER = "delete_folder"
+    DELETE_ALL = "delete_all"
+
+class ChangeLogEntry(Base):
+    __tablename__ = 'change_log'
+
+    # Append only. version is allocated while the writer holds the data_version row lock,
+    # so versions become visible in increasing order and a consumer never skips one
+    version = Column(Integer, primary_key=True)
+    operation = Column(Enum(ChangeOperation), nullable=False)
+    record_id = Column(Integer)
+    file_name = Column(String)  # File or folder name for bulk operations
+    data = Column(Text)  # Record as JSON after the change; NULL for deletes
+    data_version = Column(Integer, index=True)  # Data version the change committed at
+    previous = Column(Text)  # TYPEAHEAD_FIELDS as JSON before an update or delete; NULL if unchanged
+    changed_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+# Dictionary-encoded record fields: the id column on records and relation_records, and the dictionary
+DICTIONARY_FIELDS = {
+    'পেশা': ('occupation_id', Occupation),
+    'ঠিকানা': ('address_id', Address)
+}
+
+# Columns of record query results, as dictionary keys or DataFrame columns
+RECORD_RESULT_COLUMNS = ['id'] + RECORD_FIELDS + ['file_name', 'relation_type']
+
+# Bind parameters per statement in bulk_update_records on SQLite, below its limit of 32766
+SQLITE_MAX_PARAMS = 30000
+
+# Largest page returned by get_changes_since
+CHANGE_PAGE_SIZE = 1000
+
+# Applied to every SQLite connection: WAL lets readers run alongside the single writer
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',  # Durable at checkpoints, no fsync per commit
+    'foreign_keys': 'ON',  # Needed for ON DELETE CASCADE of relation records
+    'temp_store': 'MEMORY',
+    'cache_size': '-65536',  # 64MB page cache
+    'mmap_size': '268435456',  # 256MB memory-mapped I/O
+    'busy_timeout': '30000'
+}
+
+# FTS5 trigram tokenizer (SQLite 3.34+) indexes substrings, matching the ilike semantics of search
+SQLITE_FTS_AVAILABLE = sqlite3.sqlite_version_info >= (3, 34, 0)
+# UPDATE ... RETURNING (data version bumps) and ALTER TABLE ... DROP COLUMN (migration 8) need SQLite 3.35
+SQLITE_MIN_VERSION = (3, 35, 0)
+
+def create_database_engine(database_url, **kwargs):
+    """Create a pooled engine for a Postgres or SQLite database URL."""
+    if make_url(database_url).get_backend_name() != 'sqlite':
+        return create_engine(
+            database_url,
+            poolclass=QueuePool,
+            pool_size=10,
+            max_overflow=20,
+            pool_timeout=30,
+            pool_pre_ping=True,  # Enable connection health checks
+            **kwargs
+        )
+
+    if sqlite3.sqlite_version_info < SQLITE_MIN_VERSION:
+        raise RuntimeError(f"SQLite {sqlite3.sqlite_version} is too old, "
+                           f"{'.'.join(map(str, SQLITE_MIN_VERSION))} or newer is required")
+    engine = create_engine(
+        database_url,
+        poolclass=QueuePool,
+        pool_size=10,
+        max_overflow=20,
+        pool_timeout=30,
+        connect_args={'check_same_thread': False, 'timeout': 30},
+        **kwargs
+    )
+
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in SQLITE_PRAGMAS.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+        cursor.close()
+
+    return engine
+
+_engines = {}
+_engines_lock = threading.Lock()
+
+def get_engine(database_url, **kwargs):
+    """Get the process-wide engine for a database URL, creating it on first use."""
+    key = (database_url, tuple(sorted(kwargs.items())))
+    engine = _engines.get(key)
+    if engine is None:
+        with _engines_lock:
+            engine = _engines.get(key)
+            if engine is None:
+                engine = create_database_engine(database_url, **kwargs)
+                _engines[key] = engine
+    return engine
+
+# Connection recovery: retries back off with full jitter, capped at DB_RETRY_MAX_DELAY
+DB_RETRY_ATTEMPTS = int(os.getenv("DB_RETRY_ATTEMPTS", "3"))
+DB_RETRY_BASE_DELAY = float(os.getenv("DB_RETRY_BASE_DELAY", "0.2"))
+DB_RETRY_MAX_DELAY = float(os.getenv("DB_RETRY_MAX_DELAY", "5"))
+# Consecutive connection failures that open the circuit, and how long it stays open
+DB_BREAKER_THRESHOLD = int(os.getenv("DB_BREAKER_THRESHOLD", "5"))
+DB_BREAKER_RESET_SECONDS = float(os.getenv("DB_BREAKER_RESET_SECONDS", "30"))
+
+class DatabaseUnavailableError(SQLAlchemyError):
+    """Raised without touching the database while the circuit breaker is open."""
+
+class CircuitBreaker:
+    """Process-wide breaker for one database: fails fast after repeated connection failures.
+
+    Closed: operations run normally. Open: operations are rejected until the
+    reset timeout passes. Half-open: one trial operation is let through; its
+    success closes the breaker and its failure opens it again.
+    """
+
+    def __init__(self, name, threshold=DB_BREAKER_THRESHOLD, reset_seconds=DB_BREAKER_RESET_SECONDS):
+        self.name = name
+        self.threshold = threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+        self.lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at < self.reset_seconds:
+            return 'open'
+        return 'half-open'
+
+    def before_call(self):
+        """Raise DatabaseUnavailableError if the operation must not reach the database."""
+        with self.lock:
+            state = self.state
+            if state == 'closed':
+                return
+            if state == 'half-open' and not self.trial_running:
+                self.trial_running = True
+                return
+        record_connection_event('breaker_rejected')
+        raise DatabaseUnavailableError(f"Database {self.name} is unavailable, retry shortly")
+
+    def record_success(self):
+        with self.lock:
+            if self.opened_at is not None:
+                logger.info(f"Circuit breaker for {self.name} closed")
+            self.failures = 0
+            self.opened_at = None
+            self.trial_running = False
+
+    def release_trial(self):
+        """Let another trial through after one that failed before reaching the database."""
+        with self.lock:
+            self.trial_running = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            reopen = self.trial_running
+            self.trial_running = False
+            if reopen or (self.opened_at is None and self.failures >= self.threshold):
+                self.opened_at = time.monotonic()
+                logger.error(f"Circuit breaker for {self.name} opened after {self.failures} connection failures")
+                record_connection_event('breaker_opened')
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+def get_circuit_breaker(database_url):
+    """Get the process-wide circuit breaker for a database URL."""
+    with _breakers_lock:
+        breaker = _breakers.get(database_url)
+        if breaker is None:
+            breaker = CircuitBreaker(make_url(database_url).render_as_string(hide_password=True))
+            _breakers[database_url] = breaker
+        return breaker
+
+_connection_stats = Counter()
+_connection_stats_lock = threading.Lock()
+
+def record_connection_event(name):
+    with _connection_stats_lock:
+        _connection_stats[name] += 1
+
+def get_connection_stats():
+    """Process-wide counts of each connection recovery path taken."""
+    with _connection_stats_lock:
+        return dict(_connection_stats)
+
+def is_connection_error(error):
+    """Whether a database error means the connection, not the statement, failed."""
+    return (
+        getattr(error, 'connection_invalidated', False)
+        or "SSL connection has been closed" in str(error)
+        or "connection" in str(error).lower()
+    )
+
+def retry_delay(attempt):
+    """Full-jitter exponential backoff for the given zero-based retry attempt."""
+    return random.uniform(0, min(DB_RETRY_MAX_DELAY, DB_RETRY_BASE_DELAY * (2 ** attempt)))
+
+# Process-wide cache of search results, invalidated by the data version
+SEARCH_CACHE_MB = float(os.getenv("SEARCH_CACHE_MB", "64"))
+search_cache = ResultCache(int(SEARCH_CACHE_MB * 1024 * 1024))
+# Analytics cubes are small (one row per folder, file, occupation and age band)
+analytics_cache = ResultCache(32 * 1024 * 1024)
+
+# Prefix indexes for search-field completions, shared by every Storage in the process
+typeahead_index = TypeaheadIndex()
+# How often a Storage checks whether another process changed the data behind the typeahead index
+TYPEAHEAD_CHECK_SECONDS = float(os.getenv("TYPEAHEAD_CHECK_SECONDS", "2"))
+# Data versions the typeahead index catches up on from the change log; further behind, it is rebuilt
+TYPEAHEAD_MAX_CATCH_UP = int(os.getenv("TYPEAHEAD_MAX_CATCH_UP", "1000"))
+
+# Exact analytics computed in background threads, by cache key, so each runs once at a time
+background_aggregates = set()
+background_lock = threading.Lock()
+
+# Records are spread at random over this many sample buckets
+SAMPLE_BUCKETS = 100
+# Buckets read for analytics estimates, out of SAMPLE_BUCKETS: 1 is a 1% sample
+ESTIMATE_SAMPLE_BUCKETS = int(os.getenv("ESTIMATE_SAMPLE_BUCKETS", "1"))
+# Estimate margins are 95% confidence intervals
+ESTIMATE_Z = 1.96
+
+# Process-wide ids of dictionary values, per DICTIONARY_FIELDS field; only committed ids are cached
+dictionary_ids = {field: {} for field in DICTIONARY_FIELDS}
+# Values per statement when looking up dictionary ids
+DICTIONARY_LOOKUP_SIZE = 1000
+
+def folder_of(file_name):
+    """Folder (batch name) part of a batch/file name, None for files outside a folder."""
+    return file_name.split('/', 1)[0] if '/' in file_name else None
+
+def folder_prefix(folder):
+    """LIKE pattern (escaped with backslash) matching every file_name in a folder."""
+    escaped = folder.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f"{escaped}/%"
+
+@contextmanager
+def read_snapshot(engine):
+    """Connection whose reads all see one snapshot of the database, in a read-only transaction."""
+    # AUTOCOMMIT hands transaction control to the explicit BEGIN below; on SQLite,
+    # pysqlite would otherwise run each SELECT in its own snapshot
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        connection.exec_driver_sql(
+            "BEGIN ISOLATION LEVEL REPEATABLE READ READ ONLY" if engine.dialect.name == 'postgresql' else "BEGIN"
+        )
+        try:
+            yield connection
+        finally:
+            connection.exec_driver_sql("COMMIT")
+
+# Reads stay on the primary for this long after the same Storage wrote, so replica lag is never visible to the writer
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", "10"))
 
 class Storage:
-    def __init__(self):
+    def __init__(self, read_url=None):
+        # Optional read replica for read-only queries; writes always go to DATABASE_URL
+        self.read_url = read_url or os.getenv("DATABASE_READ_URL")
+        self.last_write_at = None
         self.initialize_database()
 
     def initialize_database(self):
@@ -66,18 +464,32 @@ class Storage:
                 if not database_url:
                     raise ValueError("DATABASE_URL environment variable is not set")
 
-                # Configure connection pooling
-                self.engine = create_engine(
-                    database_url,
-                    poolclass=QueuePool,
-                    pool_size=10,
-                    max_overflow=20,
-                    pool_timeout=30,
-                    pool_pre_ping=True  # Enable connection health checks
-                )
-                Base.metadata.create_all(self.engine)
+                # Engines and their pools are shared by every session in the process
+                self.engine = get_engine(database_url)
+                self.breaker = get_circuit_breaker(database_url)
+                self.is_sqlite = self.engine.dialect.name == 'sqlite'
+                # Checked once per process, so a new session does not query the database here
+                self.records_partitioned = ensure_schema(self.engine)
                 Session = sessionmaker(bind=self.engine)
                 self.session = Session()
+                # Changes to typeahead values staged by the current write, applied once it commits
+                self._typeahead_pending = {'versions': [], 'added': [], 'removed': [], 'invalidate': False}
+                self._typeahead_checked_at = 0.0
+                event.listen(self.session, 'after_commit', self._apply_typeahead)
+                event.listen(self.session, 'after_rollback', self._discard_typeahead)
+                # Dictionary ids looked up by the current write, cached once it commits
+                self._dictionary_pending = {field: {} for field in DICTIONARY_FIELDS}
+                event.listen(self.session, 'after_commit', self._apply_dictionary_ids)
+                event.listen(self.session, 'after_rollback', self._discard_dictionary_ids)
+
+                if self.read_url:
+                    # Autocommit so no transaction is held open on the replica between reads
+                    self.read_engine = get_engine(self.read_url, isolation_level="AUTOCOMMIT")
+                    ReadSession = sessionmaker(bind=self.read_engine)
+                    self.read_session = ReadSession()
+                else:
+                    self.read_engine = self.engine
+                    self.read_session = self.session
                 logger.info("Database initialized successfully with connection pooling")
                 return
             except Exception as e:
@@ -88,113 +500,505 @@ class Storage:
                 else:
                     raise
 
+    def _reader(self):
+        """Session for read-only queries: the replica, unless this Storage wrote recently."""
+        if self.read_session is self.session:
+            return self.session
+        if self.last_write_at is not None and time.monotonic() - self.last_write_at < READ_YOUR_WRITES_SECONDS:
+            return self.session
+        # The read session never commits, so drop cached objects to see the replica's latest rows
+        self.read_session.expire_all()
+        return self.read_session
+
+    def _mark_write(self):
+        """Record that this Storage just committed a write, pinning its reads to the primary."""
+        self.last_write_at = time.monotonic()
+
+    def release(self):
+        """Return the sessions' connections to the pool; they check out a new one on next use."""
+        self.session.close()
+        if self.read_session is not self.session:
+            self.read_session.close()
+
+    def _bump_data_version(self):
+        """Invalidate cached results; call inside the write's transaction, before commit."""
+        version = self.session.execute(
+            update(DataVersion).where(DataVersion.id == 1).values(version=DataVersion.version + 1)
+            .returning(DataVersion.version)
+        ).scalar()
+        self._typeahead_pending['versions'].append(version)
+        return version
+
+    def _stage_typeahead(self, added=(), removed=(), invalidate=False):
+        """Stage record values added or removed by the current write for the typeahead index.
+
+        invalidate is for writes whose removed values are not known, such as
+        bulk deletes; the index is then rebuilt.
+        """
+        self._typeahead_pending['added'].extend(added)
+        self._typeahead_pending['removed'].extend(removed)
+        self._typeahead_pending['invalidate'] |= invalidate
+
+    def _apply_typeahead(self, session):
+        pending = self._typeahead_pending
+        if pending['versions']:
+            typeahead_index.apply(min(pending['versions']), max(pending['versions']),
+                                  pending['added'], pending['removed'], pending['invalidate'])
+        self._discard_typeahead(session)
+
+    def _discard_typeahead(self, session):
+        self._typeahead_pending = {'versions': [], 'added': [], 'removed': [], 'invalidate': False}
+
+    def _apply_dictionary_ids(self, session):
+        for field, ids in self._dictionary_pending.items():
+            dictionary_ids[field].update(ids)
+        self._discard_dictionary_ids(session)
+
+    def _discard_dictionary_ids(self, session):
+        self._dictionary_pending = {field: {} for field in DICTIONARY_FIELDS}
+
+    def _dictionary_ids(self, field, values):
+        """Ids of the given values of a dictionary-encoded field, adding missing values in the current transaction."""
+        cached = dictionary_ids[field]
+        pending = self._dictionary_pending[field]
+        ids = {value: cached.get(value, pending.get(value)) for value in set(values) if value is not None}
+        missing = [value for value, value_id in ids.items() if value_id is None]
+        if missing:
+            model = DICTIONARY_FIELDS[field][1]
+            table = model.__tablename__
+            self.session.execute(
+                text(f"INSERT INTO {table} (value) VALUES (:value) ON CONFLICT (value) DO NOTHING"),
+                [{'value': value} for value in missing]
+            )
+            for start in range(0, len(missing), DICTIONARY_LOOKUP_SIZE):
+                found = self.session.execute(
+                    select(model.value, model.id).where(model.value.in_(missing[start:start + DICTIONARY_LOOKUP_SIZE]))
+                ).all()
+                pending.update(found)
+                ids.update(found)
+        return ids
+
+    def _encode_rows(self, rows):
+        """Replace পেশা and ঠিকানা in record rows with their dictionary ids, in place. Returns rows."""
+        for field, (id_column, _) in DICTIONARY_FIELDS.items():
+            ids = self._dictionary_ids(field, (row[field] for row in rows if field in row))
+            for row in rows:
+                if field in row:
+                    row[id_column] = ids.get(row.pop(field))
+        return rows
+
+    def _log_change(self, operation, record_id=None, file_name=None, data=None, previous=None):
+        """Append a change log entry in the current transaction, after _bump_data_version.
+
+        previous is the record's TYPEAHEAD_FIELDS before an update or delete,
+        which lets other processes apply the change to their typeahead index.
+        """
+        self.session.add(ChangeLogEntry(
+            operation=operation,
+            record_id=record_id,
+            file_name=file_name,
+            data=json.dumps(data, ensure_ascii=False) if data is not None else None,
+            data_version=self._typeahead_pending['versions'][-1],
+            previous=json.dumps(previous, ensure_ascii=False) if previous is not None else None
+        ))
+
+    def get_data_version(self, session=None):
+        """Current data version as seen by session (the read session by default)."""
+        session = session or self._reader()
+        return session.execute(select(DataVersion.version).where(DataVersion.id == 1)).scalar() or 0
+
     def reconnect(self):
-        """Reconnect to database if connection is lost"""
-        try:
-            self.session.close()
-        except:
-            pass
-        self.initialize_database()
+        """Drop the sessions' broken connections; the next query checks out a fresh one.
+
+        The engine and its pool are kept: SQLAlchemy invalidates the pool when
+        it detects a disconnect, and otherwise only the connections these
+        sessions held are discarded.
+        """
+        for session in {self.session, self.read_session}:
+            try:
+                if session.in_transaction():
+                    session.connection().invalidate()
+                    record_connection_event('invalidated')
+            except Exception:
+                pass
+            try:
+                session.rollback()
+            except Exception:
+                pass
 
     def execute_with_retry(self, operation):
-        """Execute database operation with retry mechanism"""
-        max_retries = 3
-        retry_delay = 1
+        """Execute database operation, retrying connection failures on a fresh connection"""
+        self.breaker.before_call()
 
-        for attempt in range(max_retries):
+        for attempt in range(DB_RETRY_ATTEMPTS):
             try:
-                return operation()
-            except OperationalError as e:
-                if "SSL connection has been closed" in str(e) or "connection" in str(e).lower():
-                    logger.warning(f"Database connection error (attempt {attempt + 1}/{max_retries}): {str(e)}")
-                    if attempt < max_retries - 1:
-                        self.reconnect()
-                        time.sleep(retry_delay)
-                        retry_delay *= 2
-                    else:
-                        raise
-                else:
+                result = operation()
+                self.breaker.record_success()
+                if attempt:
+                    record_connection_event('recovered')
+                return result
+            except DBAPIError as e:
+                # A dropped SQLite connection raises ProgrammingError, which SQLAlchemy flags as a disconnect
+                if not isinstance(e, OperationalError) and not e.connection_invalidated:
+                    self.breaker.record_success()
+                    logger.error(f"Database error: {str(e)}")
                     raise
+                if not is_connection_error(e):
+                    # The database answered, so this says nothing about its availability
+                    self.breaker.record_success()
+                    record_connection_event('query_error')
+                    raise
+                self.breaker.record_failure()
+                logger.warning(f"Database connection error (attempt {attempt + 1}/{DB_RETRY_ATTEMPTS}): {str(e)}")
+                self.reconnect()
+                if attempt == DB_RETRY_ATTEMPTS - 1:
+                    record_connection_event('gave_up')
+                    raise
+                record_connection_event('retried')
+                time.sleep(retry_delay(attempt))
+                # Stop retrying once the breaker opens so callers fail fast
+                self.breaker.before_call()
             except SQLAlchemyError as e:
+                self.breaker.record_success()
                 logger.error(f"Database error: {str(e)}")
                 raise
+            except Exception:
+                self.breaker.release_trial()
+                raise
 
     def add_file_data(self, filename, records):
         """Add or update file data."""
         def operation():
-            for record in records:
-                db_record = Record(
-                    file_name=filename,
-                    ক্রমিক_নং=record.get('ক্রমিক_নং', ''),
-                    নাম=record.get('নাম', ''),
-                    ভোটার_নং=record.get('ভোটার_নং', ''),
-                    পিতার_নাম=record.get('পিতার_নাম', ''),
-                    মাতার_নাম=record.get('মাতার_নাম', ''),
-                    পেশা=record.get('পেশা', ''),
-                    জন্ম_তারিখ=record.get('জন্ম_তারিখ', ''),
-                    ঠিকানা=record.get('ঠিকানা', '')
-                )
-                self.session.add(db_record)
+            rows = self._encode_rows([self._record_row(filename, record) for record in records])
+            if rows:
+                self.session.execute(insert(Record), rows)
+                self._count_file_records(filename, len(rows))
+            self._add_places(filename)
+            self._bump_data_version()
+            self._stage_typeahead(added=records)
+            self._log_change(ChangeOperation.LOAD_FILE, file_name=filename)
             self.session.commit()
+            self._mark_write()
         self.execute_with_retry(operation)
 
+    def _record_row(self, filename, record):
+        """Build the column values of a Record from a parsed record dictionary."""
+        row = {field: record.get(field, '') for field in RECORD_FIELDS}
+        row['file_name'] = filename
+        row['folder'] = folder_of(filename)
+        row['birth_date'] = parse_birth_date(row['জন্ম_তারিখ'])
+        row.update(parse_address(row['ঠিকানা']))
+        row['sample_bucket'] = random.randrange(SAMPLE_BUCKETS)
+        return row
+
+    def _frame_rows(self, filename, frame):
+        """Build the column values of Records from a DataFrame of parsed records."""
+        frame = frame.reindex(columns=RECORD_FIELDS).fillna('')
+        frame['file_name'] = filename
+        frame['folder'] = folder_of(filename)
+        frame['birth_date'] = frame['জন্ম_তারিখ'].map(parse_birth_date).astype(object)
+        addresses = [parse_address(address) for address in frame['ঠিকানা']]
+        for component in ADDRESS_COMPONENTS:
+            frame[component] = [address[component] for address in addresses]
+        frame['sample_bucket'] = [random.randrange(SAMPLE_BUCKETS) for _ in range(len(frame))]
+        return frame.to_dict('records')
+
 
-    @functools.lru_cache(maxsize=128)
     def get_file_names(self):
-        """Get list of all uploaded files with caching."""
-        def operation():
-            # Use more efficient query
-            result = self.session.execute(
-                text("SELECT DISTINCT file_name FROM records")
-            )
-            return [row[0] for row in result]
-        return self.execute_with_retry(operation)
+        """Get list of all uploaded files from the files table, cached until the next write bumps the data version."""
+        def compute(connection):
+            return connection.execute(select(File.file_name).order_by(File.file_name)).scalars().all()
+        return self._cached_aggregate(('file_names',), compute)
+
+    def _count_file_records(self, file_name, count):
+        """Add count (negative for deletes) to a file's record count in files, in the current transaction."""
+        if file_name is None:
+            return
+        self.session.execute(
+            text("""
+                INSERT INTO files (file_name, folder, records) VALUES (:file_name, :folder, :records)
+                ON CONFLICT (file_name) DO UPDATE SET records = files.records + excluded.records
+            """),
+            {'file_name': file_name, 'folder': folder_of(file_name), 'records': count}
+        )
+        if count < 0:
+            self.session.query(File).filter(File.file_name == file_name, File.records <= 0).delete()
 
-    def get_file_data(self, filename, page=1, per_page=100):
-        """Get paginated data for a specific file."""
+    def get_file_data(self, filename, page=1, per_page=100, columnar=False):
+        """Get paginated data for a specific file.
+
+        With columnar=True the records are a DataFrame instead of a list of dictionaries.
+        """
         def operation():
+            session = self._reader()
             offset = (page - 1) * per_page
-            records = (self.session.query(Record)
-                      .filter_by(file_name=filename)
-                      .limit(per_page)
-                      .offset(offset)
-                      .all())
-            total = self.session.query(Record).filter_by(file_name=filename).count()
+            statement = (self._record_select()
+                         .where(Record.file_name == filename)
+                         .order_by(Record.id)
+                         .limit(per_page)
+                         .offset(offset))
+            total = session.query(Record).filter_by(file_name=filename).count()
             return {
-                'records': [self._record_to_dict(record, include_id=True) for record in records],
+                'records': self._record_results(session.execute(statement).all(), columnar),
                 'total': total,
                 'pages': (total + per_page - 1) // per_page
             }
         return self.execute_with_retry(operation)
 
-    def get_all_records(self):
+    def get_all_records(self, columnar=False):
         """Get all records from all files."""
         def operation():
-            records = self.session.query(Record).all()
-            return [self._record_to_dict(record, include_id=True) for record in records]
+            session = self._reader()
+            rows = session.execute(self._record_select().order_by(Record.id)).all()
+            return self._record_results(rows, columnar)
         return self.execute_with_retry(operation)
 
-    def search_records(self, **kwargs):
-        """Search records based on given criteria."""
+    def get_records_after(self, after_id=0, limit=500, file_name=None, folder=None, columnar=False):
+        """Get up to limit records with id greater than after_id, in id order.
+
+        Keyset pagination: pass next_after_id back as after_id for the next
+        page. Unlike OFFSET, every page costs the same however deep it is.
+        next_after_id is None on the last page.
+        """
+        def operation():
+            session = self._reader()
+            statement = self._record_select().where(Record.id > after_id)
+            if file_name:
+                statement = statement.where(Record.file_name == file_name)
+            if folder:
+                statement = statement.where(Record.folder == folder)
+            rows = session.execute(statement.order_by(Record.id).limit(limit)).all()
+            return {
+                'records': self._record_results(rows, columnar),
+                'next_after_id': rows[-1][0] if len(rows) == limit else None
+            }
+        return self.execute_with_retry(operation)
+
+    def search_records(self, columnar=False, **kwargs):
+        """Search records based on given criteria.
+
+        Results are cached per normalized parameter set until the next write
+        bumps the data version. With columnar=True they are returned as a
+        DataFrame instead of a list of dictionaries.
+        """
+        cache_key = normalize_params(kwargs)
+
         def operation():
-            query = self.session.query(Record)
+            session = self._reader()
+            version = self.get_data_version(session)
+            rows = search_cache.get(cache_key, version)
+            if rows is not None:
+                return self._record_results(rows, columnar)
+            statement = self._record_select()
+            fts_conditions = []
+            params = {}
             for key, value in kwargs.items():
                 if value:
-                    query = query.filter(getattr(Record, key).ilike(f"%{value}%"))
-            results = query.all()
-            return [self._record_to_dict(record, include_id=True) for record in results]
+                    if self.is_sqlite and SQLITE_FTS_AVAILABLE and key in RECORD_FIELDS and len(value) >= 3:
+                        # LIKE on a trigram FTS5 table is answered from the index; shorter
+                        # non-ASCII patterns are not matched reliably by the tokenizer
+                        params[f'p{len(params)}'] = f"%{value}%"
+                        fts_conditions.append(f'"{key}" LIKE :p{len(params) - 1}')
+                    else:
+                        statement = statement.where(self._field_column(key).ilike(f"%{value}%"))
+            if fts_conditions:
+                matches = text(
+                    f"SELECT rowid FROM records_fts WHERE {' AND '.join(fts_conditions)}"
+                ).bindparams(**params)
+                statement = statement.where(Record.id.in_(matches))
+            # Cached as plain tuples: far smaller than dictionaries, and shared by both result forms
+            rows = [tuple(row) for row in session.execute(statement).all()]
+            search_cache.put(cache_key, version, rows, estimate_size(rows))
+            return self._record_results(rows, columnar)
+        return self.execute_with_retry(operation)
+
+    def _record_select(self):
+        """Select RECORD_RESULT_COLUMNS, joining each record's relation and dictionary values in the same query."""
+        return (select(Record.id, *(self._field_column(field) for field in RECORD_FIELDS),
+                       Record.file_name, RelationRecord.relation_type)
+                .outerjoin(RelationRecord, RelationRecord.record_id == Record.id)
+                .outerjoin(Occupation, Occupation.id == Record.occupation_id)
+                .outerjoin(Address, Address.id == Record.address_id))
+
+    @staticmethod
+    def _field_column(field):
+        """Column of a record field in _record_select: the joined dictionary value for encoded fields."""
+        if field in DICTIONARY_FIELDS:
+            return DICTIONARY_FIELDS[field][1].value.label(field)
+        return getattr(Record, field)
+
+    @staticmethod
+    def _record_results(rows, columnar=False):
+        """Turn rows of _record_select into a DataFrame, or into dictionaries like _record_to_dict."""
+        if columnar:
+            import pandas as pd  # Imported lazily, only columnar callers need it
+            frame = pd.DataFrame.from_records(rows, columns=RECORD_RESULT_COLUMNS)
+            frame['relation_type'] = frame['relation_type'].map(
+                lambda relation: (relation or RelationType.NONE).value
+            )
+            return frame
+        none = RelationType.NONE
+        return [
+            dict(zip(RECORD_RESULT_COLUMNS, (*row[:-1], (row[-1] or none).value)))
+            for row in rows
+        ]
+
+    def _add_places(self, file_name):
+        """Add the places of a file's records missing from places, in the current transaction."""
+        columns = ', '.join(ADDRESS_COMPONENTS)
+        # The WHERE clause also keeps SQLite from parsing ON CONFLICT as part of the SELECT
+        self.session.execute(
+            text(f"""
+                INSERT INTO places ({columns})
+                SELECT DISTINCT {columns} FROM records
+                WHERE file_name = :file_name AND upazila IS NOT NULL
+                ON CONFLICT DO NOTHING
+            """),
+            {'file_name': file_name}
+        )
+
+    def _prune_places(self):
+        """Remove places no record has any more, in the current transaction, after a bulk delete."""
+        matches = ' AND '.join(f"records.{component} = places.{component}" for component in ADDRESS_COMPONENTS)
+        self.session.execute(text(
+            f"DELETE FROM places WHERE NOT EXISTS (SELECT 1 FROM records WHERE {matches})"
+        ))
+
+    def get_place_children(self, upazila=None, union_name=None, post_office=None):
+        """Distinct values of the next address level below the given ones, sorted.
+
+        With no arguments this lists upazilas; with an upazila, its unions;
+        and so on down to villages. Answered from the small places table.
+        """
+        path = [upazila, union_name, post_office]
+        depth = next((i for i, value in enumerate(path) if value is None), len(path))
+
+        def operation():
+            session = self._reader()
+            column = getattr(Place, ADDRESS_COMPONENTS[depth])
+            statement = select(column).distinct().order_by(column)
+            for component, value in zip(ADDRESS_COMPONENTS, path[:depth]):
+                statement = statement.where(getattr(Place, component) == value)
+            return session.execute(statement).scalars().all()
+        return self.execute_with_retry(operation)
+
+    def get_records_by_place(self, upazila=None, union_name=None, post_office=None, village=None,
+                             folder=None, columnar=False):
+        """Get records whose parsed address matches every given component exactly.
+
+        Components left as None are not filtered on; '' matches addresses
+        without that part. Uses the ix_records_place index, or the village
+        index when only a village is given.
+        """
+        place = {'upazila': upazila, 'union_name': union_name, 'post_office': post_office, 'village': village}
+
+        def operation():
+            session = self._reader()
+            statement = self._record_select()
+            for component, value in place.items():
+                if value is not None:
+                    statement = statement.where(getattr(Record, component) == value)
+            if folder and folder != 'সকল':
+                statement = statement.where(Record.folder == folder)
+            rows = session.execute(statement.order_by(Record.id)).all()
+            return self._record_results(rows, columnar)
         return self.execute_with_retry(operation)
 
+    def get_completions(self, field, prefix, limit=10):
+        """Up to limit distinct values of field starting with prefix, for search-as-you-type.
+
+        field is one of TYPEAHEAD_FIELDS. Answered from the in-memory
+        typeahead index, which the first call in the process starts building
+        in the background; until it is built there are no completions.
+        """
+        if field not in TYPEAHEAD_FIELDS:
+            raise ValueError(f"No typeahead index for {field}")
+        typeahead_index.ensure_built(self._load_typeahead_counts)
+        now = time.monotonic()
+        if now - self._typeahead_checked_at >= TYPEAHEAD_CHECK_SECONDS:
+            self._typeahead_checked_at = now
+            version = self.execute_with_retry(self.get_data_version)
+            typeahead_index.refresh(version, self._load_typeahead_counts, self._load_typeahead_changes)
+        return typeahead_index.complete(field, prefix, limit)
+
+    def _load_typeahead_counts(self):
+        """Data version and per-value record counts of TYPEAHEAD_FIELDS, for building the index.
+
+        Runs on its own connection, as rebuilds happen in a background thread,
+        and reads one snapshot so the counts are exactly those at the version.
+        """
+        with read_snapshot(self.read_engine) as connection:
+            version = connection.execute(select(DataVersion.version).where(DataVersion.id == 1)).scalar()
+            counts = {}
+            for field in TYPEAHEAD_FIELDS:
+                column = getattr(Record, field)
+                counts[field] = dict(connection.execute(
+                    select(column, func.count()).where(column.isnot(None), column != '').group_by(column)
+                ).all())
+        return version, counts
+
+    def _load_typeahead_changes(self, first_version, last_version):
+        """Records added and removed by the writes after first_version up to last_version, from the change log.
+
+        Returns (added, removed) as lists of TYPEAHEAD_FIELDS dictionaries,
+        or None if the index has to be rebuilt instead: a version without
+        entries (a batch of a load), bulk writes that do not log record
+        values, or too many versions to catch up on.
+        """
+        if last_version - first_version > TYPEAHEAD_MAX_CATCH_UP:
+            return None
+        with self.read_engine.connect() as connection:
+            entries = connection.execute(
+                select(ChangeLogEntry.data_version, ChangeLogEntry.operation, ChangeLogEntry.data,
+                       ChangeLogEntry.previous)
+                .where(ChangeLogEntry.data_version > first_version, ChangeLogEntry.data_version <= last_version)
+                .order_by(ChangeLogEntry.version)
+            ).all()
+        if {entry.data_version for entry in entries} != set(range(first_version + 1, last_version + 1)):
+            return None
+        added, removed = [], []
+        for entry in entries:
+            if entry.operation not in (ChangeOperation.UPDATE, ChangeOperation.DELETE, ChangeOperation.RELATION):
+                return None
+            if entry.previous is None:
+                continue
+            removed.append(json.loads(entry.previous))
+            if entry.operation == ChangeOperation.UPDATE:
+                record = json.loads(entry.data)
+                added.append({field: record.get(field) for field in TYPEAHEAD_FIELDS})
+        return added, removed
+
     def update_record(self, record_id, updated_data):
         """Update a specific record by ID."""
         def operation():
             try:
                 record = self.session.query(Record).filter_by(id=record_id).first()
                 if record:
-                    for key, value in updated_data.items():
-                        if hasattr(record, key):
+                    before = {field: getattr(record, field) for field in TYPEAHEAD_FIELDS}
+                    encoded = self._encode_rows([{field: updated_data[field] for field in DICTIONARY_FIELDS
+                                                  if field in updated_data}])[0]
+                    for key, value in list(updated_data.items()) + list(encoded.items()):
+                        if hasattr(record, key) and key not in DICTIONARY_FIELDS:
                             setattr(record, key, value)
+                    if 'জন্ম_তারিখ' in updated_data:
+                        record.birth_date = parse_birth_date(record.জন্ম_তারিখ)
+                    if 'ঠিকানা' in updated_data:
+                        for component, value in parse_address(updated_data['ঠিকানা']).items():
+                            setattr(record, component, value)
+                    self.session.flush()
+                    if encoded:
+                        # Decoded again from the dictionaries on next access
+                        self.session.expire(record, list(DICTIONARY_FIELDS))
+                    if 'ঠিকানা' in updated_data:
+                        self._add_places(record.file_name)
+                    self._bump_data_version()
+                    after = {field: getattr(record, field) for field in TYPEAHEAD_FIELDS}
+                    self._stage_typeahead(added=[after], removed=[before])
+                    self._log_change(ChangeOperation.UPDATE, record_id, record.file_name,
+                                     self._record_to_dict(record, include_id=True),
+                                     previous=before if before != after else None)
                     self.session.commit()
+                    self._mark_write()
                     return True
                 return False
             except Exception as e:
@@ -203,15 +1007,133 @@ class Storage:
                 return False
         return self.execute_with_retry(operation)
 
+    def bulk_update_records(self, updates):
+        """Apply edits to many records in one transaction with a set-based UPDATE ... FROM (VALUES ...).
+
+        updates maps record id to a dictionary of changed RECORD_FIELDS.
+        Fields a record does not change are passed as NULL and keep their
+        value. Returns the number of records updated.
+        """
+        updates = {
+            int(record_id): {field: '' if value is None else str(value) for field, value in changes.items()}
+            for record_id, changes in updates.items() if changes
+        }
+        if not updates:
+            return 0
+        fields = [field for field in RECORD_FIELDS if any(field in changes for changes in updates.values())]
+        unknown = {field for changes in updates.values() for field in changes} - set(fields)
+        if unknown:
+            raise ValueError(f"Cannot update fields: {', '.join(sorted(unknown))}")
+
+        # Derived columns are recomputed only for records whose source field changed;
+        # dictionary-encoded fields are set through their id columns
+        columns = [DICTIONARY_FIELDS[field][0] if field in DICTIONARY_FIELDS else field for field in fields]
+        if 'জন্ম_তারিখ' in fields:
+            columns.append('birth_date')
+        if 'ঠিকানা' in fields:
+            columns.extend(ADDRESS_COMPONENTS)
+        rows = []
+        for record_id, changes in updates.items():
+            row = [record_id] + [changes.get(field) for field in fields]
+            if 'জন্ম_তারিখ' in fields:
+                birth_date = parse_birth_date(changes['জন্ম_তারিখ']) if 'জন্ম_তারিখ' in changes else None
+                row.append(birth_date.isoformat() if birth_date else None)
+            if 'ঠিকানা' in fields:
+                address = parse_address(changes['ঠিকানা']) if 'ঠিকানা' in changes else {}
+                row.extend(address.get(component) for component in ADDRESS_COMPONENTS)
+            rows.append(row)
+
+        assignments = []
+        for column in columns:
+            if column == 'birth_date':
+                # NULL is a valid parsed value here, so key off the source field instead of COALESCE
+                value = 'CAST(v.birth_date AS DATE)' if not self.is_sqlite else 'v.birth_date'
+                assignments.append(
+                    f'birth_date = CASE WHEN v."জন্ম_তারিখ" IS NULL THEN records.birth_date ELSE {value} END'
+                )
+            else:
+                assignments.append(f'"{column}" = COALESCE(v."{column}", records."{column}")')
+        statement_rows = len(rows)
+        if self.is_sqlite:
+            statement_rows = max(1, SQLITE_MAX_PARAMS // (len(columns) + 1))
+
+        def operation():
+            try:
+                ids = list(updates)
+                before = {}
+                if set(fields) & set(TYPEAHEAD_FIELDS):
+                    before = {row.id: {field: getattr(row, field) for field in TYPEAHEAD_FIELDS}
+                              for row in self.session.execute(
+                                  select(Record.id, *(getattr(Record, field) for field in TYPEAHEAD_FIELDS))
+                                  .where(Record.id.in_(ids))
+                              )}
+
+                encoded_rows = [list(row) for row in rows]
+                for field in set(fields) & set(DICTIONARY_FIELDS):
+                    position = 1 + fields.index(field)
+                    value_ids = self._dictionary_ids(field, (row[position] for row in rows if row[position] is not None))
+                    for row in encoded_rows:
+                        if row[position] is not None:
+                            row[position] = value_ids[row[position]]
+
+                for start in range(0, len(encoded_rows), statement_rows):
+                    chunk = encoded_rows[start:start + statement_rows]
+                    params = {}
+                    values = []
+                    for i, row in enumerate(chunk):
+                        names = [f"r{i}_{j}" for j in range(len(row))]
+                        params.update(zip(names, row))
+                        values.append('(' + ', '.join(f":{name}" for name in names) + ')')
+                    column_names = ', '.join(['id'] + [f'"{column}"' for column in columns])
+                    self.session.execute(text(f"""
+                        WITH v ({column_names}) AS (VALUES {', '.join(values)})
+                        UPDATE records SET {', '.join(assignments)}
+                        FROM v WHERE records.id = v.id
+                    """), params)
+
+                after = self._record_results(self.session.execute(
+                    self._record_select().where(Record.id.in_(ids))
+                ).all())
+                if 'ঠিকানা' in fields:
+                    for file_name in {record['file_name'] for record in after}:
+                        self._add_places(file_name)
+                version = self._bump_data_version()
+                self._stage_typeahead(added=after if before else (), removed=list(before.values()))
+                # One multi-row insert rather than an ORM object per entry
+                self.session.execute(insert(ChangeLogEntry), [{
+                    'operation': ChangeOperation.UPDATE,
+                    'record_id': record['id'],
+                    'file_name': record['file_name'],
+                    'data': json.dumps(record, ensure_ascii=False),
+                    'data_version': version,
+                    'previous': json.dumps(before[record['id']], ensure_ascii=False) if before else None
+                } for record in after])
+                self.session.commit()
+                self._mark_write()
+                # rowcount is not reported for a statement starting with WITH on SQLite
+                logger.info(f"Bulk updated {len(after)} records")
+                return len(after)
+            except Exception as e:
+                self.session.rollback()
+                logger.error(f"Error bulk updating records: {str(e)}")
+                raise
+        return self.execute_with_retry(operation)
+
     def delete_record(self, record_id):
         """Delete a specific record by ID."""
         def operation():
             try:
                 record = self.session.query(Record).filter_by(id=record_id).first()
                 if record:
-                    # This will cascade delete any relations due to ForeignKey constraint
+                    self.session.query(RelationRecord).filter_by(record_id=record_id).delete()
                     self.session.delete(record)
+                    self._count_file_records(record.file_name, -1)
+                    self._bump_data_version()
+                    before = {field: getattr(record, field) for field in TYPEAHEAD_FIELDS}
+                    self._stage_typeahead(removed=[before])
+                    self._log_change(ChangeOperation.DELETE, record_id, record.file_name, previous=before)
                     self.session.commit()
+                    self._mark_write()
                     return True
                 return False
             except Exception as e:
@@ -244,13 +1166,18 @@ class Storage:
                     ভোটার_নং=record.ভোটার_নং,
                     পিতার_নাম=record.পিতার_নাম,
                     মাতার_নাম=record.মাতার_নাম,
-                    পেশা=record.পেশা,
+                    occupation_id=record.occupation_id,
                     জন্ম_তারিখ=record.জন্ম_তারিখ,
-                    ঠিকানা=record.ঠিকানা,
+                    address_id=record.address_id,
                     file_name=record.file_name
                 )
                 self.session.add(relation)
+                self._bump_data_version()
+                data = self._record_to_dict(record, include_id=True)
+                data['relation_type'] = relation_type.value
+                self._log_change(ChangeOperation.RELATION, record_id, record.file_name, data)
                 self.session.commit()
+                self._mark_write()
                 logger.info(f"Successfully marked record {record_id} as {relation_type.value}")
                 return True
 
@@ -263,8 +1190,9 @@ class Storage:
     def get_relations_by_type(self, relation_type: RelationType, folder: str = None):
         """Get all records marked as friends or enemies, optionally filtered by folder"""
         def operation():
+            session = self._reader()
             try:
-                query = self.session.query(RelationRecord).filter_by(relation_type=relation_type)
+                query = session.query(RelationRecord).filter_by(relation_type=relation_type)
                 if folder and folder != "সকল":
                     query = query.filter_by(folder=folder)
                 relations = query.all()
@@ -286,7 +1214,7 @@ class Storage:
                 return []
         return self.execute_with_retry(operation)
 
-    def _record_to_dict(self, record, include_id=False):
+    def _record_to_dict(self, record, include_id=False, session=None):
         """Convert Record object to dictionary."""
         result = {
             'ক্রমিক_নং': record.ক্রমিক_নং,
@@ -302,7 +1230,7 @@ class Storage:
         }
 
         # Check if this record has any relations
-        relation = self.session.query(RelationRecord).filter_by(record_id=record.id).first()
+        relation = (session or self.session).query(RelationRecord).filter_by(record_id=record.id).first()
         if relation:
             result['relation_type'] = relation.relation_type.value
 
@@ -314,9 +1242,18 @@ class Storage:
         """Delete all records associated with a specific file."""
         def operation():
             try:
-                # This will cascade delete relations due to ForeignKey constraint
+                self.session.query(RelationRecord).filter(
+                    RelationRecord.record_id.in_(select(Record.id).where(Record.file_name == filename))
+                ).delete(synchronize_session=False)
                 deleted = self.session.query(Record).filter_by(file_name=filename).delete()
+                self.session.query(File).filter_by(file_name=filename).delete()
+                self.session.query(IngestCheckpoint).filter_by(file_name=filename).delete()
+                self._prune_places()
+                self._bump_data_version()
+                self._stage_typeahead(invalidate=True)
+                self._log_change(ChangeOperation.DELETE_FILE, file_name=filename)
                 self.session.commit()
+                self._mark_write()
                 logger.info(f"Successfully deleted {deleted} records for file: {filename}")
                 return True
             except Exception as e:
@@ -325,38 +1262,356 @@ class Storage:
                 raise
         return self.execute_with_retry(operation)
 
-    def add_file_data_with_batch(self, filename, batch_name, records):
-        """Add or update file data with batch information."""
+    def delete_folder(self, folder):
+        """Delete every record of a folder (batch) along with its relations and checkpoints.
+
+        When records is partitioned the folder's partition is detached and
+        dropped, which takes the same time however many records it holds.
+        """
+        def operation():
+            try:
+                self._delete_folder_rows(folder)
+                self._prune_places()
+                self._bump_data_version()
+                self._stage_typeahead(invalidate=True)
+                self._log_change(ChangeOperation.DELETE_FOLDER, file_name=folder)
+                self.session.commit()
+                self._mark_write()
+                logger.info(f"Successfully deleted folder: {folder}")
+                return True
+            except Exception as e:
+                self.session.rollback()
+                logger.error(f"Error deleting folder {folder}: {str(e)}")
+                raise
+        return self.execute_with_retry(operation)
+
+    def _delete_folder_rows(self, folder):
+        """Delete a folder's records, relations and checkpoints in the current transaction."""
+        self.session.query(RelationRecord).filter(
+            RelationRecord.record_id.in_(select(Record.id).where(Record.folder == folder))
+        ).delete(synchronize_session=False)
+        dropped = self.records_partitioned and drop_folder_partition(self.session.connection(), folder)
+        if not dropped:
+            self.session.query(Record).filter(Record.folder == folder).delete(synchronize_session=False)
+        self.session.query(File).filter(File.folder == folder).delete(synchronize_session=False)
+        self.session.query(IngestCheckpoint).filter(
+            IngestCheckpoint.file_name.like(folder_prefix(folder), escape='\\')
+        ).delete(synchronize_session=False)
+
+    def snapshot_folder(self, folder, directory):
+        """Dump a folder's records and relations into a new snapshot directory. Returns the manifest.
+
+        Everything is read in one read-only transaction, so the data files
+        and the checksum describe the same state even while others write.
+        """
+        dialect = self.engine.dialect.name
+        with read_snapshot(self.engine) as connection:
+            rows, checksum = snapshot.folder_checksum(connection, folder)
+            if not rows['records']:
+                raise ValueError(f"Folder {folder} has no records")
+            # Created only for a folder that can be dumped, so a failed call leaves nothing behind
+            os.makedirs(directory)
+            for table, query in snapshot.snapshot_queries(folder).items():
+                snapshot.dump_table(connection, query, os.path.join(directory, snapshot.data_file(table, dialect)))
+            schema_version = connection.execute(text("SELECT MAX(version) FROM schema_version")).scalar()
+
+        manifest = {
+            'folder': folder,
+            'dialect': dialect,
+            'schema_version': schema_version,
+            'created_at': datetime.utcnow().isoformat(),
+            'rows': rows,
+            'checksum': checksum
+        }
+        snapshot.write_manifest(directory, manifest)
+        logger.info(f"Snapshot of {folder}: {rows['records']} records, {rows['relation_records']} relations")
+        return manifest
+
+    def restore_folder(self, directory, folder=None, replace=False):
+        """Restore a snapshot directory as folder (the snapshot's own folder by default). Returns the manifest.
+
+        Rows are bulk loaded into temporary staging tables and inserted
+        with new ids, relations following their records by position. The
+        restored folder's row counts and checksum must match the manifest,
+        otherwise the whole restore is rolled back. An existing folder is
+        an error unless replace is set, in which case it is deleted in the
+        same transaction.
+        """
+        manifest = snapshot.read_manifest(directory)
+        dialect = self.engine.dialect.name
+        if manifest['dialect'] != dialect:
+            raise ValueError(f"Snapshot is from {manifest['dialect']}, this database is {dialect}")
+        source = manifest['folder']
+        folder = folder or source
+        columns = snapshot.SNAPSHOT_COLUMNS
+
         def operation():
             try:
-                full_filename = f"{batch_name}/{filename}"
-                batch_size = 100
-                for i in range(0, len(records), batch_size):
-                    batch = records[i:i + batch_size]
+                schema_version = self.session.execute(text("SELECT MAX(version) FROM schema_version")).scalar()
+                if schema_version != manifest['schema_version']:
+                    raise ValueError(f"Snapshot is at schema version {manifest['schema_version']}, "
+                                     f"this database is at {schema_version}")
+                if self.session.query(Record.id).filter(Record.folder == folder).first():
+                    if not replace:
+                        raise ValueError(f"Folder {folder} already exists")
+                    self._delete_folder_rows(folder)
+                if self.records_partitioned:
+                    ensure_folder_partition(self.session.connection(), folder)
+
+                connection = self.session.connection()
+                for table, table_columns in columns.items():
+                    # Left behind on this connection if an earlier restore failed before its first write on SQLite
+                    connection.execute(text(f"DROP TABLE IF EXISTS snapshot_{table}"))
+                    connection.execute(text(
+                        f"CREATE TEMP TABLE snapshot_{table} AS "
+                        f"SELECT {snapshot.column_list(table_columns)} FROM {table}_view WHERE 1 = 0"
+                    ))
+                    snapshot.load_table(connection, f"snapshot_{table}", table_columns,
+                                        os.path.join(directory, snapshot.data_file(table, dialect)))
+
+                # Snapshots hold dictionary-encoded fields as text: add missing values, then join for the ids
+                dictionary_joins = ''
+                for field, (id_column, model) in DICTIONARY_FIELDS.items():
+                    dictionary = model.__tablename__
+                    for table in columns:
+                        connection.execute(text(f"""
+                            INSERT INTO {dictionary} (value)
+                            SELECT DISTINCT "{field}" FROM snapshot_{table} WHERE "{field}" IS NOT NULL
+                            ON CONFLICT DO NOTHING
+                        """))
+                    dictionary_joins += f' LEFT JOIN {dictionary} {id_column} ON {id_column}.value = r."{field}"'
+
+                def encoded(table_columns):
+                    """Target columns and values selected from staging alias r, with ids for dictionary fields."""
+                    targets = ', '.join(f'"{DICTIONARY_FIELDS[column][0] if column in DICTIONARY_FIELDS else column}"'
+                                        for column in table_columns)
+                    values = ', '.join(f'{DICTIONARY_FIELDS[column][0]}.id' if column in DICTIONARY_FIELDS
+                                       else f'r."{column}"' for column in table_columns)
+                    return targets, values
+
+                # file_name keeps its part after the folder; ids come from the sequence, in snapshot order
+                targets, values = encoded(columns['records'][2:])
+                connection.execute(text(f"""
+                    INSERT INTO records (folder, file_name, {targets}, sample_bucket)
+                    SELECT :folder, :folder || substr(r.file_name, :suffix), {values}, {random_bucket_sql(dialect)}
+                    FROM snapshot_records r{dictionary_joins} ORDER BY r.id
+                """), {'folder': folder, 'suffix': len(source) + 1})
+                targets, values = encoded(columns['relation_records'][1:-1])
+                connection.execute(text(f"""
+                    INSERT INTO relation_records (record_id, folder, {targets}, file_name)
+                    SELECT restored.id, :folder, {values}, :folder || substr(r.file_name, :suffix)
+                    FROM snapshot_relation_records r{dictionary_joins}
+                    JOIN (SELECT id, ROW_NUMBER() OVER (ORDER BY id) AS position FROM snapshot_records) original
+                    ON original.id = r.record_id
+                    JOIN (SELECT id, ROW_NUMBER() OVER (ORDER BY id) AS position FROM records WHERE folder = :folder) restored
+                    ON restored.position = original.position
+                """), {'folder': folder, 'suffix': len(source) + 1})
+                for table in columns:
+                    connection.execute(text(f"DROP TABLE snapshot_{table}"))
+
+                rows, checksum = snapshot.folder_checksum(connection, folder)
+                if rows != manifest['rows'] or checksum != manifest['checksum']:
+                    raise ValueError(f"Restored folder does not match the snapshot: {rows} rows, checksum {checksum}; "
+                                     f"expected {manifest['rows']} rows, checksum {manifest['checksum']}")
+
+                # Restored files count as completely loaded, so a resumed bulk load skips them
+                file_counts = self.session.execute(
+                    select(Record.file_name, func.count()).where(Record.folder == folder).group_by(Record.file_name)
+                ).all()
+                for file_name, count in file_counts:
+                    self._count_file_records(file_name, count)
+                    self._checkpoint_query(file_name).delete(synchronize_session=False)
+                    self.session.add(IngestCheckpoint(file_name=file_name, records_committed=count, completed=True))
+                    self._add_places(file_name)
+                self._prune_places()
+                self._bump_data_version()
+                self._stage_typeahead(invalidate=True)
+                for file_name, _ in file_counts:
+                    self._log_change(ChangeOperation.LOAD_FILE, file_name=file_name)
+                self.session.commit()
+                self._mark_write()
+                logger.info(f"Restored {rows['records']} records and {rows['relation_records']} relations into {folder}")
+                return dict(manifest, folder=folder)
+            except Exception as e:
+                self.session.rollback()
+                logger.error(f"Error restoring snapshot {directory}: {str(e)}")
+                raise
+        return self.execute_with_retry(operation)
+
+    def add_file_data_with_batch(self, filename, batch_name, records, progress_callback=None, job_id=None,
+                                 job_owner=None):
+        """Add or update file data with batch information.
+
+        records may be a list or any re-iterable such as TextFileRecords, so
+        very large files are streamed rather than held in memory.
+
+        progress_callback, if given, is called with the number of records
+        committed so far after every batch. job_id is the ingest job running
+        the load, if any, and job_owner the process that claimed it; see
+        _load_with_checkpoint. Returns the number of records committed.
+        """
+        full_filename = f"{batch_name}/{filename}"
+
+        def batches(skip):
+            iterator = iter(records)
+            # Skip the records committed by an earlier attempt
+            for _ in itertools.islice(iterator, skip):
+                pass
+            while True:
+                batch = list(itertools.islice(iterator, INGEST_BATCH_SIZE))
+                if not batch:
+                    break
+                yield [self._record_row(full_filename, record) for record in batch]
+
+        return self._load_with_checkpoint(full_filename, batches, progress_callback, job_id, job_owner)
+
+    def add_file_frames_with_batch(self, filename, batch_name, frames, progress_callback=None, job_id=None,
+                                   job_owner=None):
+        """Add file data from DataFrames of parsed records, such as TextFileFrames.
+
+        Behaves like add_file_data_with_batch, but takes whole DataFrames from
+        the vectorized parser instead of one dictionary per record.
+        """
+        full_filename = f"{batch_name}/{filename}"
+
+        def batches(skip):
+            for frame in frames:
+                # Skip the records committed by an earlier attempt
+                if skip >= len(frame):
+                    skip -= len(frame)
+                    continue
+                rows = self._frame_rows(full_filename, frame.iloc[skip:])
+                skip = 0
+                for i in range(0, len(rows), INGEST_BATCH_SIZE):
+                    yield rows[i:i + INGEST_BATCH_SIZE]
+
+        return self._load_with_checkpoint(full_filename, batches, progress_callback, job_id, job_owner)
+
+    def _checkpoint_query(self, full_filename, job_id=None):
+        """Query for the checkpoint of job_id's load, or of the last load of full_filename run without a job."""
+        query = self.session.query(IngestCheckpoint)
+        if job_id is not None:
+            return query.filter(IngestCheckpoint.job_id == job_id)
+        return query.filter(IngestCheckpoint.file_name == full_filename, IngestCheckpoint.job_id.is_(None))
+
+    def _load_with_checkpoint(self, full_filename, batches, progress_callback=None, job_id=None, job_owner=None):
+        """Bulk insert batches of record rows, committing a checkpoint with each batch. Returns the records committed.
+
+        batches is called with the number of records already committed and
+        must yield lists of Record column values for the remaining records.
+        If the load is retried or restarted before it completes, it resumes
+        after the last committed batch instead of inserting the earlier
+        batches again.
+
+        With job_id, the checkpoint belongs to that ingest job, which is
+        marked completed in the transaction that completes the checkpoint.
+        A requeued job whose load already completed only gets its status
+        set. A load that committed no records leaves the job's status to
+        the caller. Without job_id, a new load of a completely loaded file
+        starts over.
+
+        With job_owner, every transaction first checks that the job is still
+        claimed by job_owner and renews its heartbeat, and raises
+        IngestJobClaimLost if another process took it over, so two processes
+        never both commit batches of one job.
+        """
+        def operation():
+            try:
+                checkpoint = self._checkpoint_query(full_filename, job_id).first()
+                if checkpoint is None:
+                    checkpoint = IngestCheckpoint(job_id=job_id, file_name=full_filename, records_committed=0)
+                    self.session.add(checkpoint)
+                elif checkpoint.completed and job_id is not None:
+                    # The job loaded everything but stopped before its status was saved
+                    logger.info(f"Ingest job {job_id} already loaded {full_filename}")
+                    self._renew_ingest_claim(job_id, job_owner)
+                    if checkpoint.records_committed:
+                        self._complete_ingest_job(job_id, checkpoint.records_committed)
+                    self.session.commit()
+                    return checkpoint.records_committed
+                elif checkpoint.completed:
+                    # A finished load of the same file: this is a new upload
+                    checkpoint.records_committed = 0
+                    checkpoint.completed = False
+                elif checkpoint.records_committed:
+                    logger.info(f"Resuming {full_filename} after {checkpoint.records_committed} committed records")
+
+                folder = folder_of(full_filename)
+                if self.records_partitioned and folder:
+                    ensure_folder_partition(self.session.connection(), folder)
+
+                for rows in batches(checkpoint.records_committed):
                     try:
-                        for record in batch:
-                            db_record = Record(
-                                file_name=full_filename,
-                                ক্রমিক_নং=record.get('ক্রমিক_নং', ''),
-                                নাম=record.get('নাম', ''),
-                                ভোটার_নং=record.get('ভোটার_নং', ''),
-                                পিতার_নাম=record.get('পিতার_নাম', ''),
-                                মাতার_নাম=record.get('মাতার_নাম', ''),
-                                পেশা=record.get('পেশা', ''),
-                                জন্ম_তারিখ=record.get('জন্ম_তারিখ', ''),
-                                ঠিকানা=record.get('ঠিকানা', '')
-                            )
-                            self.session.add(db_record)
+                        self._renew_ingest_claim(job_id, job_owner)
+                        self.session.execute(insert(Record), self._encode_rows(rows))
+                        self._count_file_records(full_filename, len(rows))
+                        checkpoint.records_committed += len(rows)
+                        self._bump_data_version()
+                        self._stage_typeahead(added=rows)
                         self.session.commit()
+                        self._mark_write()
+                        if progress_callback:
+                            progress_callback(checkpoint.records_committed)
                     except Exception as e:
                         self.session.rollback()
                         logger.error(f"Error adding batch: {str(e)}")
                         raise
+
+                self._renew_ingest_claim(job_id, job_owner)
+                checkpoint.completed = True
+                if job_id is not None and checkpoint.records_committed:
+                    self._complete_ingest_job(job_id, checkpoint.records_committed)
+                self._add_places(full_filename)
+                self._bump_data_version()
+                self._log_change(ChangeOperation.LOAD_FILE, file_name=full_filename)
+                self.session.commit()
+                self._mark_write()
+                return checkpoint.records_committed
             except Exception as e:
                 self.session.rollback()
-                logger.error(f"Error in add_file_data_with_batch: {str(e)}")
+                logger.error(f"Error loading {full_filename}: {str(e)}")
                 raise
-        self.execute_with_retry(operation)
+        return self.execute_with_retry(operation)
+
+    def _renew_ingest_claim(self, job_id, job_owner):
+        """Renew the heartbeat of a claimed ingest job in the current transaction, or raise IngestJobClaimLost.
+
+        The row lock taken here is held until the transaction commits, so a
+        takeover waits for it and then sees the new heartbeat.
+        """
+        if job_owner is None:
+            return
+        renewed = self.session.query(IngestJob).filter_by(
+            id=job_id, owner=job_owner, status=IngestJobStatus.RUNNING
+        ).update({'heartbeat_at': datetime.utcnow()}, synchronize_session=False)
+        if not renewed:
+            raise IngestJobClaimLost(f"Ingest job {job_id} was taken over by another process")
+
+    def _complete_ingest_job(self, job_id, records_committed):
+        """Mark an ingest job completed in the current transaction."""
+        self.session.query(IngestJob).filter_by(id=job_id).update({
+            'status': IngestJobStatus.COMPLETED,
+            'rows_written': records_committed,
+            'finished_at': datetime.utcnow()
+        })
+
+    def get_ingest_checkpoint(self, full_filename, job_id=None):
+        """Get the load checkpoint of an ingest job, or of a batch/file name loaded without one.
+
+        Returns None if there is no such load.
+        """
+        def operation():
+            checkpoint = self._checkpoint_query(full_filename, job_id).populate_existing().first()
+            if not checkpoint:
+                return None
+            return {
+                'file_name': checkpoint.file_name,
+                'job_id': checkpoint.job_id,
+                'records_committed': checkpoint.records_committed,
+                'completed': checkpoint.completed,
+                'updated_at': checkpoint.updated_at
+            }
+        return self.execute_with_retry(operation)
 
     def delete_all_records(self):
         """Delete all records from the database."""
@@ -366,7 +1621,14 @@ class Storage:
                 self.session.query(RelationRecord).delete()
                 # Then delete all main records
                 self.session.query(Record).delete()
+                self.session.query(File).delete()
+                self.session.query(IngestCheckpoint).delete()
+                self.session.query(Place).delete()
+                self._bump_data_version()
+                self._stage_typeahead(invalidate=True)
+                self._log_change(ChangeOperation.DELETE_ALL)
                 self.session.commit()
+                self._mark_write()
                 logger.info("Successfully deleted all records from the database")
                 return True
             except Exception as e:
@@ -375,30 +1637,431 @@ class Storage:
                 raise
         self.execute_with_retry(operation)
 
-    def get_occupation_stats(self, folder=None):
-        """Get occupation statistics efficiently using SQL."""
+    def get_changes_since(self, version=0, limit=CHANGE_PAGE_SIZE):
+        """Get the changes made after a change log version, oldest first.
+
+        Returns a page of at most limit changes and the version to pass in
+        the next call. Consumers keep calling until has_more is False, then
+        store version for the next sync. Record-level changes carry the
+        record as it is after the change; load_file and the bulk deletes
+        only name the file or folder, whose records can be re-read with
+        get_file_data.
+        """
+        limit = min(limit, CHANGE_PAGE_SIZE)
+
+        def operation():
+            session = self._reader()
+            entries = (session.query(ChangeLogEntry)
+                       .filter(ChangeLogEntry.version > version)
+                       .order_by(ChangeLogEntry.version)
+                       .limit(limit + 1)
+                       .all())
+            has_more = len(entries) > limit
+            entries = entries[:limit]
+            return {
+                'changes': [{
+                    'version': entry.version,
+                    'operation': entry.operation.value,
+                    'record_id': entry.record_id,
+                    'file_name': entry.file_name,
+                    'data': json.loads(entry.data) if entry.data else None,
+                    'changed_at': entry.changed_at
+                } for entry in entries],
+                'version': entries[-1].version if entries else version,
+                'has_more': has_more
+            }
+        return self.execute_with_retry(operation)
+
+    def get_change_log_version(self):
+        """Latest change log version, the starting point for a consumer after a full copy."""
         def operation():
-            query = """
-                SELECT পেশা, COUNT(*) as count
+            session = self._reader()
+            return session.execute(select(func.max(ChangeLogEntry.version))).scalar() or 0
+        return self.execute_with_retry(operation)
+
+    def _cached_aggregate(self, cache_key, compute, size=estimate_size, wait=True):
+        """Result of compute(connection), cached in analytics_cache until the next write bumps the data version.
+
+        With wait=False a result that is not cached is computed in a
+        background thread on its own connection, and None is returned until
+        it is ready, so a page can show an estimate instead of waiting on a
+        full scan.
+        """
+        def operation():
+            session = self._reader()
+            version = self.get_data_version(session)
+            result = analytics_cache.get(cache_key, version)
+            if result is None and wait:
+                result = compute(session.connection())
+                analytics_cache.put(cache_key, version, result, size(result))
+            return result
+        result = self.execute_with_retry(operation)
+        if result is None and not wait:
+            self._compute_in_background(cache_key, compute, size)
+        return result
+
+    def _compute_in_background(self, cache_key, compute, size):
+        with background_lock:
+            if cache_key in background_aggregates:
+                return
+            background_aggregates.add(cache_key)
+
+        def run():
+            try:
+                with self.read_engine.connect() as connection:
+                    # Read first: a write while computing leaves the result cached under a version already gone
+                    version = connection.execute(select(DataVersion.version).where(DataVersion.id == 1)).scalar() or 0
+                    result = compute(connection)
+                analytics_cache.put(cache_key, version, result, size(result))
+            except Exception as e:
+                logger.error(f"Error computing {cache_key[0]} in the background: {str(e)}")
+            finally:
+                with background_lock:
+                    background_aggregates.discard(cache_key)
+
+        threading.Thread(target=run, daemon=True).start()
+
+    @staticmethod
+    def _estimate(sample_count):
+        """Estimated count and its 95% margin, from the count in the ESTIMATE_SAMPLE_BUCKETS sample."""
+        fraction = min(1.0, ESTIMATE_SAMPLE_BUCKETS / SAMPLE_BUCKETS)
+        # Each record is in the sample with probability fraction, so the sample count is binomial
+        margin = ESTIMATE_Z * math.sqrt(max(sample_count, 1) * (1 - fraction)) / fraction
+        return round(sample_count / fraction), round(margin)
+
+    def get_occupation_stats(self, folder=None, wait=True):
+        """Get occupation statistics efficiently using SQL.
+
+        Cached until the next write. With wait=False, returns None while the
+        result is computed in the background; see estimate_occupation_stats.
+        """
+        params = {}
+        folder_condition = ""
+        if folder and folder != 'সকল':
+            folder_condition = "AND folder = :folder"
+            params['folder'] = folder
+        # Grouped by the integer id, decoding only the one row per occupation
+        query = f"""
+            SELECT o.value, c.count
+            FROM (
+                SELECT occupation_id, COUNT(*) as count
                 FROM records
-                WHERE পেশা IS NOT NULL AND পেশা != ''
-                AND (CASE WHEN :folder != 'সকল' THEN 
-                    SPLIT_PART(file_name, '/', 1) = :folder
-                    ELSE TRUE END)
-                GROUP BY পেশা
-                ORDER BY count DESC
+                WHERE occupation_id IS NOT NULL
+                {folder_condition}
+                GROUP BY occupation_id
+            ) c
+            JOIN occupations o ON o.id = c.occupation_id
+            WHERE o.value != ''
+            ORDER BY c.count DESC
+        """
+
+        def compute(connection):
+            return [(row[0], row[1]) for row in connection.execute(text(query), params)]
+        return self._cached_aggregate(('occupations', params.get('folder')), compute, wait=wait)
+
+    def estimate_occupation_stats(self, folder=None):
+        """Estimated occupation statistics from the sample buckets: [(occupation, count, margin)].
+
+        margin is the half-width of a 95% confidence interval. Answered from
+        the ix_records_sample index, reading about ESTIMATE_SAMPLE_BUCKETS
+        percent of it, so it costs the same however large the folder is.
+        """
+        def operation():
+            session = self._reader()
+            params = {'buckets': list(range(ESTIMATE_SAMPLE_BUCKETS))}
+            folder_condition = ""
+            if folder and folder != 'সকল':
+                folder_condition = "AND folder = :folder"
+                params['folder'] = folder
+            query = f"""
+                SELECT o.value, c.count
+                FROM (
+                    SELECT occupation_id, COUNT(*) as count
+                    FROM records
+                    WHERE sample_bucket IN :buckets AND occupation_id IS NOT NULL
+                    {folder_condition}
+                    GROUP BY occupation_id
+                ) c
+                JOIN occupations o ON o.id = c.occupation_id
+                WHERE o.value != ''
+                ORDER BY c.count DESC
             """
-            result = self.session.execute(text(query), {'folder': folder})
-            return [(row[0], row[1]) for row in result]
+            # An IN list rather than a range, which SQLite would not plan on ix_records_sample without statistics
+            statement = text(query).bindparams(bindparam('buckets', expanding=True))
+            return [(row[0], *self._estimate(row[1])) for row in session.execute(statement, params)]
+        return self.execute_with_retry(operation)
+
+    def get_total_records_count(self, wait=True):
+        """Get total count of records efficiently using SQL COUNT.
+
+        Cached until the next write. With wait=False, returns None while the
+        count is computed in the background; see estimate_total_records_count.
+        """
+        try:
+            return self._cached_aggregate(
+                ('total',),
+                lambda connection: connection.execute(text("SELECT COUNT(*) FROM records")).scalar(),
+                size=sys.getsizeof,
+                wait=wait
+            )
+        except Exception as e:
+            logger.error(f"Error getting total records count: {str(e)}")
+            return 0
+
+    def estimate_total_records_count(self):
+        """Estimated total count of records and its 95% margin, from the sample buckets."""
+        def operation():
+            session = self._reader()
+            sample_count = session.execute(
+                text("SELECT COUNT(*) FROM records WHERE sample_bucket IN :buckets")
+                .bindparams(bindparam('buckets', expanding=True)),
+                {'buckets': list(range(ESTIMATE_SAMPLE_BUCKETS))}
+            ).scalar()
+            return self._estimate(sample_count)
+        return self.execute_with_retry(operation)
+
+    def get_records_by_birth_date(self, start=None, end=None, folder=None, columnar=False):
+        """Get records born between start and end (inclusive), optionally filtered by folder."""
+        def operation():
+            session = self._reader()
+            statement = self._record_select().where(Record.birth_date.isnot(None))
+            if start:
+                statement = statement.where(Record.birth_date >= start)
+            if end:
+                statement = statement.where(Record.birth_date <= end)
+            if folder and folder != "সকল":
+                statement = statement.where(Record.folder == folder)
+            rows = session.execute(statement.order_by(Record.birth_date)).all()
+            return self._record_results(rows, columnar)
+        return self.execute_with_retry(operation)
+
+    def get_age_band_stats(self, folder=None, band_width=10, max_age=100):
+        """Get record counts per age band computed in SQL from the indexed birth_date column."""
+        def operation():
+            session = self._reader()
+            band_case, params, labels = self._age_band_case(band_width, max_age)
+            folder_condition = ""
+            if folder and folder != 'সকল':
+                folder_condition = "AND folder = :folder"
+                params['folder'] = folder
+            query = f"""
+                SELECT {band_case} AS band, COUNT(*) as count
+                FROM records
+                WHERE birth_date IS NOT NULL AND birth_date <= :today
+                {folder_condition}
+                GROUP BY band
+                ORDER BY band
+            """
+            # Typed so dates bind the same way as the birth_date column on every backend
+            statement = text(query).bindparams(*(bindparam(name, type_=Date) for name in params if name != 'folder'))
+            result = session.execute(statement, params)
+            return [(labels[band], count) for band, count in result]
+        return self.execute_with_retry(operation)
+
+    def _age_band_case(self, band_width, max_age):
+        """SQL CASE mapping birth_date to an age band index, its date parameters and the band labels.
+
+        Band i holds ages [i * band_width, (i + 1) * band_width); anything
+        older falls in the last band. Missing and future dates map to NULL.
+        """
+        today = date.today()
+        bands = list(range(0, max_age, band_width))
+        params = {'today': today}
+        cases = ["WHEN birth_date IS NULL OR birth_date > :today THEN NULL"]
+        for i, lower in enumerate(bands):
+            params[f'cutoff_{i}'] = self._years_before(today, lower + band_width)
+            cases.append(f"WHEN birth_date > :cutoff_{i} THEN {i}")
+        labels = [f"{lower}-{lower + band_width - 1}" for lower in bands] + [f"{max_age}+"]
+        return f"CASE {' '.join(cases)} ELSE {len(bands)} END", params, labels
+
+    def get_analytics_cube(self, band_width=10, max_age=100, wait=True):
+        """Get record counts by folder, file, occupation and age band in one query.
+
+        Returns {'rows': [(folder, file_name, occupation, age_band, count)],
+        'age_bands': labels in age order}. Only the finest grain is counted in
+        the database; every coarser breakdown is a sum over these rows, so
+        callers pivot and drill down without further queries. age_band is
+        None where the birth date did not parse. The result is cached until
+        the next write bumps the data version. With wait=False, returns None
+        while the cube is computed in the background.
+        """
+        band_case, params, labels = self._age_band_case(band_width, max_age)
+        query = f"""
+            SELECT c.folder, c.file_name, o.value, c.band, c.count
+            FROM (
+                SELECT folder, file_name, occupation_id, {band_case} AS band, COUNT(*) as count
+                FROM records
+                GROUP BY folder, file_name, occupation_id, band
+            ) c
+            LEFT JOIN occupations o ON o.id = c.occupation_id
+        """
+        statement = text(query).bindparams(*(bindparam(name, type_=Date) for name in params))
+
+        def compute(connection):
+            rows = [
+                (folder, file_name, occupation, labels[band] if band is not None else None, count)
+                for folder, file_name, occupation, band, count in connection.execute(statement, params)
+            ]
+            return {'rows': rows, 'age_bands': labels}
+        return self._cached_aggregate(('cube', band_width, max_age, date.today()), compute,
+                                      size=lambda cube: estimate_size(cube['rows']), wait=wait)
+
+    @staticmethod
+    def _years_before(day, years):
+        """Return the date the given number of years before day, clamping 29 February."""
+        try:
+            return day.replace(year=day.year - years)
+        except ValueError:
+            return day.replace(year=day.year - years, day=28)
+
+    def create_ingest_job(self, batch_name, file_name, spool_path, owner=None):
+        """Record a queued ingest job for a spooled upload and return its ID.
+
+        owner is the process that will run the job; a job without one can be
+        claimed by any process.
+        """
+        def operation():
+            try:
+                job = IngestJob(
+                    batch_name=batch_name,
+                    file_name=file_name,
+                    spool_path=spool_path,
+                    status=IngestJobStatus.QUEUED,
+                    owner=owner,
+                    heartbeat_at=datetime.utcnow() if owner else None
+                )
+                self.session.add(job)
+                self.session.commit()
+                return job.id
+            except Exception as e:
+                self.session.rollback()
+                logger.error(f"Error creating ingest job for {batch_name}/{file_name}: {str(e)}")
+                raise
+        return self.execute_with_retry(operation)
+
+    def update_ingest_job(self, job_id, **fields):
+        """Update progress or status fields of an ingest job."""
+        def operation():
+            try:
+                self.session.query(IngestJob).filter_by(id=job_id).update(fields)
+                self.session.commit()
+            except Exception as e:
+                self.session.rollback()
+                logger.error(f"Error updating ingest job {job_id}: {str(e)}")
+                raise
+        self.execute_with_retry(operation)
+
+    @staticmethod
+    def _ingest_job_is_stale():
+        """Condition for queued or running jobs whose owner stopped sending heartbeats."""
+        stale_before = datetime.utcnow() - timedelta(seconds=INGEST_JOB_STALE_SECONDS)
+        return and_(
+            IngestJob.status.in_([IngestJobStatus.QUEUED, IngestJobStatus.RUNNING]),
+            or_(IngestJob.heartbeat_at.is_(None), IngestJob.heartbeat_at < stale_before)
+        )
+
+    def claim_ingest_job(self, job_id, owner):
+        """Mark an ingest job running for owner if it is queued for owner or stale. Returns True if claimed.
+
+        A single conditional UPDATE, so of two processes claiming the same
+        job only one succeeds.
+        """
+        def operation():
+            try:
+                now = datetime.utcnow()
+                claimed = self.session.query(IngestJob).filter(
+                    IngestJob.id == job_id,
+                    or_(
+                        and_(IngestJob.status == IngestJobStatus.QUEUED, IngestJob.owner == owner),
+                        self._ingest_job_is_stale()
+                    )
+                ).update({
+                    'status': IngestJobStatus.RUNNING,
+                    'owner': owner,
+                    'heartbeat_at': now,
+                    'started_at': now,
+                    'error': None
+                }, synchronize_session=False)
+                self.session.commit()
+                return claimed == 1
+            except Exception as e:
+                self.session.rollback()
+                logger.error(f"Error claiming ingest job {job_id}: {str(e)}")
+                raise
         return self.execute_with_retry(operation)
 
-    def get_total_records_count(self):
-        """Get total count of records efficiently using SQL COUNT."""
+    def fail_stale_ingest_job(self, job_id, error):
+        """Mark an ingest job failed if it is still stale. Returns True if it was."""
         def operation():
             try:
-                result = self.session.execute(text("SELECT COUNT(*) FROM records"))
-                return result.scalar()
+                failed = self.session.query(IngestJob).filter(
+                    IngestJob.id == job_id, self._ingest_job_is_stale()
+                ).update({
+                    'status': IngestJobStatus.FAILED,
+                    'error': error,
+                    'finished_at': datetime.utcnow()
+                }, synchronize_session=False)
+                self.session.commit()
+                return failed == 1
             except Exception as e:
-                logger.error(f"Error getting total records count: {str(e)}")
-                return 0
-        return self.execute_with_retry(operation)
\ No newline at end of file
+                self.session.rollback()
+                logger.error(f"Error failing ingest job {job_id}: {str(e)}")
+                raise
+        return self.execute_with_retry(operation)
+
+    def heartbeat_ingest_jobs(self, owner):
+        """Renew the heartbeat of every queued or running ingest job of owner."""
+        def operation():
+            try:
+                self.session.query(IngestJob).filter(
+                    IngestJob.owner == owner,
+                    IngestJob.status.in_([IngestJobStatus.QUEUED, IngestJobStatus.RUNNING])
+                ).update({'heartbeat_at': datetime.utcnow()}, synchronize_session=False)
+                self.session.commit()
+            except Exception as e:
+                self.session.rollback()
+                logger.error(f"Error renewing ingest job heartbeats: {str(e)}")
+                raise
+        self.execute_with_retry(operation)
+
+    def get_ingest_jobs(self, status=None, limit=50):
+        """Get the most recent ingest jobs, optionally filtered by status."""
+        def operation():
+            # Progress is polled, so always overwrite previously loaded values
+            query = self.session.query(IngestJob).populate_existing()
+            if status:
+                query = query.filter(IngestJob.status.in_(status if isinstance(status, (list, tuple)) else [status]))
+            jobs = query.order_by(IngestJob.id.desc()).limit(limit).all()
+            return [self._ingest_job_to_dict(job) for job in jobs]
+        return self.execute_with_retry(operation)
+
+    def get_ingest_job(self, job_id):
+        """Get a single ingest job by ID."""
+        def operation():
+            job = self.session.query(IngestJob).populate_existing().filter_by(id=job_id).first()
+            return self._ingest_job_to_dict(job) if job else None
+        return self.execute_with_retry(operation)
+
+    def _ingest_job_to_dict(self, job):
+        """Convert IngestJob object to dictionary with derived throughput."""
+        rows_per_sec = 0.0
+        if job.started_at:
+            elapsed = ((job.finished_at or datetime.utcnow()) - job.started_at).total_seconds()
+            if elapsed > 0:
+                rows_per_sec = job.rows_written / elapsed
+        return {
+            'id': job.id,
+            'batch_name': job.batch_name,
+            'file_name': job.file_name,
+            'spool_path': job.spool_path,
+            'status': job.status.value,
+            'rows_parsed': job.rows_parsed,
+            'rows_written': job.rows_written,
+            'rows_per_sec': rows_per_sec,
+            'error': job.error,
+            'created_at': job.created_at,
+            'started_at': job.started_at,
+            'finished_at': job.finished_at,
+            'owner': job.owner,
+            'heartbeat_at': job.heartbeat_at
+        }
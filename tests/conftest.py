@@ -0,0 +1,123 @@
+"""Shared fixtures: a Storage on a fresh, migrated database for every test.
+
+Tests run against SQLite files in a temporary directory. To run every
+Storage test against Postgres as well, point TEST_POSTGRES_URL at a
+server whose user may create databases; each test gets its own database,
+dropped afterwards:
+
+    TEST_POSTGRES_URL=postgresql+psycopg2://postgres@localhost/postgres python -m pytest
+"""
+import logging
+import os
+import sqlite3
+import uuid
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import make_url
+
+POSTGRES_URL = os.getenv("TEST_POSTGRES_URL")
+
+BACKENDS = [
+    'sqlite',
+    pytest.param('postgresql', marks=pytest.mark.skipif(not POSTGRES_URL, reason="TEST_POSTGRES_URL is not set"))
+]
+
+# Per-record skip warnings from the sample files are expected
+logging.getLogger('data_processor').setLevel(logging.ERROR)
+
+def reset_process_state():
+    """Forget process-wide caches keyed by data version or value, which would leak between test databases."""
+    import storage
+    from typeahead import TypeaheadIndex
+    storage.search_cache.clear()
+    storage.analytics_cache.clear()
+    storage.typeahead_index = TypeaheadIndex()
+    for ids in storage.dictionary_ids.values():
+        ids.clear()
+
+def drop_connection(dbapi_connection):
+    """Break a pooled connection the way a restarted server or a network drop would, without telling SQLAlchemy."""
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        dbapi_connection.close()
+        return
+    admin = create_engine(POSTGRES_URL, isolation_level="AUTOCOMMIT")
+    with admin.connect() as connection:
+        connection.execute(text("SELECT pg_terminate_backend(:pid)"), {'pid': dbapi_connection.get_backend_pid()})
+    admin.dispose()
+
+def dispose_engines(url):
+    import storage
+    for key in [key for key in storage._engines if key[0] == url]:
+        storage._engines.pop(key).dispose()
+
+@pytest.fixture(params=BACKENDS)
+def backend(request):
+    return request.param
+
+@pytest.fixture
+def new_database(backend, tmp_path):
+    """Factory for empty databases of the test's backend, returning their URLs."""
+    created = []
+
+    def create(name='test'):
+        if backend == 'sqlite':
+            url = f"sqlite:///{tmp_path / name}.db"
+        else:
+            database = f"voterdata_test_{uuid.uuid4().hex[:12]}"
+            admin = create_engine(POSTGRES_URL, isolation_level="AUTOCOMMIT")
+            with admin.connect() as connection:
+                connection.execute(text(f'CREATE DATABASE "{database}"'))
+            admin.dispose()
+            url = make_url(POSTGRES_URL).set(database=database).render_as_string(hide_password=False)
+        created.append(url)
+        return url
+
+    yield create
+
+    for url in created:
+        dispose_engines(url)
+        if backend == 'postgresql':
+            admin = create_engine(POSTGRES_URL, isolation_level="AUTOCOMMIT")
+            with admin.connect() as connection:
+                connection.execute(text(f'DROP DATABASE "{make_url(url).database}" WITH (FORCE)'))
+            admin.dispose()
+
+@pytest.fixture
+def database_url(new_database, monkeypatch):
+    url = new_database()
+    monkeypatch.setenv("DATABASE_URL", url)
+    monkeypatch.delenv("DATABASE_READ_URL", raising=False)
+    reset_process_state()
+    return url
+
+@pytest.fixture
+def storage(database_url):
+    from storage import Storage
+    instance = Storage()
+    yield instance
+    instance.release()
+
+@pytest.fixture
+def sample_file(tmp_path):
+    """Factory for synthetic voter list files; returns (path, number of complete records)."""
+    from bench_parser import write_sample_file
+
+    def write(count, name='sample.txt'):
+        path = str(tmp_path / name)
+        write_sample_file(path, count)
+        # write_sample_file leaves every 50th record without a voter number
+        return path, count - count // 50
+
+    return write
+
+@pytest.fixture
+def load_sample(storage, sample_file):
+    """Load a synthetic file into a folder of the storage fixture; returns the number of records loaded."""
+    from data_processor import TextFileRecords
+
+    def load(count, folder='f1', name='a.txt'):
+        path, records = sample_file(count, name)
+        storage.add_file_data_with_batch(name, folder, TextFileRecords(path))
+        return records
+
+    return load
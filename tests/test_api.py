@@ -0,0 +1,120 @@
+import gzip
+import http.client
+import json
+import threading
+from http.server import ThreadingHTTPServer
+import pytest
+import api
+from storage import RelationType
+
+TOKEN = 'test-token'
+AUTH = {'Authorization': f"Bearer {TOKEN}"}
+
+@pytest.fixture
+def server(storage, monkeypatch):
+    """The API served on a free local port, over the storage fixture's database."""
+    monkeypatch.setattr(api, 'API_TOKEN', TOKEN)
+    instance = ThreadingHTTPServer(('127.0.0.1', 0), api.ApiHandler)
+    instance.daemon_threads = True
+    thread = threading.Thread(target=instance.serve_forever, daemon=True)
+    thread.start()
+    yield instance.server_address[1]
+    instance.shutdown()
+    instance.server_close()
+
+@pytest.fixture
+def client(server):
+    """One keep-alive connection to the API."""
+    connection = http.client.HTTPConnection('127.0.0.1', server, timeout=30)
+    yield connection
+    connection.close()
+
+def request(client, method, path, headers=AUTH, body=None):
+    client.request(method, path, body=body, headers=headers)
+    response = client.getresponse()
+    return response, response.read()
+
+def test_requests_need_the_token(client):
+    for headers in [{}, {'Authorization': 'Bearer wrong'}]:
+        response, body = request(client, 'GET', '/files', headers)
+        assert response.status == 401
+        assert json.loads(body) == {'error': "Missing or invalid API token"}
+    response, body = request(client, 'GET', '/files')
+    assert response.status == 200
+    assert json.loads(body) == {'files': []}
+
+def test_rejected_post_closes_the_connection_without_reading_its_body(server, storage, load_sample):
+    load_sample(5)
+    record_id = storage.get_records_after(0, limit=1)['records'][0]['id']
+    client = http.client.HTTPConnection('127.0.0.1', server, timeout=30)
+    try:
+        body = json.dumps({'relation_type': RelationType.FRIEND.value})
+        response, _ = request(client, 'POST', f"/records/{record_id}/relation", {}, body)
+        assert response.status == 401
+        assert response.getheader('Connection') == 'close'
+
+        # The next request goes over a new connection, not after the unread body
+        response, answer = request(client, 'POST', f"/records/{record_id}/relation", AUTH, body)
+        assert response.status == 200
+        assert json.loads(answer) == {'record_id': record_id, 'relation_type': 'friend'}
+        # A body that was read leaves the connection open for the next request
+        assert response.getheader('Connection') is None
+        response, _ = request(client, 'GET', '/files')
+        assert response.status == 200
+    finally:
+        client.close()
+    assert len(storage.get_relations_by_type(RelationType.FRIEND)) == 1
+
+def test_large_responses_are_gzipped(client, load_sample):
+    load_sample(40)
+    response, plain = request(client, 'GET', '/records?limit=40')
+    assert response.getheader('Content-Encoding') is None
+    response, compressed = request(client, 'GET', '/records?limit=40', {**AUTH, 'Accept-Encoding': 'gzip'})
+    assert response.getheader('Content-Encoding') == 'gzip'
+    assert gzip.decompress(compressed) == plain
+    assert len(compressed) < len(plain)
+
+    # Small bodies are sent as they are
+    response, body = request(client, 'GET', '/files', {**AUTH, 'Accept-Encoding': 'gzip'})
+    assert response.getheader('Content-Encoding') is None
+    assert json.loads(body) == {'files': ['f1/a.txt']}
+
+def test_records_are_paged_by_id(client, load_sample):
+    loaded = load_sample(60)
+    load_sample(20, folder='f2', name='b.txt')
+    seen = []
+    after_id = 0
+    while after_id is not None:
+        response, body = request(client, 'GET', f"/records?folder=f1&limit=25&after_id={after_id}")
+        page = json.loads(body)
+        assert len(page['records']) <= 25
+        seen.extend(record['id'] for record in page['records'])
+        assert {record['file_name'] for record in page['records']} <= {'f1/a.txt'}
+        after_id = page['next_after_id']
+    assert len(seen) == loaded
+    assert seen == sorted(set(seen))
+
+    response, body = request(client, 'GET', '/records?limit=x')
+    assert response.status == 400
+
+@pytest.mark.parametrize('encoding', [None, 'gzip'])
+def test_export_streams_every_record_in_chunks(client, storage, load_sample, monkeypatch, encoding):
+    # Several pages, so the export is written as several chunks
+    monkeypatch.setattr(api, 'MAX_PAGE_SIZE', 7)
+    loaded = load_sample(30)
+    load_sample(10, folder='f2', name='b.txt')
+    headers = {**AUTH, 'Accept-Encoding': encoding} if encoding else AUTH
+
+    response, body = request(client, 'GET', '/export?folder=f1', headers)
+    assert response.status == 200
+    assert response.getheader('Transfer-Encoding') == 'chunked'
+    assert response.getheader('Content-Encoding') == encoding
+    if encoding:
+        body = gzip.decompress(body)
+    records = [json.loads(line) for line in body.decode('utf-8').splitlines()]
+    assert records == storage.get_records_after(0, limit=1000, folder='f1')['records']
+    assert len(records) == loaded
+
+    # The connection is still usable after the final chunk
+    response, _ = request(client, 'GET', '/files')
+    assert response.status == 200
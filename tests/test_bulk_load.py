@@ -0,0 +1,40 @@
+import pytest
+from sqlalchemy import text
+import bulk_load
+import storage as storage_module
+
+@pytest.fixture
+def worker(database_url, monkeypatch):
+    """This process set up as a bulk_load worker, with small batches."""
+    monkeypatch.setattr(storage_module, 'INGEST_BATCH_SIZE', 10)
+    bulk_load.init_worker()
+    yield bulk_load._storage
+    bulk_load._storage.release()
+    bulk_load._storage = None
+
+def file_counts(storage):
+    with storage.engine.connect() as connection:
+        return dict(connection.execute(text("SELECT file_name, COUNT(*) FROM records GROUP BY file_name")).all())
+
+def test_rerun_skips_completed_files_and_resumes_partial_ones(worker, sample_file, tmp_path):
+    path, expected = sample_file(45, 'a.txt')
+    other, other_expected = sample_file(35, 'b.txt')
+
+    assert bulk_load.load_file('f1', 'a.txt', path)[0] == 'loaded'
+    # b.txt stopped after two batches
+    with pytest.raises(RuntimeError):
+        def stop(committed):
+            if committed == 20:
+                raise RuntimeError("stopped")
+        worker.add_file_data_with_batch('b.txt', 'f1', bulk_load.open_import_file(other, 'b.txt'),
+                                        progress_callback=stop)
+    assert file_counts(worker) == {'f1/a.txt': expected, 'f1/b.txt': 20}
+
+    assert bulk_load.load_file('f1', 'a.txt', path) == ('skipped', 0, 0)
+    assert bulk_load.load_file('f1', 'b.txt', other)[0] == 'loaded'
+    assert file_counts(worker) == {'f1/a.txt': expected, 'f1/b.txt': other_expected}
+
+    # Deleting a file lets it be loaded again
+    worker.delete_file_data('f1/a.txt')
+    assert bulk_load.load_file('f1', 'a.txt', path)[0] == 'loaded'
+    assert file_counts(worker) == {'f1/a.txt': expected, 'f1/b.txt': other_expected}
@@ -0,0 +1,88 @@
+import datetime
+import time
+import pytest
+import data_processor
+from data_processor import parse_birth_date, parse_address, calibrate_parser_mode
+
+class FixedDate(datetime.date):
+    @classmethod
+    def today(cls):
+        return cls(2026, 10, 19)
+
+@pytest.fixture
+def today(monkeypatch):
+    monkeypatch.setattr(data_processor, 'date', FixedDate)
+
+@pytest.mark.parametrize('value, expected', [
+    ('১২/০৩/১৯৮৫', datetime.date(1985, 3, 12)),
+    ('12-03-1985', datetime.date(1985, 3, 12)),
+    ('1985-03-12', datetime.date(1985, 3, 12)),
+    ('31/02/1985', None),
+    ('', None),
+    ('অজানা', None),
+])
+def test_parse_birth_date(value, expected):
+    assert parse_birth_date(value) == expected
+
+@pytest.mark.parametrize('value, expected', [
+    # Born in 2008 makes an 18 year old voter in 2026
+    ('০১/০১/০৮', datetime.date(2008, 1, 1)),
+    ('01/01/00', datetime.date(2000, 1, 1)),
+    # Later years in this century would make the voter a minor
+    ('01/01/09', datetime.date(1909, 1, 1)),
+    ('01/01/25', datetime.date(1925, 1, 1)),
+    ('01/01/26', datetime.date(1926, 1, 1)),
+    ('12.03.85', datetime.date(1985, 3, 12)),
+])
+def test_two_digit_years_never_make_a_minor(today, value, expected):
+    assert parse_birth_date(value) == expected
+
+def test_calibration_does_not_time_the_first_vectorized_call(monkeypatch):
+    # The first vectorized call stands in for a cold `import pandas`; afterwards it is faster than the loop
+    calls = []
+
+    def extract_records_frame(records):
+        calls.append(len(records))
+        if len(calls) == 1:
+            time.sleep(0.5)
+
+    def parse_record(record):
+        time.sleep(0.0001)
+
+    monkeypatch.setattr(data_processor, 'extract_records_frame', extract_records_frame)
+    monkeypatch.setattr(data_processor, 'parse_record', parse_record)
+    assert calibrate_parser_mode(['1. নাম: ক'] * 500) == 'vectorized'
+    assert calls == [1, 500]
+
+def address(upazila='', union_name='', post_office='', village=''):
+    return {'upazila': upazila, 'union_name': union_name, 'post_office': post_office, 'village': village}
+
+@pytest.mark.parametrize('value, expected', [
+    ('পূর্বপাড়া, ডাকঘর: কালিহাতী, উপজেলা: কালিহাতী',
+     address(upazila='কালিহাতী', post_office='কালিহাতী', village='পূর্বপাড়া')),
+    ('গ্রাম: উত্তরপাড়া, ইউনিয়ন : বল্লা, থানা:সদর', address(upazila='সদর', union_name='বল্লা', village='উত্তরপাড়া')),
+    ('পোঃ কালিহাতী\nউপজেলা: টাঙ্গাইল', address(upazila='টাঙ্গাইল', post_office='কালিহাতী')),
+    # Place names starting with a label are not labelled parts
+    ('পাড়াগাঁও', address(village='পাড়াগাঁও')),
+    ('গ্রামতলা, ডাকঘর: বল্লা', address(post_office='বল্লা', village='গ্রামতলা')),
+    ('থানাপাড়া, উপজেলা: সদর', address(upazila='সদর', village='থানাপাড়া')),
+    ('ডাকঘরপাড়া', address(village='ডাকঘরপাড়া')),
+    # A labelled village wins over an unlabelled part wherever it comes
+    ('পূর্বপাড়া, গ্রাম: বল্লা', address(village='বল্লা')),
+    ('গ্রাম: বল্লা, পূর্বপাড়া', address(village='বল্লা')),
+    ('উপজেলা: সদর, উপজেলা: কালিহাতী', address(upazila='সদর')),
+    ('', address()),
+    (None, address()),
+])
+def test_parse_address(value, expected):
+    assert parse_address(value) == expected
+
+def test_tabular_readers_must_read_rows(tmp_path):
+    with pytest.raises(TypeError):
+        data_processor.TabularFileRecords(str(tmp_path / 'a.csv'))
+
+    path = tmp_path / 'a.csv'
+    path.write_text("ক্রমিক,নাম,ভোটার নং\n1,করিম,123\n2,রহিম,\n", encoding='utf-8')
+    records = data_processor.CsvFileRecords(str(path))
+    assert list(records) == [{'ক্রমিক_নং': '1', 'নাম': 'করিম', 'ভোটার_নং': '123'}]
+    assert records.parsed == 1
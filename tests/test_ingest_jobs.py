@@ -0,0 +1,182 @@
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import event, text
+import data_processor
+import storage as storage_module
+from data_processor import open_import_file, TextFileRecords
+from storage import IngestJobStatus, IngestJobClaimLost, get_connection_stats
+from ingest_jobs import IngestWorkerPool, resume_pending_jobs
+from conftest import drop_connection
+
+class RecordingPool:
+    def __init__(self):
+        self.submitted = []
+        self.pending = set()
+
+    def submit(self, job_id):
+        self.submitted.append(job_id)
+
+def orphan(storage, job_id, status=IngestJobStatus.RUNNING):
+    """Leave a job as a process that stopped without finishing it would."""
+    storage.update_ingest_job(job_id, status=status, heartbeat_at=datetime.utcnow() - timedelta(hours=1))
+
+def test_resume_requeues_unfinished_jobs_in_order(storage, sample_file):
+    path, _ = sample_file(5)
+    first = storage.create_ingest_job('f1', 'a.txt', path)
+    second = storage.create_ingest_job('f1', 'b.txt', path)
+    storage.update_ingest_job(second, status=IngestJobStatus.RUNNING)
+    done = storage.create_ingest_job('f1', 'c.txt', path)
+    storage.update_ingest_job(done, status=IngestJobStatus.COMPLETED)
+    missing = storage.create_ingest_job('f1', 'd.txt', path + '.gone')
+    # Jobs of a live process, here or on another instance, are left to it
+    live = storage.create_ingest_job('f1', 'e.txt', path, owner='other')
+    live_elsewhere = storage.create_ingest_job('f1', 'f.txt', path + '.elsewhere', owner='other')
+    orphaned = storage.create_ingest_job('f1', 'g.txt', path, owner='stopped')
+    orphan(storage, orphaned)
+
+    pool = RecordingPool()
+    assert resume_pending_jobs(pool)
+
+    assert pool.submitted == [first, second, orphaned]
+    job = storage.get_ingest_job(missing)
+    assert job['status'] == IngestJobStatus.FAILED.value
+    assert job['error'] == "Spooled upload is missing"
+    assert [storage.get_ingest_job(job)['status'] for job in [live, live_elsewhere]] == [IngestJobStatus.QUEUED.value] * 2
+
+    # Submitted jobs are not submitted again while they wait
+    pool.pending.update(pool.submitted)
+    assert resume_pending_jobs(pool)
+    assert pool.submitted == [first, second, orphaned]
+
+def test_only_one_process_claims_a_job(storage, sample_file):
+    path, _ = sample_file(5)
+    queued = storage.create_ingest_job('f1', 'a.txt', path, owner='first')
+    # Queued by one process, the job is not another's to take
+    assert not storage.claim_ingest_job(queued, 'second')
+    assert storage.claim_ingest_job(queued, 'first')
+    assert not storage.claim_ingest_job(queued, 'second')
+    job = storage.get_ingest_job(queued)
+    assert (job['status'], job['owner']) == (IngestJobStatus.RUNNING.value, 'first')
+
+    # Once its heartbeat is stale, the first claim wins
+    orphan(storage, queued)
+    assert storage.claim_ingest_job(queued, 'second')
+    assert not storage.claim_ingest_job(queued, 'third')
+    assert storage.get_ingest_job(queued)['owner'] == 'second'
+
+    # Heartbeats keep a process's jobs from going stale
+    waiting = storage.create_ingest_job('f1', 'b.txt', path, owner='first')
+    orphan(storage, waiting, status=IngestJobStatus.QUEUED)
+    storage.heartbeat_ingest_jobs('first')
+    assert not storage.claim_ingest_job(waiting, 'second')
+    assert not storage.fail_stale_ingest_job(waiting, "Spooled upload is missing")
+
+def test_load_stops_when_its_job_is_taken_over(storage, sample_file, monkeypatch):
+    monkeypatch.setattr(storage_module, 'INGEST_BATCH_SIZE', 10)
+    path, expected = sample_file(95)
+    job_id = storage.create_ingest_job('f1', 'a.txt', path, owner='first')
+    assert storage.claim_ingest_job(job_id, 'first')
+
+    def take_over(written):
+        # The first process stalls after three batches and another takes the job over
+        if written == 30:
+            orphan(storage, job_id)
+            assert storage.claim_ingest_job(job_id, 'second')
+
+    with pytest.raises(IngestJobClaimLost):
+        storage.add_file_data_with_batch('a.txt', 'f1', TextFileRecords(path), progress_callback=take_over,
+                                         job_id=job_id, job_owner='first')
+    assert record_count(storage) == (30, 30)
+
+    assert storage.add_file_data_with_batch('a.txt', 'f1', TextFileRecords(path), job_id=job_id,
+                                            job_owner='second') == expected
+    assert record_count(storage) == (expected, expected)
+    assert storage.get_ingest_job(job_id)['status'] == IngestJobStatus.COMPLETED.value
+
+@pytest.fixture
+def lose_connection(storage, monkeypatch):
+    """Drop the connection under the Nth and later inserts into records, `times` times in a row."""
+    monkeypatch.setattr(storage_module, 'retry_delay', lambda attempt: 0)
+    monkeypatch.setattr(storage_module, 'INGEST_BATCH_SIZE', 10)
+    state = {'inserts': 0, 'fail_at': None, 'times': 0}
+
+    def before_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+        if not statement.lstrip().startswith('INSERT INTO records '):
+            return
+        state['inserts'] += 1
+        if state['fail_at'] is not None and state['inserts'] >= state['fail_at'] and state['times']:
+            state['times'] -= 1
+            drop_connection(connection.connection.dbapi_connection)
+
+    def arm(after_batches, times=1):
+        state.update(inserts=0, fail_at=after_batches + 1, times=times)
+
+    engine = storage.engine
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    yield arm
+    event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
+def record_count(storage):
+    with storage.engine.connect() as connection:
+        return connection.execute(text("SELECT COUNT(*), COUNT(DISTINCT ভোটার_নং) FROM records")).one()
+
+@pytest.fixture(params=['loop', 'vectorized'])
+def parser_mode(request, monkeypatch):
+    monkeypatch.setattr(data_processor, 'PARSER_MODE', request.param)
+    return request.param
+
+def test_load_retried_after_lost_connection_resumes_from_checkpoint(storage, sample_file, lose_connection, parser_mode):
+    path, expected = sample_file(95)
+    lose_connection(after_batches=3)
+    records = open_import_file(path, 'a.txt')
+    load = storage.add_file_frames_with_batch if records.mode == 'vectorized' else storage.add_file_data_with_batch
+
+    assert load('a.txt', 'f1', records) == expected
+    assert record_count(storage) == (expected, expected)
+    assert get_connection_stats().get('recovered')
+
+def test_restarted_job_resumes_and_requeued_completed_job_inserts_nothing(storage, sample_file, lose_connection,
+                                                                          parser_mode):
+    path, expected = sample_file(95)
+    job_id = storage.create_ingest_job('f1', 'a.txt', path)
+
+    # Every retry fails too, so the job fails after committing three batches
+    lose_connection(after_batches=3, times=storage_module.DB_RETRY_ATTEMPTS)
+    pool = IngestWorkerPool(max_workers=1)
+    try:
+        pool._run(job_id)
+        assert storage.get_ingest_job(job_id)['status'] == IngestJobStatus.FAILED.value
+        checkpoint = storage.get_ingest_checkpoint('f1/a.txt', job_id=job_id)
+        assert checkpoint['records_committed'] == 30 and not checkpoint['completed']
+        assert record_count(storage) == (30, 30)
+
+        # A restarted process requeues the job, which continues after the checkpoint
+        orphan(storage, job_id)
+        pool._run(job_id)
+        job = storage.get_ingest_job(job_id)
+        assert job['status'] == IngestJobStatus.COMPLETED.value
+        assert job['rows_written'] == expected
+        assert record_count(storage) == (expected, expected)
+        version = storage.get_data_version()
+
+        # Requeued again after completing: nothing is loaded twice
+        orphan(storage, job_id)
+        pool._run(job_id)
+        assert storage.get_ingest_job(job_id)['status'] == IngestJobStatus.COMPLETED.value
+        assert record_count(storage) == (expected, expected)
+        assert storage.get_data_version() == version
+        assert storage.get_ingest_checkpoint('f1/a.txt', job_id=job_id)['completed']
+    finally:
+        pool.executor.shutdown()
+        if hasattr(pool.local, 'storage'):
+            pool.local.storage.release()
+
+def test_new_upload_of_a_loaded_file_is_loaded_again(storage, sample_file):
+    path, expected = sample_file(20)
+    first = storage.create_ingest_job('f1', 'a.txt', path)
+    second = storage.create_ingest_job('f1', 'a.txt', path)
+    assert storage.add_file_data_with_batch('a.txt', 'f1', TextFileRecords(path), job_id=first) == expected
+    assert storage.add_file_data_with_batch('a.txt', 'f1', TextFileRecords(path), job_id=second) == expected
+    assert record_count(storage)[0] == 2 * expected
+    # Loads without a job keep their own checkpoint per file name
+    assert storage.get_ingest_checkpoint('f1/a.txt') is None
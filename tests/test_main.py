@@ -0,0 +1,21 @@
+import os
+import pytest
+
+AppTest = pytest.importorskip('streamlit.testing.v1').AppTest
+
+MAIN = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'main.py')
+
+def test_pages_return_their_connection_after_rendering(storage, load_sample):
+    load_sample(20)
+    app = AppTest.from_file(MAIN, default_timeout=60)
+    app.session_state['authenticated'] = True
+    app.run()
+    assert not app.exception
+
+    for page in app.sidebar.radio[0].options:
+        app.sidebar.radio[0].set_value(page).run()
+        assert not app.exception, page
+        session_storage = app.session_state['storage']
+        # An idle browser session holds no pooled connection
+        assert not session_storage.session.in_transaction(), page
+        assert not session_storage.read_session.in_transaction(), page
@@ -0,0 +1,161 @@
+import datetime
+from sqlalchemy import MetaData, Table, Column, Integer, String, Enum, ForeignKey, create_engine, inspect, text
+import migrations
+from storage import Storage, RelationType, RECORD_FIELDS
+from conftest import reset_process_state
+
+def baseline_tables(metadata):
+    """records and relation_records as the first release created them, before any migration."""
+    fields = [Column(field, String) for field in RECORD_FIELDS]
+    Table('records', metadata,
+          Column('id', Integer, primary_key=True),
+          Column('file_name', String),
+          *fields)
+    Table('relation_records', metadata,
+          Column('id', Integer, primary_key=True),
+          Column('record_id', Integer, ForeignKey('records.id', ondelete='CASCADE')),
+          Column('relation_type', Enum(RelationType), nullable=False),
+          Column('folder', String),
+          *(Column(field, String) for field in RECORD_FIELDS),
+          Column('file_name', String))
+
+BASELINE_RECORDS = [
+    {'file_name': 'ঢাকা/a.txt', 'ক্রমিক_নং': '১', 'নাম': 'করিম', 'ভোটার_নং': '1001',
+     'পিতার_নাম': 'রহিম', 'মাতার_নাম': 'জরিনা', 'পেশা': 'কৃষক', 'জন্ম_তারিখ': '১২/০৩/১৯৮৫',
+     'ঠিকানা': 'পূর্বপাড়া, ডাকঘর: কালিহাতী, উপজেলা: কালিহাতী'},
+    {'file_name': 'ঢাকা/a.txt', 'ক্রমিক_নং': '২', 'নাম': 'সালমা', 'ভোটার_নং': '1002',
+     'পিতার_নাম': 'করিম', 'মাতার_নাম': 'রোকেয়া', 'পেশা': 'গৃহিণী', 'জন্ম_তারিখ': '',
+     'ঠিকানা': 'গ্রাম: উত্তরপাড়া, উপজেলা: সদর'},
+    {'file_name': 'খুলনা/b.txt', 'ক্রমিক_নং': '১', 'নাম': 'জামাল', 'ভোটার_নং': '2001',
+     'পিতার_নাম': 'কামাল', 'মাতার_নাম': 'আমেনা', 'পেশা': 'কৃষক', 'জন্ম_তারিখ': '০১/০১/২০০০',
+     'ঠিকানা': None},
+]
+
+def create_baseline(url):
+    engine = create_engine(url)
+    metadata = MetaData()
+    baseline_tables(metadata)
+    with engine.begin() as connection:
+        metadata.create_all(connection)
+        connection.execute(metadata.tables['records'].insert(), BASELINE_RECORDS)
+        connection.execute(metadata.tables['relation_records'].insert(), [
+            dict(BASELINE_RECORDS[0], record_id=1, relation_type=RelationType.FRIEND, folder='ঢাকা')
+        ])
+    engine.dispose()
+
+def test_baseline_schema_is_migrated_to_latest(new_database, monkeypatch):
+    url = new_database('baseline')
+    create_baseline(url)
+    monkeypatch.setenv("DATABASE_URL", url)
+    monkeypatch.delenv("DATABASE_READ_URL", raising=False)
+    reset_process_state()
+
+    storage = Storage()
+    try:
+        with storage.engine.connect() as connection:
+            assert migrations.current_version(connection) == migrations.LATEST_VERSION == 14
+            versions = connection.execute(text("SELECT version FROM schema_version ORDER BY version")).scalars().all()
+            assert versions == list(range(1, 15))
+            columns = {column['name'] for column in inspect(connection).get_columns('records')}
+            assert {'birth_date', 'folder', 'upazila', 'village', 'occupation_id', 'address_id', 'sample_bucket'} <= columns
+            assert not {'পেশা', 'ঠিকানা'} & columns
+            assert connection.execute(text(
+                "SELECT COUNT(*) FROM records WHERE sample_bucket IS NULL"
+            )).scalar() == 0
+            assert connection.execute(text("SELECT version FROM data_version")).scalar() == 0
+
+        # Existing rows read back unchanged through the dictionary-encoded columns
+        records = storage.get_records_after(0, limit=10)['records']
+        assert [{field: record[field] for field in ['file_name'] + RECORD_FIELDS} for record in records] == BASELINE_RECORDS
+        assert [record['id'] for record in records] == [1, 2, 3]
+        assert records[0]['relation_type'] == 'friend'
+        assert storage.get_relations_by_type(RelationType.FRIEND, folder='ঢাকা')
+
+        # Backfilled columns
+        assert [record['id'] for record in storage.get_records_by_birth_date(
+            start=datetime.date(1985, 3, 12), end=datetime.date(1985, 3, 12)
+        )] == [1]
+        assert [record['id'] for record in storage.get_records_after(0, limit=10, folder='খুলনা')['records']] == [3]
+        assert {'কালিহাতী', 'সদর'} <= set(storage.get_place_children())
+        assert [record['id'] for record in storage.search_records(নাম='সালমা')] == [2]
+        assert storage.get_file_names() == ['খুলনা/b.txt', 'ঢাকা/a.txt']
+
+        # The migrated database takes new writes
+        storage.add_file_data('ঢাকা/c.txt', [{'নাম': 'নতুন', 'ভোটার_নং': '3001', 'পেশা': 'কৃষক'}])
+        assert storage.get_total_records_count() == 4
+    finally:
+        storage.release()
+
+def test_migrate_is_idempotent(new_database):
+    url = new_database('baseline')
+    create_baseline(url)
+    engine = create_engine(url)
+    try:
+        assert migrations.migrate(engine) == 14
+        assert migrations.migrate(engine) == 14
+        with engine.connect() as connection:
+            assert connection.execute(text("SELECT COUNT(*) FROM schema_version")).scalar() == 14
+            assert connection.execute(text("SELECT COUNT(*) FROM records")).scalar() == 3
+    finally:
+        engine.dispose()
+
+def test_checkpoints_keyed_by_file_are_kept_as_loads_without_a_job(new_database, monkeypatch):
+    url = new_database('checkpoints')
+    engine = create_engine(url)
+    try:
+        monkeypatch.setattr(migrations, 'MIGRATIONS', migrations.MIGRATIONS[:9])
+        migrations.migrate(engine)
+        # ingest_checkpoints as migrations 1-9 left it on existing databases
+        with engine.begin() as connection:
+            connection.execute(text("DROP TABLE ingest_checkpoints"))
+            connection.execute(text("""
+                CREATE TABLE ingest_checkpoints (
+                    file_name VARCHAR PRIMARY KEY, records_committed INTEGER NOT NULL,
+                    completed BOOLEAN NOT NULL, updated_at TIMESTAMP NOT NULL
+                )
+            """))
+            connection.execute(text(
+                "INSERT INTO ingest_checkpoints VALUES ('f1/a.txt', 30, false, CURRENT_TIMESTAMP)"
+            ))
+        monkeypatch.undo()
+        assert migrations.migrate(engine) == 14
+    finally:
+        engine.dispose()
+
+    monkeypatch.setenv("DATABASE_URL", url)
+    reset_process_state()
+    storage = Storage()
+    try:
+        checkpoint = storage.get_ingest_checkpoint('f1/a.txt')
+        assert (checkpoint['records_committed'], checkpoint['completed'], checkpoint['job_id']) == (30, False, None)
+        job_id = storage.create_ingest_job('f1', 'a.txt', '/tmp/a.txt')
+        assert storage.get_ingest_checkpoint('f1/a.txt', job_id=job_id) is None
+    finally:
+        storage.release()
+
+def test_address_components_are_parsed_again(new_database, monkeypatch):
+    url = new_database('addresses')
+    create_baseline(url)
+    engine = create_engine(url)
+    try:
+        monkeypatch.setattr(migrations, 'MIGRATIONS', migrations.MIGRATIONS[:10])
+        migrations.migrate(engine)
+        # As parsed while labels matched without a colon
+        with engine.begin() as connection:
+            connection.execute(text("UPDATE records SET village = 'উত্তর', upazila = 'পাড়া' WHERE id = 2"))
+            # Left NULL by an earlier load; NULL never compares equal or unequal
+            connection.execute(text("UPDATE records SET union_name = NULL, post_office = NULL WHERE id = 1"))
+            connection.execute(text(
+                "INSERT INTO places (upazila, union_name, post_office, village) VALUES ('পাড়া', '', '', 'উত্তর')"
+            ))
+        monkeypatch.undo()
+        assert migrations.migrate(engine) == 14
+        with engine.connect() as connection:
+            assert connection.execute(text("SELECT upazila, village FROM records WHERE id = 2")).one() == ('সদর', 'উত্তরপাড়া')
+            assert connection.execute(text("SELECT COUNT(*) FROM places WHERE upazila = 'পাড়া'")).scalar() == 0
+            assert connection.execute(text(
+                "SELECT COUNT(*) FROM records WHERE union_name IS NULL OR post_office IS NULL"
+            )).scalar() == 0
+            assert connection.execute(text("SELECT COUNT(*) FROM places WHERE upazila = 'সদর'")).scalar() == 1
+    finally:
+        engine.dispose()
@@ -0,0 +1,142 @@
+import pytest
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import IntegrityError
+import migrations
+from migrations import partition_records, partition_name, ensure_folder_partition, drop_folder_partition
+from storage import Storage, RelationType
+from conftest import POSTGRES_URL
+
+# Partitioning is Postgres only
+pytestmark = pytest.mark.parametrize('backend', [
+    pytest.param('postgresql', marks=pytest.mark.skipif(not POSTGRES_URL, reason="TEST_POSTGRES_URL is not set"))
+], indirect=True)
+
+def partitions(connection):
+    """Folder partitions attached to records, by name, with their bounds."""
+    return dict(connection.execute(text("""
+        SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)
+        FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'records'::regclass
+    """)).all())
+
+def folder_counts(connection, table='records'):
+    return dict(connection.execute(text(f"SELECT folder, COUNT(*) FROM {table} GROUP BY folder")).all())
+
+@pytest.fixture
+def partitioned(storage, load_sample):
+    """The storage fixture's database with two folders and a relation, then partitioned by folder."""
+    load_sample(40, folder='f1', name='a.txt')
+    load_sample(30, folder='f2', name='b.txt')
+    first = storage.get_records_after(0, limit=1, folder='f1')['records'][0]
+    storage.mark_relation(first['id'], RelationType.FRIEND)
+    before = storage.get_records_after(0, limit=1000)['records']
+    storage.release()
+
+    partition_records(storage.engine)
+    # Storage checks for partitioning when it connects
+    partitioned_storage = Storage()
+    yield partitioned_storage, before
+    partitioned_storage.release()
+
+def test_existing_rows_move_into_folder_partitions(partitioned):
+    storage, before = partitioned
+    assert storage.records_partitioned
+    with storage.engine.connect() as connection:
+        assert partitions(connection) == {
+            'records_default': 'DEFAULT',
+            partition_name('f1'): "FOR VALUES IN ('f1')",
+            partition_name('f2'): "FOR VALUES IN ('f2')",
+        }
+        assert folder_counts(connection, partition_name('f1')) == {'f1': 40 - 40 // 50}
+        assert folder_counts(connection, partition_name('f2')) == {'f2': 30}
+        assert folder_counts(connection, 'records_default') == {}
+        # The views were rebuilt over the new table
+        assert connection.execute(text("SELECT COUNT(*) FROM records_view")).scalar() == len(before)
+
+    # Same ids and values, and the relation still joins its record
+    assert storage.get_records_after(0, limit=1000)['records'] == before
+    assert len(storage.get_relations_by_type(RelationType.FRIEND)) == 1
+
+def test_partitioned_constraints(partitioned):
+    storage, before = partitioned
+    with storage.engine.connect() as connection:
+        inspector = inspect(connection)
+        # No unique index on id alone is possible, so the primary key becomes a plain index
+        assert not inspector.get_pk_constraint('records')['constrained_columns']
+        assert 'ix_records_id' in {index['name'] for index in inspector.get_indexes('records')}
+        # relation_records can no longer reference records
+        assert not [key for key in inspector.get_foreign_keys('relation_records') if key['referred_table'] == 'records']
+        # Ids still come from the sequence, after the existing ones
+        next_id = connection.execute(text(
+            "SELECT nextval(pg_get_serial_sequence('records', 'id'))"
+        )).scalar()
+        assert next_id > max(record['id'] for record in before)
+
+    # A row can only live in its folder's partition
+    with storage.engine.begin() as connection:
+        with pytest.raises(IntegrityError):
+            with connection.begin_nested():
+                connection.execute(text(f"INSERT INTO {partition_name('f1')} (folder) VALUES ('f2')"))
+
+    # Unique constraints on the other tables keep working with new folders
+    storage.add_file_data('f1/c.txt', [{'নাম': 'ক', 'ভোটার_নং': '1', 'ঠিকানা': 'গ্রাম: ক, উপজেলা: খ'}])
+    storage.add_file_data('f1/d.txt', [{'নাম': 'খ', 'ভোটার_নং': '2', 'ঠিকানা': 'গ্রাম: ক, উপজেলা: খ'}])
+    with storage.engine.connect() as connection:
+        assert connection.execute(text("SELECT COUNT(*) FROM places WHERE upazila = 'খ'")).scalar() == 1
+        ids = connection.execute(text("SELECT id FROM records")).scalars().all()
+        assert len(ids) == len(set(ids))
+
+def test_loading_a_new_folder_attaches_its_partition(partitioned, sample_file):
+    from data_processor import TextFileRecords
+    storage, before = partitioned
+    path, expected = sample_file(25, 'c.txt')
+    storage.add_file_data_with_batch('c.txt', 'নতুন ফোল্ডার', TextFileRecords(path))
+    with storage.engine.connect() as connection:
+        assert partitions(connection)[partition_name('নতুন ফোল্ডার')] == "FOR VALUES IN ('নতুন ফোল্ডার')"
+        assert folder_counts(connection, partition_name('নতুন ফোল্ডার')) == {'নতুন ফোল্ডার': expected}
+    assert len(storage.get_records_after(0, limit=1000, folder='নতুন ফোল্ডার')['records']) == expected
+
+def test_rows_in_the_default_partition_move_when_their_folder_gets_one(partitioned):
+    storage, before = partitioned
+    with storage.engine.begin() as connection:
+        connection.execute(text(
+            "INSERT INTO records (file_name, folder, নাম) VALUES ('f3/x.txt', 'f3', 'ক'), ('f3/x.txt', 'f3', 'খ')"
+        ))
+        assert folder_counts(connection, 'records_default') == {'f3': 2}
+    with storage.engine.begin() as connection:
+        ensure_folder_partition(connection, 'f3')
+        # A second call finds the partition and does nothing
+        ensure_folder_partition(connection, 'f3')
+    with storage.engine.connect() as connection:
+        assert folder_counts(connection, 'records_default') == {}
+        assert folder_counts(connection, partition_name('f3')) == {'f3': 2}
+
+def test_delete_folder_detaches_and_drops_its_partition(partitioned):
+    storage, before = partitioned
+    assert storage.delete_folder('f1')
+    with storage.engine.connect() as connection:
+        assert partition_name('f1') not in partitions(connection)
+        assert connection.execute(text("SELECT to_regclass(:name)"), {'name': partition_name('f1')}).scalar() is None
+        assert folder_counts(connection) == {'f2': 30}
+        # Relations are deleted explicitly, without the foreign key
+        assert connection.execute(text("SELECT COUNT(*) FROM relation_records")).scalar() == 0
+    assert storage.get_file_names() == ['f2/b.txt']
+
+    with storage.engine.begin() as connection:
+        assert not drop_folder_partition(connection, 'f1')
+
+def test_partitioning_twice_is_a_no_op(partitioned):
+    storage, before = partitioned
+    partition_records(storage.engine)
+    with storage.engine.connect() as connection:
+        assert len(partitions(connection)) == 3
+        assert migrations.is_records_partitioned(connection)
+
+def test_restore_into_a_new_folder_attaches_its_partition(partitioned, tmp_path):
+    storage, before = partitioned
+    manifest = storage.snapshot_folder('f1', str(tmp_path / 'snap'))
+    storage.restore_folder(str(tmp_path / 'snap'), folder='copy')
+    with storage.engine.connect() as connection:
+        assert folder_counts(connection, partition_name('copy')) == {'copy': manifest['rows']['records']}
+    assert [record['relation_type'] for record in storage.get_records_after(0, limit=1000, folder='copy')['records']
+            ].count('friend') == 1
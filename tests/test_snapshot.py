@@ -0,0 +1,69 @@
+import os
+import shutil
+import pytest
+import snapshot
+from storage import RelationType
+
+def folder_records(storage, folder):
+    return storage.get_records_after(0, limit=10000, folder=folder)['records']
+
+def without_ids(records):
+    return [{key: value for key, value in record.items() if key != 'id'} for record in records]
+
+def test_snapshot_restores_records_and_relations(storage, load_sample, tmp_path):
+    loaded = load_sample(60)
+    records = folder_records(storage, 'f1')
+    storage.mark_relation(records[3]['id'], RelationType.FRIEND)
+    records = folder_records(storage, 'f1')
+
+    manifest = storage.snapshot_folder('f1', str(tmp_path / 'snap'))
+    assert manifest['rows'] == {'records': loaded, 'relation_records': 1}
+
+    restored = storage.restore_folder(str(tmp_path / 'snap'), folder='copy')
+    assert restored['folder'] == 'copy'
+    copied = folder_records(storage, 'copy')
+    assert [record['file_name'] for record in copied] == ['copy/a.txt'] * loaded
+    assert without_ids(copied) == [dict(record, file_name='copy/a.txt') for record in without_ids(records)]
+    assert [record['relation_type'] for record in copied].count('friend') == 1
+    assert storage.get_ingest_checkpoint('copy/a.txt')['completed']
+
+def test_restore_with_checksum_mismatch_is_rolled_back(storage, load_sample, tmp_path):
+    load_sample(20)
+    original = str(tmp_path / 'original')
+    storage.snapshot_folder('f1', original)
+
+    # Data files of a changed folder paired with the original manifest: same row counts, different checksum
+    record = folder_records(storage, 'f1')[0]
+    storage.bulk_update_records({record['id']: {'নাম': 'বদলানো নাম'}})
+    changed = str(tmp_path / 'changed')
+    storage.snapshot_folder('f1', changed)
+    for name in os.listdir(changed):
+        if name != snapshot.MANIFEST_FILE:
+            shutil.copy(os.path.join(changed, name), os.path.join(original, name))
+
+    version = storage.get_data_version()
+    with pytest.raises(ValueError, match="does not match the snapshot"):
+        storage.restore_folder(original, folder='copy')
+    assert folder_records(storage, 'copy') == []
+    assert storage.get_ingest_checkpoint('copy/a.txt') is None
+    assert storage.get_data_version() == version
+
+    # The session is usable again after the rollback
+    restored = storage.restore_folder(changed, folder='copy')
+    assert restored['rows']['records'] == len(folder_records(storage, 'copy'))
+
+def test_restore_into_existing_folder_needs_replace(storage, load_sample, tmp_path):
+    loaded = load_sample(10)
+    storage.snapshot_folder('f1', str(tmp_path / 'snap'))
+    with pytest.raises(ValueError, match="already exists"):
+        storage.restore_folder(str(tmp_path / 'snap'))
+    storage.restore_folder(str(tmp_path / 'snap'), replace=True)
+    assert len(folder_records(storage, 'f1')) == loaded
+
+def test_snapshot_of_an_unknown_folder_creates_no_directory(storage, load_sample, tmp_path):
+    load_sample(10)
+    with pytest.raises(ValueError, match="has no records"):
+        storage.snapshot_folder('f2', str(tmp_path / 'snap'))
+    assert not os.path.exists(tmp_path / 'snap')
+    # The same directory takes a snapshot once the folder is right
+    storage.snapshot_folder('f1', str(tmp_path / 'snap'))
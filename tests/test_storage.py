@@ -0,0 +1,278 @@
+import pytest
+from sqlalchemy import event, text
+from sqlalchemy.exc import OperationalError
+import storage as storage_module
+from storage import Storage, CircuitBreaker, DatabaseUnavailableError, search_cache, analytics_cache, get_connection_stats
+from conftest import reset_process_state, drop_connection
+
+def connection_lost():
+    return OperationalError("SELECT 1", {}, Exception("server closed the connection unexpectedly"))
+
+def test_keyset_pagination_visits_every_record_once(storage, load_sample):
+    loaded = load_sample(120)
+    load_sample(30, folder='f2', name='b.txt')
+
+    seen = []
+    after_id = 0
+    while after_id is not None:
+        page = storage.get_records_after(after_id, limit=25, folder='f1')
+        assert len(page['records']) <= 25
+        seen.extend(record['id'] for record in page['records'])
+        after_id = page['next_after_id']
+
+    assert len(seen) == loaded
+    assert seen == sorted(set(seen))
+    assert {record['file_name'] for record in storage.get_records_after(0, limit=1000, folder='f1')['records']} == {'f1/a.txt'}
+
+def test_keyset_pagination_last_full_page(storage, load_sample):
+    loaded = load_sample(51)
+    first = storage.get_records_after(0, limit=loaded)
+    assert len(first['records']) == loaded
+    # A last page that happens to be full still reports a next id; the page after it is empty
+    second = storage.get_records_after(first['next_after_id'], limit=loaded)
+    assert second == {'records': [], 'next_after_id': None}
+
+def test_bulk_update_records(storage, load_sample):
+    load_sample(10)
+    records = storage.get_records_after(0, limit=3)['records']
+    version = storage.get_data_version()
+    change_version = storage.get_change_log_version()
+
+    updated = storage.bulk_update_records({
+        records[0]['id']: {'নাম': 'নতুন নাম', 'পেশা': 'শিক্ষক'},
+        records[1]['id']: {'জন্ম_তারিখ': '০১/০১/১৯৯০'},
+        records[2]['id']: {},
+    })
+
+    assert updated == 2
+    after = {record['id']: record for record in storage.get_records_after(0, limit=3)['records']}
+    assert after[records[0]['id']]['নাম'] == 'নতুন নাম'
+    assert after[records[0]['id']]['পেশা'] == 'শিক্ষক'
+    # Fields not in a record's changes keep their values
+    assert after[records[0]['id']]['জন্ম_তারিখ'] == records[0]['জন্ম_তারিখ']
+    assert after[records[1]['id']]['নাম'] == records[1]['নাম']
+    assert after[records[2]['id']] == records[2]
+    assert storage.get_data_version() > version
+
+    changes = storage.get_changes_since(change_version)['changes']
+    assert sorted(change['record_id'] for change in changes) == sorted([records[0]['id'], records[1]['id']])
+    born = storage.get_records_by_birth_date(start='1990-01-01', end='1990-01-01')
+    assert [record['id'] for record in born] == [records[1]['id']]
+
+def test_bulk_update_rejects_unknown_fields(storage, load_sample):
+    load_sample(3)
+    record = storage.get_records_after(0, limit=1)['records'][0]
+    version = storage.get_data_version()
+    with pytest.raises(ValueError):
+        storage.bulk_update_records({record['id']: {'নাম': 'x', 'file_name': 'other/x.txt'}})
+    assert storage.get_data_version() == version
+    assert storage.get_records_after(0, limit=1)['records'][0] == record
+
+@pytest.fixture
+def replica(database_url, new_database, sample_file, monkeypatch):
+    """A second, separately migrated database standing in for a read replica, holding one folder."""
+    from data_processor import TextFileRecords
+    url = new_database('replica')
+    monkeypatch.setenv("DATABASE_URL", url)
+    instance = Storage()
+    path, _ = sample_file(5, 'replica.txt')
+    instance.add_file_data_with_batch('r.txt', 'replica', TextFileRecords(path))
+    instance.release()
+    monkeypatch.setenv("DATABASE_URL", database_url)
+    reset_process_state()
+    return url
+
+def test_reads_go_to_replica_until_this_storage_writes(replica, monkeypatch):
+    primary = Storage(read_url=replica)
+    try:
+        def file_names():
+            return {record['file_name'] for record in primary.get_records_after(0, limit=1000)['records']}
+
+        assert file_names() == {'replica/r.txt'}
+        primary.add_file_data('f1/a.txt', [{'নাম': 'ক', 'ভোটার_নং': '1'}])
+        # Read your writes: right after writing, reads stay on the primary
+        assert file_names() == {'f1/a.txt'}
+        monkeypatch.setattr(storage_module, 'READ_YOUR_WRITES_SECONDS', 0)
+        assert file_names() == {'replica/r.txt'}
+    finally:
+        primary.release()
+
+def test_writes_never_go_to_replica(replica):
+    primary = Storage(read_url=replica)
+    try:
+        primary.add_file_data('f1/a.txt', [{'নাম': 'ক', 'ভোটার_নং': '1'}])
+    finally:
+        primary.release()
+    with storage_module.get_engine(replica).connect() as connection:
+        assert connection.exec_driver_sql("SELECT COUNT(*) FROM records WHERE folder = 'f1'").scalar() == 0
+
+def test_circuit_breaker_states():
+    breaker = CircuitBreaker('test', threshold=2, reset_seconds=60)
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == 'closed'
+    breaker.record_failure()
+    assert breaker.state == 'open'
+    with pytest.raises(DatabaseUnavailableError):
+        breaker.before_call()
+
+    # After the reset timeout a single trial is let through
+    breaker.opened_at -= 60
+    assert breaker.state == 'half-open'
+    breaker.before_call()
+    with pytest.raises(DatabaseUnavailableError):
+        breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == 'open'
+
+    breaker.opened_at -= 60
+    breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == 'closed'
+    breaker.before_call()
+
+def test_connection_error_is_retried_on_a_fresh_connection(storage, monkeypatch):
+    monkeypatch.setattr(storage_module, 'retry_delay', lambda attempt: 0)
+    calls = []
+
+    def operation():
+        calls.append(1)
+        if len(calls) == 1:
+            raise connection_lost()
+        return storage.get_data_version()
+
+    assert storage.execute_with_retry(operation) == 0
+    assert len(calls) == 2
+    assert storage.breaker.state == 'closed'
+    assert storage.breaker.failures == 0
+
+def test_open_breaker_fails_fast_until_reset(storage, monkeypatch):
+    monkeypatch.setattr(storage_module, 'retry_delay', lambda attempt: 0)
+    monkeypatch.setattr(storage.breaker, 'threshold', 2)
+    calls = []
+
+    def unreachable():
+        calls.append(1)
+        raise connection_lost()
+
+    # Retrying stops as soon as the breaker opens
+    with pytest.raises(DatabaseUnavailableError):
+        storage.execute_with_retry(unreachable)
+    assert len(calls) == 2
+    assert storage.breaker.state == 'open'
+
+    # Every Storage on the same database now fails without reaching it
+    other = Storage()
+    try:
+        with pytest.raises(DatabaseUnavailableError):
+            other.get_records_after(0)
+        with pytest.raises(DatabaseUnavailableError):
+            storage.execute_with_retry(unreachable)
+        assert len(calls) == 2
+
+        # Once the reset timeout passes, a successful trial closes the breaker again
+        storage.breaker.opened_at -= storage.breaker.reset_seconds
+        assert other.get_records_after(0) == {'records': [], 'next_after_id': None}
+        assert storage.breaker.state == 'closed'
+    finally:
+        other.release()
+
+def test_query_errors_do_not_open_the_breaker(storage, monkeypatch):
+    monkeypatch.setattr(storage.breaker, 'threshold', 1)
+
+    def bad_query():
+        raise OperationalError("SELECT nope", {}, Exception("no such column: nope"))
+
+    with pytest.raises(OperationalError):
+        storage.execute_with_retry(bad_query)
+    assert storage.breaker.state == 'closed'
+
+def test_old_sqlite_is_rejected(monkeypatch, tmp_path):
+    # 3.34 has the trigram tokenizer but not UPDATE ... RETURNING
+    monkeypatch.setattr(storage_module.sqlite3, 'sqlite_version_info', (3, 34, 1))
+    with pytest.raises(RuntimeError, match="3.35.0 or newer"):
+        storage_module.create_database_engine(f"sqlite:///{tmp_path / 'old.db'}")
+
+def test_file_names_follow_every_write(storage, load_sample, tmp_path):
+    assert storage.get_file_names() == []
+    load_sample(5)
+    load_sample(5, folder='f2', name='b.txt')
+    assert sorted(storage.get_file_names()) == ['f1/a.txt', 'f2/b.txt']
+
+    # Another Storage, as in another session, sees the same changes
+    other = Storage()
+    try:
+        other.delete_file_data('f2/b.txt')
+        assert storage.get_file_names() == ['f1/a.txt']
+        storage.snapshot_folder('f1', str(tmp_path / 'snap'))
+        other.restore_folder(str(tmp_path / 'snap'), folder='copy')
+        assert sorted(storage.get_file_names()) == ['copy/a.txt', 'f1/a.txt']
+        other.delete_folder('f1')
+        assert storage.get_file_names() == ['copy/a.txt']
+    finally:
+        other.release()
+
+def test_file_names_are_read_from_per_file_counts(storage, load_sample, tmp_path):
+    def counts():
+        with storage.engine.connect() as connection:
+            files = dict(connection.execute(text("SELECT file_name, records FROM files")).all())
+            records = dict(connection.execute(text("SELECT file_name, COUNT(*) FROM records GROUP BY file_name")).all())
+        assert files == records
+        return files
+
+    loaded = load_sample(40)
+    storage.add_file_data('f2/b.txt', [{'নাম': 'ক', 'ভোটার_নং': '1'}, {'নাম': 'খ', 'ভোটার_নং': '2'}])
+    assert counts() == {'f1/a.txt': loaded, 'f2/b.txt': 2}
+
+    record_id = storage.get_records_after(0, limit=1, folder='f2')['records'][0]['id']
+    storage.delete_record(record_id)
+    assert counts() == {'f1/a.txt': loaded, 'f2/b.txt': 1}
+    storage.delete_record(storage.get_records_after(0, limit=1, folder='f2')['records'][0]['id'])
+    assert counts() == {'f1/a.txt': loaded}
+
+    storage.snapshot_folder('f1', str(tmp_path / 'snap'))
+    storage.restore_folder(str(tmp_path / 'snap'), folder='copy')
+    storage.restore_folder(str(tmp_path / 'snap'), folder='copy', replace=True)
+    assert counts() == {'f1/a.txt': loaded, 'copy/a.txt': loaded}
+
+    # The list comes from files alone, without a scan of records
+    statements = []
+    listen = lambda connection, cursor, statement, *args: statements.append(statement)
+    event.listen(storage.read_engine, 'before_cursor_execute', listen)
+    try:
+        search_cache.clear()
+        analytics_cache.clear()
+        assert storage.get_file_names() == ['copy/a.txt', 'f1/a.txt']
+    finally:
+        event.remove(storage.read_engine, 'before_cursor_execute', listen)
+    assert not [statement for statement in statements if 'FROM records' in statement]
+
+    storage.delete_folder('copy')
+    assert counts() == {'f1/a.txt': loaded}
+    storage.delete_all_records()
+    assert counts() == {}
+
+def test_new_sessions_do_not_query_the_database(storage):
+    statements = []
+    listen = lambda connection, cursor, statement, *args: statements.append(statement)
+    event.listen(storage.engine, 'before_cursor_execute', listen)
+    try:
+        other = Storage()
+        other.release()
+    finally:
+        event.remove(storage.engine, 'before_cursor_execute', listen)
+    # The schema version and partitioning were checked when the first Storage was constructed
+    assert statements == []
+    assert other.records_partitioned is False
+
+def test_dropped_session_connection_is_replaced(storage, load_sample, monkeypatch):
+    monkeypatch.setattr(storage_module, 'retry_delay', lambda attempt: 0)
+    load_sample(10)
+    before = storage.get_records_after(0)
+    # The read left the session in a transaction on a pooled connection, which the server now drops
+    drop_connection(storage.session.connection().connection.dbapi_connection)
+    recovered = get_connection_stats().get('recovered', 0)
+
+    assert storage.get_records_after(0) == before
+    assert get_connection_stats()['recovered'] == recovered + 1
+    assert storage.breaker.state == 'closed'
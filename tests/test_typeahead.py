@@ -0,0 +1,155 @@
+import random
+import threading
+import time
+from collections import Counter
+import pytest
+from sqlalchemy import event
+import storage as storage_module
+from storage import Storage, RelationType
+import typeahead as typeahead_module
+from typeahead import PrefixIndex, TypeaheadIndex
+
+def test_completions_rank_the_most_common_values_first():
+    index = PrefixIndex({'করিম': 2, 'করিমা': 5, 'করিম উদ্দিন': 2, 'কামাল': 9, 'রহিম': 7})
+    # Until the prefixes are ranked, matches come in sorted order
+    assert index.complete('কর') == ['করিম', 'করিম উদ্দিন', 'করিমা']
+    index.rank()
+    index.update(added=['করিমন'] * 3)
+    assert index.recent == ['করিমন']
+    assert index.complete('কর', limit=3) == ['করিমা', 'করিমন', 'করিম']
+    assert index.complete('করিম', limit=3) == ['করিমা', 'করিমন', 'করিম']
+    assert index.complete('করিম উ') == ['করিম উদ্দিন']
+    # Ties keep sorted order
+    assert index.complete('কর') == ['করিমা', 'করিমন', 'করিম', 'করিম উদ্দিন']
+
+    index.update(removed=['করিমা'] * 5)
+    assert index.complete('কর', limit=2) == ['করিমন', 'করিম']
+
+@pytest.mark.parametrize('limit', [1, 3, 10])
+def test_ranked_prefixes_stay_exact_through_writes(monkeypatch, limit):
+    # Short lists and small scans exercise the floor and the cached scans of longer prefixes
+    monkeypatch.setattr(typeahead_module, 'RANKED_VALUES', 3)
+    monkeypatch.setattr(typeahead_module, 'SCAN_LIMIT', 4)
+    rng = random.Random(limit)
+    values = [''.join(rng.choice('কখগ') for _ in range(rng.randint(1, 5))) for _ in range(200)]
+    index = PrefixIndex(dict(Counter(rng.choice(values) for _ in range(500))))
+    index.rank()
+    counts = Counter(index.counts)
+
+    def expected(prefix):
+        matches = sorted((key for key in counts if key.startswith(prefix) and counts[key] > 0),
+                         key=lambda key: (-counts[key], key))
+        return matches[:limit]
+
+    for step in range(300):
+        added = [rng.choice(values) for _ in range(rng.randint(0, 3))]
+        removed = [value for value in rng.sample(values, 3) if counts[value] > 0][:rng.randint(0, 3)]
+        index.update(added=added, removed=removed)
+        counts.update(added)
+        counts.subtract(removed)
+        for prefix in ['ক', 'কখ', 'খগক', 'গগগগ', rng.choice(values)[:rng.randint(1, 4)]]:
+            assert index.complete(prefix, limit) == expected(prefix), (step, prefix)
+
+def test_first_build_runs_in_the_background():
+    index = TypeaheadIndex()
+    loading = threading.Event()
+
+    def load():
+        loading.wait(10)
+        return 1, {'নাম': {'করিম': 1, 'করিমা': 3}}
+
+    index.ensure_built(load)
+    # The lookup does not wait for the load
+    assert index.complete('নাম', 'কর') == []
+    loading.set()
+    deadline = time.monotonic() + 10
+    while index.rebuilding and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert index.version == 1
+    assert index.complete('নাম', 'কর') == ['করিমা', 'করিম']
+
+@pytest.fixture
+def typeahead(storage, monkeypatch):
+    """The process-wide index with every lookup checking the database version, and a record of rebuilds."""
+    monkeypatch.setattr(storage_module, 'TYPEAHEAD_CHECK_SECONDS', 0)
+    builds = []
+    build = TypeaheadIndex._build
+
+    def counted_build(self, load):
+        builds.append(load)
+        return build(self, load)
+
+    monkeypatch.setattr(TypeaheadIndex, '_build', counted_build)
+    return storage_module.typeahead_index, builds
+
+def complete(storage, prefix):
+    """Completions for নাম after the refresh started by the lookup has finished."""
+    storage.get_completions('নাম', prefix)
+    deadline = time.monotonic() + 10
+    while storage_module.typeahead_index.rebuilding and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return storage.get_completions('নাম', prefix)
+
+def records(*names):
+    return [{'নাম': name, 'ভোটার_নং': str(1000 + i)} for i, name in enumerate(names)]
+
+def test_writes_of_another_process_are_caught_up_from_the_change_log(storage, typeahead, monkeypatch):
+    index, builds = typeahead
+    storage.add_file_data('f1/a.txt', records('করিম', 'করিমা', 'রহিম', 'করিম'))
+    assert complete(storage, 'কর') == ['করিম', 'করিমা']
+    assert len(builds) == 1
+    ids = [record['id'] for record in storage.get_records_after(0, limit=10)['records']]
+
+    # Writes of another process never reach this process's index
+    with monkeypatch.context() as patched:
+        patched.setattr(index, 'apply', lambda *args, **kwargs: None)
+        storage.update_record(ids[0], {'নাম': 'করিমন'})
+        storage.delete_record(ids[1])
+        storage.bulk_update_records({ids[2]: {'নাম': 'করিমন'}})
+        storage.mark_relation(ids[3], RelationType.FRIEND)
+    # This process's own write after them waits for the catch up
+    storage.update_record(ids[3], {'পিতার_নাম': 'কামাল'})
+
+    assert complete(storage, 'কর') == ['করিমন', 'করিম']
+    assert len(builds) == 1
+    assert index.version == storage.get_data_version()
+    assert storage.get_completions('পিতার_নাম', 'কা') == ['কামাল']
+
+def test_loads_and_bulk_deletes_of_another_process_rebuild_the_index(storage, typeahead, monkeypatch):
+    index, builds = typeahead
+    storage.add_file_data('f1/a.txt', records('করিম'))
+    assert complete(storage, 'কর') == ['করিম']
+
+    with monkeypatch.context() as patched:
+        patched.setattr(index, 'apply', lambda *args, **kwargs: None)
+        storage.add_file_data('f1/b.txt', records('করিমা', 'করিমা'))
+    assert complete(storage, 'কর') == ['করিমা', 'করিম']
+    assert len(builds) == 2
+
+    storage.delete_file_data('f1/b.txt')
+    assert index.stale
+    assert complete(storage, 'কর') == ['করিম']
+    assert len(builds) == 3
+
+def test_counts_are_read_from_one_snapshot(storage):
+    storage.add_file_data('f1/a.txt', records('করিম'))
+    version = storage.get_data_version()
+    other = Storage()
+    written = []
+
+    def before_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+        if 'GROUP BY' in statement and not written:
+            written.append(True)
+            other.add_file_data('f1/b.txt', records('করিমা'))
+
+    event.listen(storage.read_engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        loaded_version, counts = storage._load_typeahead_counts()
+    finally:
+        event.remove(storage.read_engine, 'before_cursor_execute', before_cursor_execute)
+        other.release()
+
+    assert written
+    assert loaded_version == version
+    assert counts['নাম'] == {'করিম': 1}
+    assert storage.get_data_version() == version + 1
@@ -0,0 +1,340 @@
+import bisect
+import heapq
+import itertools
+import threading
+import logging
+import unicodedata
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Fields offered as completions on the search page
+TYPEAHEAD_FIELDS = ['নাম', 'পিতার_নাম', 'ভোটার_নং']
+
+# Bengali digits map to ASCII so a voter number matches however it is typed
+DIGITS = str.maketrans('০১২৩৪৫৬৭৮৯', '0123456789')
+
+# Pending additions and removals a PrefixIndex holds before merging, at least, or 5% of its size
+COMPACT_MIN_CHANGES = 10000
+
+# Prefixes up to this many characters have their most common values ranked ahead of lookups
+RANKED_PREFIX_LENGTH = 3
+# Values ranked per prefix; longer completion lists rank the whole prefix range
+RANKED_VALUES = 20
+# Matching keys a lookup ranks by scanning; a longer prefix range is ranked once and then kept
+SCAN_LIMIT = 5000
+
+def normalize_value(value):
+    """Key a value is indexed and looked up by: NFC, ASCII digits, collapsed spaces, lowercase."""
+    value = unicodedata.normalize('NFC', str(value)).translate(DIGITS)
+    return ' '.join(value.split()).lower()
+
+class PrefixIndex:
+    """Sorted distinct values of one field, answering prefix lookups with a binary search.
+
+    New values go into a small sorted run beside the main one, and removed
+    values stay in place but are skipped, so a write costs a sort of the
+    small run instead of the whole index. The runs are merged once the
+    pending changes reach a fraction of the index. Runs are replaced, never
+    modified in place, so lookups need no lock while a writer applies
+    changes.
+
+    Short prefixes match too many values to rank on every keystroke, so
+    rank() keeps the most common values of each prefix up to
+    RANKED_PREFIX_LENGTH characters, and writes move their values within
+    those lists. Until rank() has run, lookups return matches in sorted
+    order.
+    """
+
+    def __init__(self, counts=None):
+        self.counts = {}  # key -> number of records with the value
+        self.display = {}  # key -> value as first seen
+        for value, count in (counts or {}).items():
+            self._count(normalize_value(value), value, count)
+        self.keys = sorted(self.counts)
+        self.recent = []
+        self.removed = 0
+        # prefix -> [keys most common first, floor]; keys that are not listed rank at or after the
+        # floor's (-count, key), or there are none if it is None
+        self.ranked = None
+        self.ranked_lock = threading.Lock()
+
+    def _count(self, key, value, count):
+        """Adjust the record count of key. Returns True if it was added or removed."""
+        if not key:
+            return False
+        previous = self.counts.get(key, 0)
+        remaining = previous + count
+        if remaining > 0:
+            self.counts[key] = remaining
+            self.display.setdefault(key, value)
+            return not previous
+        self.counts.pop(key, None)
+        self.display.pop(key, None)
+        return bool(previous)
+
+    def update(self, added=(), removed=()):
+        """Count added and removed values, adding newly seen ones to the recent run."""
+        with self.ranked_lock:
+            changed = set()
+            new_keys = set()
+            for value in added:
+                key = normalize_value(value)
+                if self._count(key, value, 1):
+                    new_keys.add(key)
+                changed.add(key)
+            for value in removed:
+                key = normalize_value(value)
+                if self._count(key, value, -1):
+                    self.removed += 1
+                changed.add(key)
+            # Values added and removed again by the same write are already gone from counts
+            new_keys = [key for key in new_keys if key in self.counts]
+            if new_keys:
+                self.recent = sorted(self.recent + new_keys)
+            for key in changed:
+                self._rerank(key)
+            if len(self.recent) + self.removed > max(COMPACT_MIN_CHANGES, len(self.keys) // 20):
+                self.compact()
+
+    def compact(self):
+        """Merge the recent run into the main one, drop removed values and rank prefixes again."""
+        counts = self.counts
+        keys = [key for key in self.keys if key in counts]
+        # Sorting two concatenated sorted runs is a linear merge
+        keys.extend(self.recent)
+        keys.sort()
+        # A value removed and added again can be in both runs
+        self.keys = [key for i, key in enumerate(keys) if key in counts and (i == 0 or keys[i - 1] != key)]
+        self.recent = []
+        self.removed = 0
+        if self.ranked is not None:
+            self._rank_prefixes()
+
+    def rank(self):
+        """Rank the most common values of every prefix up to RANKED_PREFIX_LENGTH characters."""
+        with self.ranked_lock:
+            self._rank_prefixes()
+
+    def _rank_prefixes(self):
+        # One pass over the keys ranks the longest prefixes; each shorter prefix is ranked from the
+        # lists of the longer ones it covers, which hold one key past the list to find its floor
+        candidates = {}
+        for group, keys in itertools.groupby(self._matches(''), key=lambda key: key[:RANKED_PREFIX_LENGTH]):
+            candidates[group] = heapq.nsmallest(RANKED_VALUES + 1, keys, key=self._rank_key)
+        ranked = {}
+        for length in range(RANKED_PREFIX_LENGTH, 0, -1):
+            if length < RANKED_PREFIX_LENGTH:
+                merged = {}
+                for group, keys in candidates.items():
+                    merged.setdefault(group[:length], []).extend(keys)
+                candidates = {group: heapq.nsmallest(RANKED_VALUES + 1, keys, key=self._rank_key)
+                              for group, keys in merged.items()}
+            for group, keys in candidates.items():
+                # Groups of keys shorter than the prefix length are ranked at their own length
+                if len(group) == length:
+                    ranked[group] = self._ranked_entry(keys)
+        self.ranked = ranked
+
+    def _rank_key(self, key):
+        return -self.counts.get(key, 0), key
+
+    def _ranked_entry(self, keys):
+        """Ranked list of the first RANKED_VALUES of keys, most common first, and its floor."""
+        keys = heapq.nsmallest(RANKED_VALUES + 1, keys, key=self._rank_key)
+        floor = self._rank_key(keys.pop()) if len(keys) > RANKED_VALUES else None
+        return [keys, floor]
+
+    def _rerank(self, key):
+        """Move key within the ranked lists of its prefixes after its count changed."""
+        if not self.ranked:
+            return
+        rank = self._rank_key(key)
+        for length in range(1, len(key) + 1):
+            entry = self.ranked.get(key[:length])
+            if entry is None:
+                continue
+            keys, floor = entry
+            if key in keys:
+                keys.remove(key)
+            # A key ranking at or after the floor is left out, like the other keys that are not listed
+            if key in self.counts and (floor is None or rank < floor):
+                bisect.insort(keys, key, key=self._rank_key)
+                if len(keys) > RANKED_VALUES:
+                    dropped = self._rank_key(keys.pop())
+                    entry[1] = dropped if floor is None else min(floor, dropped)
+
+    def complete(self, prefix, limit=10):
+        """Up to limit values starting with prefix, the most common first and ties in sorted order."""
+        prefix = normalize_value(prefix)
+        if not prefix:
+            return []
+        if self.ranked is None:
+            keys = itertools.islice(self._matches(prefix), limit)
+        elif limit > RANKED_VALUES:
+            keys = heapq.nsmallest(limit, self._matches(prefix), key=self._rank_key)
+        else:
+            with self.ranked_lock:
+                keys = self._top(prefix, limit)
+        return [self.display.get(key, key) for key in keys]
+
+    def _top(self, prefix, limit):
+        """The limit most common keys starting with prefix, from its ranked list where there is one."""
+        entry = self.ranked.get(prefix)
+        if entry is not None:
+            keys, floor = entry
+            # Listed keys ahead of the floor are ranked exactly
+            certain = keys if floor is None else [key for key in keys if self._rank_key(key) < floor]
+            if floor is None or len(certain) >= limit:
+                return certain[:limit]
+        elif len(prefix) > RANKED_PREFIX_LENGTH:
+            matches = list(itertools.islice(self._matches(prefix), SCAN_LIMIT + 1))
+            if len(matches) <= SCAN_LIMIT:
+                return heapq.nsmallest(limit, matches, key=self._rank_key)
+        # Scanned once and then kept up to date by writes like the prefixes rank() lists
+        entry = self.ranked[prefix] = self._ranked_entry(self._matches(prefix))
+        return entry[0][:limit]
+
+    def _matches(self, prefix):
+        """Counted keys of both runs starting with prefix, each once, in sorted order."""
+        previous = None
+        for key in heapq.merge(self._scan(self.keys, prefix), self._scan(self.recent, prefix)):
+            if key != previous and key in self.counts:
+                yield key
+            previous = key
+
+    @staticmethod
+    def _scan(keys, prefix):
+        """Keys of a sorted run starting with prefix, in order."""
+        for i in range(bisect.bisect_left(keys, prefix), len(keys)):
+            if not keys[i].startswith(prefix):
+                return
+            yield keys[i]
+
+class TypeaheadIndex:
+    """Process-wide prefix indexes over TYPEAHEAD_FIELDS, kept in step with the data version.
+
+    Built once from the database, in the background: lookups return
+    nothing until the values are loaded, and matches in sorted order until
+    they are ranked. Writes made through Storage in this
+    process apply their changes directly; writes this process did not see
+    (another process wrote) are caught up on from the change log. Only
+    when that is not possible (a bulk delete, a load, or too many writes
+    behind) is the index rebuilt, in the background while lookups keep
+    using the current one.
+    """
+
+    def __init__(self):
+        self.indexes = None  # field -> PrefixIndex
+        self.version = None
+        self.stale = False
+        self.rebuilding = False
+        self.lock = threading.Lock()
+
+    def ensure_built(self, load):
+        """Start building the indexes with load() in a background thread on first use.
+
+        load returns (version, {field: {value: count}}), the counts as of version.
+        """
+        if self.indexes is not None:
+            return
+        with self.lock:
+            if self.indexes is not None or self.rebuilding:
+                return
+            self.rebuilding = True
+
+        def build():
+            try:
+                version, indexes = self._build(load)
+                with self.lock:
+                    self._install(version, indexes)
+                # Installed first so lookups get sorted matches while the prefixes are ranked
+                for index in indexes.values():
+                    index.rank()
+            except Exception as e:
+                logger.error(f"Error building typeahead index: {str(e)}")
+            finally:
+                self.rebuilding = False
+
+        threading.Thread(target=build, daemon=True).start()
+
+    def _build(self, load):
+        version, counts = load()
+        return version, {field: PrefixIndex(counts.get(field)) for field in TYPEAHEAD_FIELDS}
+
+    def _install(self, version, indexes):
+        self.indexes = indexes
+        self.version = version
+        self.stale = False
+        logger.info(f"Built typeahead index at data version {version}: "
+                    + ', '.join(f"{field} {len(index.keys)}" for field, index in indexes.items()))
+
+    def _update(self, added, removed):
+        for field, index in self.indexes.items():
+            index.update(
+                (record.get(field) for record in added if record.get(field)),
+                (record.get(field) for record in removed if record.get(field))
+            )
+
+    def apply(self, first_version, last_version, added=(), removed=(), invalidate=False):
+        """Apply a committed write that moved the data version from first_version - 1 to last_version.
+
+        added and removed are record dictionaries. The index goes stale if
+        invalidate is set. If it was not at first_version - 1, the write is
+        left for refresh, which catches up on it after the versions before.
+        """
+        with self.lock:
+            if self.indexes is None:
+                return
+            if invalidate:
+                self.stale = True
+                return
+            if self.version != first_version - 1:
+                return
+            self._update(added, removed)
+            self.version = last_version
+
+    def refresh(self, version, load, load_changes):
+        """Bring the index up to the database's version in a background thread.
+
+        load_changes(first_version, last_version) returns the (added,
+        removed) records of the writes in between, or None if they cannot be
+        told from the change log; the index is then rebuilt with load().
+        """
+        with self.lock:
+            if self.rebuilding or (not self.stale and (self.version is None or version <= self.version)):
+                return
+            self.rebuilding = True
+            first_version = None if self.stale else self.version
+
+        def catch_up():
+            try:
+                if first_version is not None:
+                    changes = load_changes(first_version, version)
+                    if changes is not None:
+                        with self.lock:
+                            # Skipped if a write of this process moved the index meanwhile; the next refresh retries
+                            if not self.stale and self.version == first_version:
+                                self._update(*changes)
+                                self.version = version
+                        return
+                # Built without the lock so writers are not held up; writes applied to the old
+                # indexes meanwhile leave the new ones behind the database, and are caught next refresh
+                built_version, indexes = self._build(load)
+                for index in indexes.values():
+                    index.rank()
+                with self.lock:
+                    self._install(built_version, indexes)
+            except Exception as e:
+                logger.error(f"Error refreshing typeahead index: {str(e)}")
+            finally:
+                self.rebuilding = False
+
+        threading.Thread(target=catch_up, daemon=True).start()
+
+    def complete(self, field, prefix, limit=10):
+        indexes = self.indexes
+        if indexes is None or field not in indexes:
+            return []
+        return indexes[field].complete(prefix, limit)